@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+
+# Copyright (C) 2021-2023 Guillaume Jouvet <guillaume.jouvet@unil.ch>
+# Published under the GNU GPL (Version 3), check at the LICENSE file
+
+"""
+Benchmark of the emulator inference compiled with XLA (option
+iflo_emulator_jit) against the eager inference, for each pinnbp_* emulator of
+the igm package, on the synthetic geometry of the tests (100 x 200 grid) with
+an elliptic glacier. The differences are measured on the ice-covered cells,
+the velocities of ice-free cells near the borders depend on the padding. The
+inference covers the evaluation of the emulator and the derivation of the 2D
+velocities (update_iceflow_emulated). The number of traces needed for a series
+of domain sizes is given with and without the padding to buckets.
+
+Usage: python bench_emulator_jit.py
+"""
+
+import os, sys, time
+import numpy as np
+import tensorflow as tf
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(
+    os.path.join(os.path.dirname(__file__), "..", "tests", "test_full_glacier_evolution_synthetic")
+)
+
+import igm
+import make_synthetic
+from igm import emulators
+from igm.modules.process.iceflow.emulate import (
+    update_iceflow_emulated,
+    compiled_inference,
+    emulate_iceflow_compiled,
+)
+
+
+def setup(emulator, jit):
+    Nz, vert_spacing, network, nb_layers, nb_out_filter, dim_arrhenius, friction = (
+        emulator.split("_")[1:]
+    )
+
+    parser = igm.params_core()
+    modules = [make_synthetic] + igm.load_modules(
+        {"modules_preproc": [], "modules_process": ["iceflow"], "modules_postproc": []}
+    )
+    for module in modules:
+        module.params(parser)
+    params, __ = parser.parse_known_args(args=[])
+
+    params.iflo_Nz = int(Nz)
+    params.iflo_vert_spacing = float(vert_spacing)
+    params.iflo_network = network
+    params.iflo_nb_layers = int(nb_layers)
+    params.iflo_nb_out_filter = int(nb_out_filter)
+    params.iflo_dim_arrhenius = int(dim_arrhenius)
+    params.iflo_new_friction_param = bool(int(friction))
+    params.iflo_retrain_emulator_freq = 0
+    params.iflo_emulator_jit = jit
+    if network == "unet":
+        params.iflo_multiple_window_size = 8
+
+    state = igm.State()
+    state.it = 0
+    igm.run_intializers(modules, params, state)
+
+    X, Y = np.meshgrid(state.x, state.y)
+    thk = 300 * np.sqrt(
+        np.maximum(1 - ((X - 5000) / 4000) ** 2 - ((Y - 10000) / 9000) ** 2, 0)
+    )
+    state.thk = tf.Variable(thk.astype("float32"))
+    state.usurf = state.topg + state.thk
+    return params, state
+
+
+def time_inference(params, state, nb_repeats=20):
+    update_iceflow_emulated(params, state)  # warm-up (tracing)
+    start = time.time()
+    for i in range(nb_repeats):
+        update_iceflow_emulated(params, state)
+    state.ubar.numpy()  # wait for the asynchronous computation to complete
+    return (time.time() - start) / nb_repeats
+
+
+def count_traces(params, state, sizes):
+    fieldin = [vars(state)[f] for f in params.iflo_fieldin]
+    for Ny, Nx in sizes:
+        emulate_iceflow_compiled(params, state, [f[..., :Ny, :Nx] for f in fieldin])
+    return compiled_inference(params, state.iceflow_model).experimental_get_tracing_count()
+
+
+if __name__ == "__main__":
+    names = sorted(
+        [
+            name
+            for name in os.listdir(emulators.__path__[0])
+            if name.startswith("pinnbp_")
+        ]
+    )
+
+    print("Inference time (synthetic geometry, 100x200):")
+    for name in names:
+        try:
+            params, state = setup(name, False)
+        except Exception as error:
+            print("     %30s  |  not loaded (%s)" % (name, error))
+            continue
+        eager = time_inference(params, state)
+        U = state.U.numpy()[..., state.thk > 0]
+
+        params, state = setup(name, True)
+        compiled = time_inference(params, state)
+        error = np.max(np.abs(state.U.numpy()[..., state.thk > 0] - U)) / np.max(np.abs(U))
+
+        print(
+            "     %30s  |  eager : %8.2f ms  |  XLA : %8.2f ms  |  speed-up : %5.2f  |  max. rel. diff. : %.1e"
+            % (name, 1000 * eager, 1000 * compiled, eager / compiled, error)
+        )
+
+    sizes = [(100 - i, 200 - 2 * i) for i in range(0, 30, 3)]
+    print("Number of traces for %s domain sizes from 100x200 to %sx%s:" % ((len(sizes),) + sizes[-1]))
+    for bucket in [1, 16, 32]:
+        params, state = setup(names[0], True)
+        params.iflo_emulator_bucket = bucket
+        print("     %30s  |  %3d" % ("bucket " + str(bucket), count_traces(params, state, sizes)))
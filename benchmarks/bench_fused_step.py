@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+
+# Copyright (C) 2021-2023 Guillaume Jouvet <guillaume.jouvet@unil.ch>
+# Published under the GNU GPL (Version 3), check at the LICENSE file
+
+"""
+Benchmark of the fused step (option fused_step) against the default eager
+time loop on the synthetic geometry of the tests (100 x 200 grid). The
+emulator is not retrained, so that the timing only reflects the cost of
+iceflow, time, thk (and smb_simple, vert_flow) per iteration.
+
+Usage: python bench_fused_step.py
+"""
+
+import os, sys, time
+import numpy as np
+import tensorflow as tf
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(
+    os.path.join(os.path.dirname(__file__), "..", "tests", "test_full_glacier_evolution_synthetic")
+)
+
+import igm
+import make_synthetic
+
+
+def run(fused_step, fused_step_jit, nb_iterations=200):
+    parser = igm.params_core()
+    modules = [make_synthetic] + igm.load_modules(
+        {
+            "modules_preproc": [],
+            "modules_process": ["smb_simple", "iceflow", "time", "thk", "vert_flow"],
+            "modules_postproc": [],
+        }
+    )
+    for module in modules:
+        module.params(parser)
+    params, __ = parser.parse_known_args(args=[])
+
+    params.smb_simple_array = [
+        ["time", "gradabl", "gradacc", "ela", "accmax"],
+        [2000, 0.009, 0.005, 2900, 2.0],
+        [2100, 0.009, 0.005, 3300, 2.0],
+    ]
+    params.time_end = 3000.0
+    params.iflo_retrain_emulator_freq = 0
+    params.fused_step = fused_step
+    params.fused_step_jit = fused_step_jit
+
+    state = igm.State()
+    igm.run_intializers(modules, params, state)
+
+    # first the non-advancing iteration, and the warm-up (tracing)
+    params.time_end = params.time_start + 10
+    igm.run_processes(modules, params, state)
+    params.time_end = 3000.0
+
+    # then the timed iterations, the loop is run by hand to count iterations
+    if fused_step:
+        modules = igm.common.group_fused_modules(modules, params, state)
+    start = time.time()
+    for i in range(nb_iterations):
+        for module in modules:
+            module.update(params, state)
+    state.thk.numpy()  # wait for the asynchronous computation to complete
+    return (time.time() - start) / nb_iterations
+
+
+if __name__ == "__main__":
+    eager = run(False, False)
+    fused = run(True, False)
+    fused_jit = run(True, True)
+
+    print("Time per iteration (synthetic geometry, 100x200):")
+    print("     %16s  |  %8.2f ms  |  speed-up : %5.2f" % ("eager", 1000 * eager, 1.0))
+    print("     %16s  |  %8.2f ms  |  speed-up : %5.2f" % ("fused", 1000 * fused, eager / fused))
+    print("     %16s  |  %8.2f ms  |  speed-up : %5.2f" % ("fused (XLA)", 1000 * fused_jit, eager / fused_jit))
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+
+# Copyright (C) 2021-2023 Guillaume Jouvet <guillaume.jouvet@unil.ch>
+# Published under the GNU GPL (Version 3), check at the LICENSE file
+
+"""
+Benchmark of the precision options against the float32 baseline on the
+synthetic geometry of the tests (100 x 200 grid): throughput and error of the
+emulator inference and retraining for each option precision, and error of the
+float32 vertical enthalpy solve (TDMA) against float64 (option
+precision_float64). Run on CPU, where bfloat16 only pays off with native
+support (e.g. AVX512_BF16 or AMX), while float16 is generally emulated.
+
+Usage: python bench_mixed_precision.py
+"""
+
+import os, sys, time
+import numpy as np
+
+os.environ.setdefault("CUDA_VISIBLE_DEVICES", "")
+
+import tensorflow as tf
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(
+    os.path.join(os.path.dirname(__file__), "..", "tests", "test_full_glacier_evolution_synthetic")
+)
+
+import igm
+import make_synthetic
+from igm.modules.process.iceflow.emulate import emulate_UV, update_iceflow_emulator
+from igm.modules.process.enthalpy.enthalpy import solve_TDMA_new
+
+PRECISIONS = ["float32", "mixed_bfloat16", "mixed_float16"]
+
+
+def setup(precision):
+    parser = igm.params_core()
+    modules = [make_synthetic] + igm.load_modules(
+        {
+            "modules_preproc": [],
+            "modules_process": ["iceflow"],
+            "modules_postproc": [],
+        }
+    )
+    for module in modules:
+        module.params(parser)
+    params, __ = parser.parse_known_args(args=[])
+    params.precision = precision
+
+    state = igm.State()
+    state.it = 0
+    igm.run_intializers(modules, params, state)
+    return params, state
+
+
+def time_it(function, nb_repeats):
+    function()  # warm-up
+    start = time.time()
+    for i in range(nb_repeats):
+        result = function()
+    np.asarray(result)  # wait for the asynchronous computation to complete
+    return (time.time() - start) / nb_repeats
+
+
+def bench_emulator(nb_repeats=50):
+    results = {}
+    for precision in PRECISIONS:
+        params, state = setup(precision)
+        fieldin = [vars(state)[f] for f in params.iflo_fieldin]
+
+        inference = time_it(lambda: emulate_UV(params, state, fieldin)[0], nb_repeats)
+        U, V = emulate_UV(params, state, fieldin)
+
+        params.iflo_retrain_emulator_nbit = 1
+        params.iflo_retrain_emulator_framesizemax = 10**6
+        retraining = time_it(
+            lambda: update_iceflow_emulator(params, state) or state.U, 2
+        )
+        results[precision] = (inference, retraining, U, V)
+
+    U32, V32 = results["float32"][2:]
+    scale = np.max(np.sqrt(U32**2 + V32**2))
+
+    print("Emulator (synthetic geometry, 100x200):")
+    for precision, (inference, retraining, U, V) in results.items():
+        error = np.max(np.sqrt((U - U32) ** 2 + (V - V32) ** 2)) / scale
+        print(
+            "     %16s  |  inference : %8.2f ms  |  retraining : %8.2f ms  |  max. rel. error : %.1e"
+            % (precision, 1000 * inference, 1000 * retraining, error)
+        )
+
+
+def bench_TDMA(nz=30, ny=100, nx=200, nb_repeats=20):
+    # stiff systems as obtained with year-long time steps and thin layers
+    rng = np.random.default_rng(0)
+    s = 10 ** rng.uniform(0, 4, (nz - 1, ny, nx))
+    L = -s
+    U = -s.copy()
+    M = np.ones((nz, ny, nx))
+    M[:-1] += s
+    M[1:] += s
+    R = 10**5 * rng.uniform(1, 2, (nz, ny, nx))
+
+    reference = solve_TDMA_new(*[tf.constant(A, "float64") for A in [L, M, U, R]])
+
+    print("Enthalpy vertical solve (TDMA, %sx%sx%s):" % (nz, ny, nx))
+    for dtype in ["float32", "float64"]:
+        A = [tf.constant(A, dtype) for A in [L, M, U, R]]
+        duration = time_it(lambda: solve_TDMA_new(*A), nb_repeats)
+        E = solve_TDMA_new(*A).numpy().astype("float64")
+        error = np.max(np.abs(E - reference) / np.abs(reference))
+        print(
+            "     %16s  |  solve : %8.2f ms  |  max. rel. error : %.1e"
+            % (dtype, 1000 * duration, error)
+        )
+
+
+if __name__ == "__main__":
+    bench_emulator()
+    bench_TDMA()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+
+# Copyright (C) 2021-2023 Guillaume Jouvet <guillaume.jouvet@unil.ch>
+# Published under the GNU GPL (Version 3), check at the LICENSE file
+
+"""
+Accuracy against speed of the emulators quantized for CPUs with TensorFlow
+Lite (option iflo_inference_backend tflite), for each quantization and each
+pinnbp_* emulator of the igm package, against the float32 keras inference. The
+test glaciers are elliptic glaciers of 300 m and 100 m on the synthetic
+geometry of the tests (100 x 200 grid), the int8 quantization being calibrated
+on the first one only. The differences are measured on the ice-covered cells,
+relative to the max. of the keras velocities. The inference covers the
+evaluation of the emulator and the derivation of the 2D velocities
+(update_iceflow_emulated), the time of the conversion is given apart.
+
+Usage: python bench_quantized_inference.py
+"""
+
+import os, sys, time
+import numpy as np
+import tensorflow as tf
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(
+    os.path.join(os.path.dirname(__file__), "..", "tests", "test_full_glacier_evolution_synthetic")
+)
+
+import igm
+import make_synthetic
+from igm import emulators
+from igm.modules.process.iceflow.emulate import update_iceflow_emulated
+
+
+def set_glacier(state, height):
+    X, Y = np.meshgrid(state.x, state.y)
+    thk = height * np.sqrt(
+        np.maximum(1 - ((X - 5000) / 4000) ** 2 - ((Y - 10000) / 9000) ** 2, 0)
+    )
+    if hasattr(state, "thk"):
+        state.thk.assign(thk.astype("float32"))
+    else:
+        state.thk = tf.Variable(thk.astype("float32"))
+    state.usurf = state.topg + state.thk
+
+
+def setup(emulator, quantization):
+    Nz, vert_spacing, network, nb_layers, nb_out_filter, dim_arrhenius, friction = (
+        emulator.split("_")[1:]
+    )
+
+    parser = igm.params_core()
+    modules = [make_synthetic] + igm.load_modules(
+        {"modules_preproc": [], "modules_process": ["iceflow"], "modules_postproc": []}
+    )
+    for module in modules:
+        module.params(parser)
+    params, __ = parser.parse_known_args(args=[])
+
+    params.iflo_Nz = int(Nz)
+    params.iflo_vert_spacing = float(vert_spacing)
+    params.iflo_network = network
+    params.iflo_nb_layers = int(nb_layers)
+    params.iflo_nb_out_filter = int(nb_out_filter)
+    params.iflo_dim_arrhenius = int(dim_arrhenius)
+    params.iflo_new_friction_param = bool(int(friction))
+    params.iflo_retrain_emulator_freq = 0
+    params.iflo_inference_backend = "keras" if quantization == "" else "tflite"
+    params.iflo_inference_quantization = quantization
+    if network == "unet":
+        params.iflo_multiple_window_size = 8
+
+    state = igm.State()
+    state.it = 0
+    make_synthetic.initialize(params, state)
+
+    set_glacier(state, 300)
+
+    start = time.time()
+    for module in modules[1:]:
+        module.initialize(params, state)
+    return params, state, time.time() - start
+
+
+
+
+def time_inference(params, state, nb_repeats=20):
+    update_iceflow_emulated(params, state)  # warm-up
+    start = time.time()
+    for i in range(nb_repeats):
+        update_iceflow_emulated(params, state)
+    state.ubar.numpy()  # wait for the asynchronous computation to complete
+    return (time.time() - start) / nb_repeats
+
+
+if __name__ == "__main__":
+    names = sorted(
+        [
+            name
+            for name in os.listdir(emulators.__path__[0])
+            if name.startswith("pinnbp_")
+        ]
+    )
+    heights = [300, 100]
+
+    print("Inference time and max. rel. diff. with keras (synthetic geometry, 100x200):")
+    for name in names:
+        try:
+            params, state, __ = setup(name, "")
+        except Exception as error:
+            print("     %30s  |  not loaded (%s)" % (name, error))
+            continue
+        keras = time_inference(params, state)
+        U = {}
+        for height in heights:
+            set_glacier(state, height)
+            update_iceflow_emulated(params, state)
+            U[height] = state.U.numpy()[..., state.thk > 0]
+        print("     %30s  |  %8s  |  %8.2f ms" % (name, "keras", 1000 * keras))
+
+        for quantization in ["float32", "float16", "dynamic", "int8"]:
+            params, state, conversion = setup(name, quantization)
+            tflite = time_inference(params, state)
+            errors = []
+            for height in heights:
+                set_glacier(state, height)
+                update_iceflow_emulated(params, state)
+                errors.append(
+                    np.max(np.abs(state.U.numpy()[..., state.thk > 0] - U[height]))
+                    / np.max(np.abs(U[height]))
+                )
+            print(
+                "     %30s  |  %8s  |  %8.2f ms  |  speed-up : %5.2f  |  max. rel. diff. : %s  |  initialization : %4.1f s"
+                % (
+                    "",
+                    quantization,
+                    1000 * tflite,
+                    keras / tflite,
+                    " ".join("%.1e (%d m)" % (e, h) for e, h in zip(errors, heights)),
+                    conversion,
+                )
+            )
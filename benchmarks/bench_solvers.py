@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+
+# Copyright (C) 2021-2023 Guillaume Jouvet <guillaume.jouvet@unil.ch>
+# Published under the GNU GPL (Version 3), check at the LICENSE file
+
+"""
+Benchmark of the iceflow solvers: Adam (default), L-BFGS (option
+iflo_optimizer_lbfgs, needs tensorflow_probability) and Newton-CG (option
+iflo_optimizer_newton), on the synthetic geometry of the tests (100 x 200
+grid) with an elliptic glacier, from a zero velocity. Adam is also run with
+its iterations in a compiled loop (option iflo_solve_compiled), the time
+includes the tracing. The energy is given
+against the time, and against the number of iterations of each solver (an
+iteration of Newton-CG includes up to iflo_newton_cg_nbit Hessian-vector
+products).
+
+Usage: python bench_solvers.py
+"""
+
+import os, sys, time
+import numpy as np
+
+os.environ.setdefault("CUDA_VISIBLE_DEVICES", "")
+
+import tensorflow as tf
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "tests"))
+sys.path.append(
+    os.path.join(os.path.dirname(__file__), "..", "tests", "test_full_glacier_evolution_synthetic")
+)
+
+from synthetic_setup import iceflow_setup
+from igm.modules.process.iceflow.solve import (
+    solve_iceflow,
+    solve_iceflow_lbfgs,
+    solve_iceflow_newton,
+)
+
+SOLVERS = {
+    "Adam": (solve_iceflow, 400, {}),
+    "Adam (loop compiled)": (solve_iceflow, 400, {"iflo_solve_compiled": True}),
+    "L-BFGS": (solve_iceflow_lbfgs, 200, {}),
+    "Newton-CG": (solve_iceflow_newton, 20, {}),
+}
+
+
+def setup():
+    return iceflow_setup(iflo_type="solved", iflo_solve_stop_if_no_decrease=False)
+
+
+def run(solver, nbitmax, options):
+    params, state = setup()
+    vars(params).update(options)
+    U, V = tf.Variable(tf.zeros_like(state.U)), tf.Variable(tf.zeros_like(state.V))
+    start = time.time()
+    U, V, Cost_Glen = solver(params, state, U, V, nbitmax=nbitmax)
+    return time.time() - start, np.array(Cost_Glen)
+
+
+if __name__ == "__main__":
+    print("Iceflow solvers (synthetic geometry, 100x200, from a zero velocity):")
+    for name, (solver, nbitmax, options) in SOLVERS.items():
+        try:
+            duration, Cost_Glen = run(solver, nbitmax, options)
+        except ImportError as error:
+            print("     %20s  |  not available (%s)" % (name, error))
+            continue
+        its = [i for i in [1, 5, 10, 20, 50, 100, 200, 400] if i < len(Cost_Glen)]
+        print(
+            "     %20s  |  %4d iterations in %6.1f s  |  final energy : %8.3f  |  %s"
+            % (
+                name,
+                len(Cost_Glen),
+                duration,
+                Cost_Glen[-1],
+                "  ".join("it%d : %.3f" % (i, Cost_Glen[i]) for i in its),
+            )
+        )
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+
+# Copyright (C) 2021-2023 Guillaume Jouvet <guillaume.jouvet@unil.ch>
+# Published under the GNU GPL (Version 3), check at the LICENSE file
+
+"""
+Benchmark of the start-up time of IGM, i.e. the time needed to import igm and to
+parse and validate the parameters of a typical run, as done by igm_run and
+igm_help before starting the simulation. Each case is run in a fresh python
+process; the parsing with the modules imported (as before the manifest) is
+given for reference. The manifest is written first (python -m igm.manifest),
+as in a built package.
+
+Usage: python bench_startup.py
+"""
+
+import os, sys, time, json, tempfile, subprocess
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+PARAMS = {
+    "modules_preproc": ["load_ncdf"],
+    "modules_process": ["smb_simple", "iceflow", "time", "thk"],
+    "modules_postproc": ["write_ncdf", "print_info"],
+}
+
+SETUP = """
+import sys
+sys.path.insert(0, %r)
+import igm
+parser = igm.params_core()
+params, _ = parser.parse_known_args()
+imported_modules = igm.setup_igm_modules(params)
+""" % ROOT
+
+CASES = {
+    "import igm": "import sys\nsys.path.insert(0, %r)\nimport igm\n" % ROOT,
+    "parse parameters": SETUP
+    + "params = igm.setup_igm_params(parser, imported_modules)\n",
+    "parse (modules imported)": SETUP
+    + "[module.update for module in imported_modules]\n"
+    + "params = igm.setup_igm_params(parser, imported_modules)\n",
+    "import tensorflow": "import tensorflow\n",
+}
+
+
+def run(code, folder, nb_repeats=3):
+    times = []
+    for i in range(nb_repeats):
+        start = time.time()
+        subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=folder,
+            check=True,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        times.append(time.time() - start)
+    return min(times)
+
+
+if __name__ == "__main__":
+    subprocess.run([sys.executable, "-m", "igm.manifest"], cwd=ROOT, check=True)
+
+    with tempfile.TemporaryDirectory() as folder:
+        with open(os.path.join(folder, "params.json"), "w") as f:
+            json.dump(PARAMS, f)
+
+        print("Start-up time (python process included):")
+        for name, code in CASES.items():
+            print("     %26s  |  %8.2f s" % (name, run(code, folder)))
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+
+# Copyright (C) 2021-2023 Guillaume Jouvet <guillaume.jouvet@unil.ch>
+# Published under the GNU GPL (Version 3), check at the LICENSE file
+
+"""
+Benchmark of the tiled inference of the emulator (option iflo_tile_size)
+against the evaluation of the whole domain at once: time and peak memory of
+the process for domains made of copies of the synthetic geometry of the tests
+(100 x 200 grid) with an elliptic glacier. Each case runs in its own process,
+such that the peak memory is its own, it is taken after the first evaluation.
+Besides the emulator, the memory includes the input fields and the velocity
+fields (and their copy when the tiles are stitched), which scale with the
+domain.
+
+Usage: python bench_tiled_inference.py
+"""
+
+import os, sys, time, subprocess
+import numpy as np
+
+os.environ.setdefault("CUDA_VISIBLE_DEVICES", "")
+
+CASES = [(k, tile_size) for k in [4, 8, 16] for tile_size in [0, 256]]
+
+
+def run(k, tile_size, nb_repeats=3):
+    import resource
+    import tensorflow as tf
+
+    sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+    sys.path.append(
+        os.path.join(os.path.dirname(__file__), "..", "tests", "test_full_glacier_evolution_synthetic")
+    )
+
+    import igm
+    import make_synthetic
+    from igm.modules.process.iceflow.emulate import emulate_UV
+
+    parser = igm.params_core()
+    modules = [make_synthetic] + igm.load_modules(
+        {"modules_preproc": [], "modules_process": ["iceflow"], "modules_postproc": []}
+    )
+    for module in modules:
+        module.params(parser)
+    params, __ = parser.parse_known_args(args=[])
+    params.iflo_retrain_emulator_freq = 0
+    params.iflo_tile_size = tile_size
+
+    state = igm.State()
+    state.it = 0
+    igm.run_intializers(modules, params, state)
+
+    X, Y = np.meshgrid(state.x, state.y)
+    thk = 300 * np.sqrt(
+        np.maximum(1 - ((X - 5000) / 4000) ** 2 - ((Y - 10000) / 9000) ** 2, 0)
+    )
+    state.thk = tf.Variable(thk.astype("float32"))
+    state.usurf = state.topg + state.thk
+
+    fieldin = [tf.tile(vars(state)[f], [k, k]) for f in params.iflo_fieldin]
+
+    U, V = emulate_UV(params, state, fieldin)  # warm-up
+    memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2**10
+    del U, V
+
+    start = time.time()
+    for i in range(nb_repeats):
+        U, V = emulate_UV(params, state, fieldin)
+    U.numpy()
+    duration = (time.time() - start) / nb_repeats
+
+    print("%s %s" % (duration, memory))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3:
+        run(int(sys.argv[1]), int(sys.argv[2]))
+        sys.exit()
+
+    print("Emulator inference (copies of the synthetic geometry):")
+    for k, tile_size in CASES:
+        output = subprocess.run(
+            [sys.executable, __file__, str(k), str(tile_size)],
+            capture_output=True,
+            text=True,
+        ).stdout.split("\n")
+        duration, memory = [float(v) for v in output[-2].split()]
+        print(
+            "     %5d x %5d  |  %14s  |  time : %8.2f s  |  peak memory : %8.0f Mb"
+            % (200 * k, 100 * k, "tile " + str(tile_size) if tile_size > 0 else "whole domain", duration, memory)
+        )
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+
+"""
+Copyright (C) 2021-2023 Guillaume Jouvet <guillaume.jouvet@unil.ch>
+Published under the GNU GPL (Version 3), check at the LICENSE file
+"""
+
+import copy
+import queue
+import threading
+from typing import Any, List
+
+import numpy as np
+import tensorflow as tf
+
+from igm.common import State
+
+
+class Snapshot:
+    """
+    Copy of the state taken on a save step. The fields requested by the
+    asynchronous modules are frozen (variables are read, arrays copied) when
+    the snapshot is taken, and copied to the host only once, by the first
+    worker that needs them, such that the time loop does not wait for them.
+    Other attributes are shared with the state (e.g. the logger, the figures).
+    """
+
+    def __init__(self, state: State, fields: List[str]):
+        self.data = dict(vars(state))
+        self.fields = [f for f in fields if f in self.data]
+        for f in self.fields:
+            value = self.data[f]
+            if isinstance(value, tf.Variable):
+                self.data[f] = tf.identity(value)
+            elif isinstance(value, (np.ndarray, list, dict)):
+                self.data[f] = copy.copy(value)
+        self.on_host = False
+        self.lock = threading.Lock()
+
+    def view(self, attributes: dict) -> State:
+        with self.lock:
+            if not self.on_host:
+                with tf.device("/CPU:0"):
+                    for f in self.fields:
+                        if isinstance(self.data[f], tf.Tensor):
+                            self.data[f] = tf.identity(self.data[f])
+                self.on_host = True
+        view = State()
+        vars(view).update(self.data)
+        vars(view).update(attributes)
+        return view
+
+
+class AsyncWorker:
+    """
+    Thread running the updates of its modules in the order they were queued,
+    the queue is bounded such that the time loop waits (backpressure) when
+    the writers fall behind.
+    """
+
+    def __init__(self, size: int):
+        self.queue = queue.Queue(maxsize=size)
+        self.error = None
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self) -> None:
+        while True:
+            task = self.queue.get()
+            if task is None:
+                break
+            if self.error is None:
+                module, params, snapshot = task
+                try:
+                    module.run(params, snapshot)
+                except Exception as error:
+                    self.error = error
+
+    def submit(self, task: tuple) -> None:
+        self.queue.put(task)
+
+    def close(self) -> None:
+        self.queue.put(None)
+        self.thread.join()
+
+
+class AsyncPostproc:
+    """
+    Runs the updates of the post-processing modules (activated with
+    --async_postproc) in background workers. A module takes part if it
+    provides async_fields(params, state), which lists the fields its update
+    reads, and returns None if it must stay in the time loop (e.g. live
+    plots). Such a module only acts on save steps, on which the driver takes
+    a single snapshot of the fields requested by all the modules. The
+    attributes a module adds to the state (e.g. the "already called" flags)
+    are kept from one update to the next, and copied to the state when the
+    queues are flushed, before the finalizers.
+    """
+
+    def __init__(self, params: Any):
+        self.params = params
+        self.workers = [
+            AsyncWorker(params.async_postproc_queue)
+            for i in range(params.async_postproc_workers)
+        ]
+        self.modules = {}
+        self.fields = []
+        self.snapshot = None
+        self.snapshot_it = None
+
+    def wrap(self, modules: List, params: Any, state: State) -> List:
+        wrapped = []
+        for module in modules:
+            if isinstance(module, AsyncModule) or not hasattr(module, "async_fields"):
+                wrapped.append(module)
+            elif module in self.modules:
+                wrapped.append(self.modules[module])
+            else:
+                fields = module.async_fields(params, state)
+                if fields is None:
+                    wrapped.append(module)
+                    continue
+                # the modules are spread over the workers, each one keeps
+                # the order of the updates of its modules
+                worker = self.workers[len(self.modules) % len(self.workers)]
+                self.modules[module] = AsyncModule(module, self, worker)
+                for f in ["t", "it", "saveresult"] + fields:
+                    if f not in self.fields:
+                        self.fields.append(f)
+                wrapped.append(self.modules[module])
+        return wrapped
+
+    def submit(self, module, params: Any, state: State) -> None:
+        for worker in self.workers:
+            if worker.error is not None:
+                raise worker.error
+        if not state.saveresult:
+            return
+        if self.snapshot_it is None or not state.it == self.snapshot_it:
+            self.snapshot = Snapshot(state, self.fields)
+            self.snapshot_it = state.it
+        module.worker.submit((module, params, self.snapshot))
+
+    def flush(self, state: State) -> None:
+        for worker in self.workers:
+            worker.close()
+        for module in self.modules.values():
+            for name, value in module.attributes.items():
+                if not hasattr(state, name):
+                    setattr(state, name, value)
+        for worker in self.workers:
+            if worker.error is not None:
+                raise worker.error
+
+
+class AsyncModule:
+    """Module whose updates are queued to a worker of AsyncPostproc."""
+
+    def __init__(self, module: Any, pipeline: AsyncPostproc, worker: AsyncWorker):
+        self.module = module
+        self.pipeline = pipeline
+        self.worker = worker
+        self.attributes = {}
+
+    def update(self, params: Any, state: State) -> None:
+        self.pipeline.submit(self, params, state)
+
+    def run(self, params: Any, snapshot: Snapshot) -> None:
+        view = snapshot.view(self.attributes)
+        self.module.update(params, view)
+        self.attributes = {
+            name: value
+            for name, value in vars(view).items()
+            if name not in snapshot.data
+        }
+
+    def __getattr__(self, name: str) -> Any:
+        if (name in ["module", "pipeline", "worker", "attributes"]) or (
+            name.startswith("__") and not name == "__name__"
+        ):
+            raise AttributeError(name)
+        return getattr(self.module, name)
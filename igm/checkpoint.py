@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+
+"""
+Copyright (C) 2021-2023 Guillaume Jouvet <guillaume.jouvet@unil.ch>
+Published under the GNU GPL (Version 3), check at the LICENSE file
+"""
+
+import os
+import time
+import pickle
+import threading
+from typing import Any
+
+import numpy as np
+import tensorflow as tf
+
+
+def is_trackable(value: Any) -> bool:
+    """Objects saved with tf.train.Checkpoint (variables, keras models and optimizers)."""
+    optimizers = (tf.keras.optimizers.Optimizer,)
+    if hasattr(tf.keras.optimizers, "legacy"):
+        optimizers += (tf.keras.optimizers.legacy.Optimizer,)
+    return isinstance(value, (tf.Variable, tf.keras.Model) + optimizers)
+
+
+def snapshot_nested(value: Any) -> Any:
+    """
+    Snapshot of a list, tuple or dict of scalars, strings, arrays and tensors
+    (e.g. emulator_fieldin_ref) as its structure, with the arrays copied, and
+    the flags of the tensors among its leaves, or None if it holds anything
+    else (e.g. keras models or optimizers such as retraining_step_of)
+    """
+    try:
+        leaves = tf.nest.flatten(value)
+    except TypeError:
+        # e.g. a dict whose keys can not be sorted
+        return None
+    plain = (bool, int, float, str, np.generic, np.ndarray, tf.Tensor, type(None))
+    if not all(isinstance(leaf, plain) for leaf in leaves):
+        return None
+    flags = [isinstance(leaf, tf.Tensor) for leaf in leaves]
+    leaves = [leaf.copy() if isinstance(leaf, np.ndarray) else leaf for leaf in leaves]
+    return tf.nest.pack_sequence_as(value, leaves), flags
+
+
+def snapshot_state(state) -> tuple:
+    """
+    Split the state into trackable objects, which are copied to the host by
+    tf.train.Checkpoint, and a snapshot of the other data (tensors are immutable
+    and can be converted later, arrays and python objects are copied now).
+    Other attributes (e.g. the logger, or containers holding keras models such
+    as retraining_step_of) are not part of the checkpoint.
+    """
+    trackables = {}
+    data = {}
+    for name, value in vars(state).items():
+        if is_trackable(value):
+            trackables[name] = value
+        elif isinstance(value, tf.Tensor):
+            data[name] = ("tensor", value)
+        elif isinstance(value, np.ndarray):
+            data[name] = ("array", value.copy())
+        elif isinstance(value, (list, tuple, dict)):
+            nested = snapshot_nested(value)
+            if nested is not None:
+                data[name] = ("nested", nested)
+        elif isinstance(value, (bool, int, float, str, np.generic)):
+            data[name] = ("python", value)
+    return trackables, data
+
+
+class CheckpointWriter:
+    """
+    Write checkpoints in a background thread such that the time loop only waits
+    for the copy of the variables to the host. A checkpoint consists of the files
+    variables-<it>.* (tf.train.Checkpoint) and state-<it>.pkl (other data), the
+    file 'latest' pointing to the last complete checkpoint is updated last. An
+    error of the thread is raised by the next call to wait or write.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.checkpoint = None
+        self.ids = None
+        self.thread = None
+        self.error = None
+        os.makedirs(directory, exist_ok=True)
+
+    def write(self, it: int, trackables: dict, data: dict) -> None:
+        self.wait()
+
+        # the checkpoint object is rebuilt if attributes were added or replaced
+        ids = {name: id(value) for name, value in trackables.items()}
+        if not ids == self.ids:
+            self.checkpoint = tf.train.Checkpoint(**trackables)
+            self.ids = ids
+
+        path = self.checkpoint.write(
+            os.path.join(self.directory, "variables-" + str(it)),
+            options=tf.train.CheckpointOptions(experimental_enable_async_checkpoint=True),
+        )
+
+        variables = {
+            name: (value.shape.as_list(), value.dtype.name)
+            for name, value in trackables.items()
+            if isinstance(value, tf.Variable)
+        }
+        objects = [name for name in trackables if name not in variables]
+
+        self.thread = threading.Thread(
+            target=self._run, args=(it, path, variables, objects, data)
+        )
+        self.thread.start()
+
+    def _run(self, *args):
+        try:
+            self._write_data(*args)
+        except Exception as error:
+            self.error = error
+
+    def _write_data(self, it, path, variables, objects, data):
+        saved = {
+            "variables_path": os.path.basename(path),
+            "variables": variables,
+            "objects": objects,
+            "data": {},
+        }
+        for name, (kind, value) in data.items():
+            if kind == "tensor":
+                value = value.numpy()
+            elif kind == "nested":
+                structure, flags = value
+                value = (
+                    tf.nest.map_structure(
+                        lambda v: v.numpy() if isinstance(v, tf.Tensor) else v, structure
+                    ),
+                    flags,
+                )
+            try:
+                pickle.dumps(value)
+            except Exception:
+                continue
+            saved["data"][name] = (kind, value)
+
+        self.checkpoint.sync()
+
+        filename = "state-" + str(it) + ".pkl"
+        with open(os.path.join(self.directory, filename + ".tmp"), "wb") as f:
+            pickle.dump(saved, f)
+        os.replace(
+            os.path.join(self.directory, filename + ".tmp"),
+            os.path.join(self.directory, filename),
+        )
+        with open(os.path.join(self.directory, "latest.tmp"), "w") as f:
+            f.write(filename)
+        os.replace(
+            os.path.join(self.directory, "latest.tmp"),
+            os.path.join(self.directory, "latest"),
+        )
+
+        # remove the previous checkpoints
+        for f in os.listdir(self.directory):
+            if f.startswith(("variables-", "state-")) and not (
+                f.startswith("variables-" + str(it) + ".") or f == filename
+            ):
+                os.remove(os.path.join(self.directory, f))
+
+    def wait(self) -> None:
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+
+def initialize_checkpoint(params, state) -> None:
+    state.tcomp_checkpoint = []
+    state.checkpoint_writer = CheckpointWriter(params.checkpoint_dir)
+    if not hasattr(state, "tlast_checkpoint"):
+        state.tlast_checkpoint = float(state.t)
+
+
+def save_checkpoint(params, state) -> None:
+    state.tcomp_checkpoint.append(time.time())
+
+    trackables, data = snapshot_state(state)
+    state.checkpoint_writer.write(state.it, trackables, data)
+
+    state.tcomp_checkpoint[-1] -= time.time()
+    state.tcomp_checkpoint[-1] *= -1
+
+
+def update_checkpoint(params, state) -> None:
+    if state.t >= state.tlast_checkpoint + params.checkpoint_freq:
+        state.tlast_checkpoint = float(state.t)
+        save_checkpoint(params, state)
+
+
+def finalize_checkpoint(params, state) -> None:
+    save_checkpoint(params, state)
+    state.checkpoint_writer.wait()
+
+
+def load_checkpoint(params, state) -> None:
+    """
+    Restore the state from the last checkpoint written in params.restart_from,
+    this is done after the initializers such that the keras models and
+    optimizers exist, variables created later in the run are created here.
+    """
+    with open(os.path.join(params.restart_from, "latest"), "r") as f:
+        filename = f.read().strip()
+    with open(os.path.join(params.restart_from, filename), "rb") as f:
+        saved = pickle.load(f)
+
+    for name, (shape, dtype) in saved["variables"].items():
+        value = getattr(state, name, None)
+        if not (isinstance(value, tf.Variable) and (value.shape.as_list() == shape)):
+            setattr(state, name, tf.Variable(tf.zeros(shape, dtype=dtype), trainable=False))
+
+    trackables = {
+        name: getattr(state, name)
+        for name in list(saved["variables"]) + saved["objects"]
+        if hasattr(state, name)
+    }
+    # the optimizer slots are restored when they are created at the first step
+    tf.train.Checkpoint(**trackables).read(
+        os.path.join(params.restart_from, saved["variables_path"])
+    ).expect_partial()
+
+    for name, (kind, value) in saved["data"].items():
+        if kind == "tensor":
+            value = tf.constant(value)
+        elif kind == "nested":
+            structure, flags = value
+            leaves = [
+                tf.constant(leaf) if flag else leaf
+                for leaf, flag in zip(tf.nest.flatten(structure), flags)
+            ]
+            value = tf.nest.pack_sequence_as(structure, leaves)
+        setattr(state, name, value)
@@ -16,8 +16,10 @@ from typing import List, Any, Dict, Tuple
 from types import ModuleType
 import logging
 import warnings
+import time
 
-import tensorflow as tf
+# tensorflow is imported only where needed (by the modules, once the simulation
+# starts), such that parsing and validating the parameters remains fast
 
 import igm
 
@@ -39,6 +41,10 @@ IGM_DESCRIPTION = r"""
 """
 
 
+def str2bool(v):
+    return v.lower() in ("true", "1")
+
+
 class State:
     pass
 
@@ -129,6 +135,114 @@ def params_core() -> argparse.ArgumentParser:
         default="data",
         help="The name of the folder where are stored the data (default: %(default)s)",
     )
+    parser.add_argument(
+        "--fused_step",
+        action="store_true",
+        default=False,
+        help="Compile consecutive process modules providing a fused step into a single graph run once per iteration (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--fused_step_jit",
+        action="store_true",
+        default=False,
+        help="Compile the fused step with XLA (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--ensemble_size",
+        type=int,
+        default=1,
+        help="Number of members of the ensemble, the evolving fields carry a leading member axis if larger than 1 (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--ensemble_params",
+        type=json.loads,
+        default={},
+        help="Values taken by each member for the parameters varied within the ensemble, in JSON, e.g. '{\"iflo_init_slidingco\": [0.03, 0.06]}' (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--sync_free",
+        action="store_true",
+        default=False,
+        help="Keep the simulation clock on the host (as python floats) such that the time loop does not synchronise with the device in each module (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--precision",
+        type=str,
+        default="float32",
+        help="Precision of the computations of the ice flow emulator (inference and retraining): float32, mixed_bfloat16 or mixed_float16, the weights are kept in float32 (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--precision_float64",
+        action="store_true",
+        default=False,
+        help="Compute in float64 where float32 loses accuracy: the vertical solve of the enthalpy (TDMA) and the ice volume of the time series (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        default=False,
+        help="Time (with device synchronisation) and sample the peak memory of each call of the modules, and export them as a Chrome trace (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--profile_file",
+        type=str,
+        default="profile.json",
+        help="File of the Chrome trace written with --profile (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--profile_tf_trace",
+        type=list,
+        default=[],
+        help="First and last iterations of the window traced with tf.profiler when profiling, e.g. [100, 110], nothing if empty (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--profile_tf_logdir",
+        type=str,
+        default="profile_tf",
+        help="Directory of the tf.profiler trace, to open with tensorboard (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--profile_transfers",
+        action="store_true",
+        default=False,
+        help="Count the device to host transfers of each module when profiling, implies --profile (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--async_postproc",
+        action="store_true",
+        default=False,
+        help="Run the updates of the post-processing modules (e.g. write_ncdf, plot2d) in background workers, on a snapshot of the fields taken on the save steps (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--async_postproc_queue",
+        type=int,
+        default=2,
+        help="Number of snapshots waiting for each background worker, beyond which the time loop waits (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--async_postproc_workers",
+        type=int,
+        default=1,
+        help="Number of background workers (threads) running the post-processing modules, keep 1 if several modules write netcdf files (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--checkpoint_freq",
+        type=float,
+        default=0,
+        help="Frequency (in years) at which the full state is checkpointed, 0 means never (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--checkpoint_dir",
+        type=str,
+        default="checkpoint",
+        help="Directory where the checkpoints are written (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--restart_from",
+        type=str,
+        default="",
+        help="Directory of the checkpoint to restart the simulation from, nothing if empty (default: %(default)s)",
+    )
 
     return parser
 
@@ -161,21 +275,188 @@ def setup_igm_params(
 
 
 def run_intializers(modules: List, params: Any, state: State) -> None:
+    if params.profile or params.profile_transfers:
+        from igm.profiling import Profiler
+
+        state.profiler = Profiler(params)
+        modules = state.profiler.wrap(modules)
+
     for module in modules:
         module.initialize(params, state)
 
+    if not params.restart_from == "":
+        from igm.checkpoint import load_checkpoint
+
+        load_checkpoint(params, state)
+
+    if (params.checkpoint_freq > 0) & hasattr(state, "t"):
+        from igm.checkpoint import initialize_checkpoint
+
+        initialize_checkpoint(params, state)
+
 
 def run_processes(modules: List, params: Any, state: State) -> None:
+    from igm.checkpoint import update_checkpoint
+
     if hasattr(state, "t"):
-        while state.t < params.time_end:
-            for module in modules:
-                module.update(params, state)
+        if params.fused_step:
+            # the first (non-advancing) iteration is run eagerly such that
+            # all the fields exchanged by the fused steps exist in the state,
+            # when restarting they are already restored from the checkpoint
+            if params.restart_from == "":
+                for module in modules:
+                    module.update(params, state)
+            modules = group_fused_modules(modules, params, state)
+
+        if params.async_postproc:
+            if not hasattr(state, "async_postproc"):
+                from igm.async_postproc import AsyncPostproc
+
+                state.async_postproc = AsyncPostproc(params)
+            modules = state.async_postproc.wrap(modules, params, state)
+
+        if hasattr(state, "profiler"):
+            modules = state.profiler.wrap(modules)
+
+        try:
+            while state.t < params.time_end:
+                if hasattr(state, "profiler"):
+                    state.profiler.begin_iteration()
+
+                for module in modules:
+                    module.update(params, state)
+
+                if params.checkpoint_freq > 0:
+                    update_checkpoint(params, state)
+        finally:
+            # make sure the last checkpoint is complete if the run crashes
+            if hasattr(state, "checkpoint_writer"):
+                state.checkpoint_writer.wait()
+
+
+class FusedStep:
+    """
+    Chain of consecutive process modules compiled into a single tf.function.
+
+    Each module of the chain provides fused_fields(params, state), which lists
+    the state attributes its step reads or modifies, and a pure function
+    fused_step(params, state, fields) mapping a dictionary of tensors to the
+    updated dictionary. Other attributes of the state (e.g. the emulator, dx,
+    vert_weight) are treated as constants of the graph. Modules can optionally
+    provide fused_prepare(params, state), which is called eagerly before the
+    graph (e.g. to retrain the emulator). The object mimics a module such that
+    it can be used in the time loop of run_processes.
+    """
+
+    def __init__(self, modules: List[ModuleType], params: Any, state: State):
+        import tensorflow as tf
+
+        self.modules = modules
+        self.params = params
+        self.state = state
+        self.names = []
+        for module in modules:
+            for name in module.fused_fields(params, state):
+                if name not in self.names:
+                    self.names.append(name)
+        self.__name__ = "fused_" + "_".join(
+            [module.__name__.split(".")[-1] for module in modules]
+        )
+        self.tcomp = "tcomp_" + self.__name__
+        setattr(state, self.tcomp, [])
+        self.function = tf.function(self._step, jit_compile=params.fused_step_jit)
+
+    def _step(self, fields, scalars):
+        import tensorflow as tf
+
+        for module in self.modules:
+            fields = module.fused_step(self.params, self.state, dict(fields))
+        fields = {name: fields[name] for name in self.names}
+
+        # the fields that are python scalars (e.g. it, saveresult) are also
+        # returned in a single tensor, such that they are read at once
+        packed = [tf.cast(fields[name], tf.float64) for name in scalars]
+        return fields, tf.stack(packed) if len(packed) > 0 else tf.zeros([0], tf.float64)
+
+    def update(self, params: Any, state: State) -> None:
+        import tensorflow as tf
+
+        getattr(state, self.tcomp).append(time.time())
+
+        for module in self.modules:
+            if hasattr(module, "fused_prepare"):
+                module.fused_prepare(params, state)
+
+        fields = {}
+        scalars = []
+        for name in self.names:
+            value = getattr(state, name)
+            # python scalars are converted such that the graph is not retraced
+            if isinstance(value, (bool, int, float)):
+                value = tf.constant(value)
+                scalars.append(name)
+            fields[name] = value
+
+        fields, packed = self.function(fields, tuple(scalars))
+
+        # a single transfer to the host for all the python scalars
+        packed = packed.numpy() if len(scalars) > 0 else []
+
+        for name in self.names:
+            value = getattr(state, name)
+            if isinstance(value, tf.Variable):
+                value.assign(fields[name])
+            elif name in scalars:
+                setattr(state, name, type(value)(packed[scalars.index(name)]))
+            else:
+                setattr(state, name, fields[name])
+
+        getattr(state, self.tcomp)[-1] -= time.time()
+        getattr(state, self.tcomp)[-1] *= -1
+
+
+def is_fusable(module: ModuleType, params: Any, state: State) -> bool:
+    if not (hasattr(module, "fused_fields") & hasattr(module, "fused_step")):
+        return False
+    return module.fused_fields(params, state) is not None
+
+
+def group_fused_modules(modules: List, params: Any, state: State) -> List:
+    """Replaces consecutive fusable modules by FusedStep objects."""
+
+    grouped = []
+    chain = []
+    for module in modules + [None]:
+        if (module is not None) and is_fusable(module, params, state):
+            chain.append(module)
+            continue
+        if len(chain) > 0:
+            grouped.append(FusedStep(chain, params, state))
+            chain = []
+        if module is not None:
+            grouped.append(module)
+
+    return grouped
 
 
 def run_finalizers(modules: List, params: Any, state: State) -> None:
+    if hasattr(state, "async_postproc"):
+        state.async_postproc.flush(state)
+
+    if hasattr(state, "checkpoint_writer"):
+        from igm.checkpoint import finalize_checkpoint
+
+        finalize_checkpoint(params, state)
+
+    if hasattr(state, "profiler"):
+        modules = state.profiler.wrap(modules)
+
     for module in modules:
         module.finalize(params, state)
 
+    if hasattr(state, "profiler"):
+        state.profiler.write()
+
 
 def add_logger(params, state) -> None:
     if params.logging_file == "":
@@ -313,6 +594,37 @@ def load_modules(modules_dict: Dict) -> List[ModuleType]:
     )
 
 
+class LazyModule:
+    """
+    Module of the igm package imported at its first use (i.e. when the simulation
+    starts), its parameters are read from the manifest (see igm/manifest.py)
+    such that parsing the parameters does not import tensorflow.
+    """
+
+    def __init__(self, module_path: str, arguments: List):
+        self.module_path = module_path
+        self.arguments = arguments
+        self._module = None
+
+    def params(self, parser: ArgumentParser) -> None:
+        for flags, kwargs in self.arguments:
+            parser.add_argument(*flags, **kwargs)
+
+    @property
+    def module(self) -> ModuleType:
+        if self._module is None:
+            self._module = importlib.import_module(self.module_path)
+            validate_module(self._module)
+        return self._module
+
+    def __getattr__(self, name: str) -> Any:
+        if (name in ["_module", "module_path", "arguments"]) or (
+            name.startswith("__") and not name == "__name__"
+        ):
+            raise AttributeError(name)
+        return getattr(self.module, name)
+
+
 def validate_module(module) -> None:
     """Validates that a module has the required functions to be used in IGM."""
     required_functions = ["params", "initialize", "finalize", "update"]
@@ -327,9 +639,18 @@ def validate_module(module) -> None:
 def load_modules_from_directory(
     modules_list: List[str], module_folder: str
 ) -> List[ModuleType]:
+    from igm.manifest import get_manifest_arguments
+
     imported_modules = []
     for module_name in modules_list:
         module_path = f"igm.modules.{module_folder}.{module_name}"
+
+        # modules of the package listed in the manifest are imported at first use
+        arguments = get_manifest_arguments(module_folder, module_name)
+        if arguments is not None:
+            imported_modules.append(LazyModule(module_path, arguments))
+            continue
+
         try:
             module = importlib.import_module(module_path)
         except ModuleNotFoundError:
@@ -393,6 +714,8 @@ def load_modules_from_directory(
 
 
 def print_gpu_info() -> None:
+    import tensorflow as tf
+
     gpus = tf.config.experimental.list_physical_devices("GPU")
     print(f"{'CUDA Enviroment':-^150}")
     tf.sysconfig.get_build_info().pop("cuda_compute_capabilities", None)
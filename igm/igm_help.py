@@ -3,7 +3,6 @@
 # Copyright (C) 2021-2023 Guillaume Jouvet <guillaume.jouvet@unil.ch>
 # Published under the GNU GPL (Version 3), check at the LICENSE file
 
-import tensorflow as tf
 import sys
 from igm import (
     State,
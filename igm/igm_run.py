@@ -4,7 +4,6 @@
 # Published under the GNU GPL (Version 3), check at the LICENSE file
 
 import os
-import tensorflow as tf
 from igm import (
     State,
     params_core,
@@ -25,15 +24,18 @@ def main() -> None:
     parser = params_core()
     params, _ = parser.parse_known_args()
 
+    imported_modules = setup_igm_modules(params)
+    params = setup_igm_params(parser, imported_modules)
+
+    # tensorflow is imported once the parameters are parsed and validated
+    import tensorflow as tf
+
     if params.gpu_info:
         print_gpu_info()
 
     if params.logging:
         add_logger(params=params, state=state)
         tf.get_logger().setLevel(params.logging_level)
-        
-    imported_modules = setup_igm_modules(params)
-    params = setup_igm_params(parser, imported_modules)
 
     if params.print_params:
         print_params(params=params)
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+
+# Copyright (C) 2021-2023 Guillaume Jouvet <guillaume.jouvet@unil.ch>
+# Published under the GNU GPL (Version 3), check at the LICENSE file
+
+import os
+import time
+import argparse
+import traceback
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from igm import (
+    State,
+    params_core,
+    load_modules,
+    print_params,
+    run_intializers,
+    run_processes,
+    run_finalizers,
+    setup_igm_modules,
+    setup_igm_params,
+    add_logger,
+    download_unzip_and_store
+)
+
+
+def params_batch(parser):
+    parser.add_argument(
+        "--batch_RGI_IDs",
+        type=list,
+        default=[],
+        help="List of the RGI IDs of the glaciers to simulate with igm_run_batch",
+    )
+    parser.add_argument(
+        "--batch_RGI_IDs_file",
+        type=str,
+        default="",
+        help="Text file listing the RGI IDs of the glaciers to simulate (one per line), in addition to batch_RGI_IDs",
+    )
+    parser.add_argument(
+        "--batch_workers",
+        type=int,
+        default=1,
+        help="Number of worker processes running the glaciers in parallel",
+    )
+    parser.add_argument(
+        "--batch_threads",
+        type=int,
+        default=0,
+        help="Number of CPU threads used by tensorflow in each worker, 0 means tensorflow's default",
+    )
+    parser.add_argument(
+        "--batch_folder",
+        type=str,
+        default="batch",
+        help="Folder in which each glacier is run in its own sub-folder",
+    )
+
+
+def get_RGI_IDs(params):
+    RGI_IDs = list(params.batch_RGI_IDs)
+    if not params.batch_RGI_IDs_file == "":
+        with open(params.batch_RGI_IDs_file, "r") as f:
+            for line in f:
+                if len(line.split()) > 0:
+                    RGI_IDs.append(line.split()[0])
+    return RGI_IDs
+
+
+def worker_environment(params_dict):
+    """
+    Environment variables of the worker processes, which must be set before
+    tensorflow is imported, i.e. when the workers are spawned
+    """
+    environment = {"CUDA_VISIBLE_DEVICES": str(params_dict["gpu_id"])}
+    if params_dict["batch_threads"] > 0:
+        environment["OMP_NUM_THREADS"] = str(params_dict["batch_threads"])
+    return environment
+
+
+def initialize_worker(params_dict):
+    """
+    Executed once by each worker process, before any tensorflow operation
+    """
+    import tensorflow as tf
+
+    if params_dict["batch_threads"] > 0:
+        tf.config.threading.set_intra_op_parallelism_threads(params_dict["batch_threads"])
+        tf.config.threading.set_inter_op_parallelism_threads(params_dict["batch_threads"])
+
+
+def run_glacier(RGI_ID, params_dict):
+    """
+    Run IGM for one glacier in its own sub-folder, the modules (and e.g. the
+    emulator or the OGGM set-up) loaded by a worker are reused for all its glaciers
+    """
+    import tensorflow as tf
+
+    params = argparse.Namespace(**params_dict)
+    params.oggm_RGI_ID = RGI_ID
+    params.oggm_run_batch = True
+
+    path = os.path.join(params.batch_folder, RGI_ID)
+    os.makedirs(path, exist_ok=True)
+
+    cwd = os.getcwd()
+    os.chdir(path)
+    start = time.time()
+    try:
+        imported_modules = load_modules(params_dict)
+
+        state = State()
+
+        if params.logging:
+            add_logger(params=params, state=state)
+
+        # gpu_id is the only GPU visible by the worker (CUDA_VISIBLE_DEVICES)
+        with tf.device("/GPU:0"):  # type: ignore for linting checks
+            run_intializers(imported_modules, params, state)
+            run_processes(imported_modules, params, state)
+            run_finalizers(imported_modules, params, state)
+
+        return {"RGI_ID": RGI_ID, "done": True, "time": time.time() - start}
+
+    except Exception as error:
+        with open("error.txt", "w") as f:
+            traceback.print_exc(file=f)
+        return {
+            "RGI_ID": RGI_ID,
+            "done": False,
+            "time": time.time() - start,
+            "error": repr(error),
+        }
+
+    finally:
+        os.chdir(cwd)
+
+
+def print_result(result):
+    if result["done"]:
+        print("IGM batch : %s done in %.1f s" % (result["RGI_ID"], result["time"]))
+    else:
+        print("IGM batch : %s skipped (%s)" % (result["RGI_ID"], result["error"]))
+
+
+def run_pool(RGI_IDs, params_dict, max_workers):
+    """
+    Run the glaciers on a pool of worker processes, returns their results and
+    the glaciers not run because a worker died (e.g. out of memory), which
+    breaks the pool
+    """
+    results = []
+    not_run = []
+    # processes are spawned (not forked) as tensorflow is not fork-safe
+    with ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=initialize_worker,
+        initargs=(params_dict,),
+    ) as executor:
+        futures = {
+            executor.submit(run_glacier, RGI_ID, params_dict): RGI_ID for RGI_ID in RGI_IDs
+        }
+        for future in as_completed(futures):
+            RGI_ID = futures[future]
+            try:
+                result = future.result()
+            except BrokenProcessPool:
+                not_run.append(RGI_ID)
+                continue
+            except Exception as error:
+                result = {"RGI_ID": RGI_ID, "done": False, "time": 0.0, "error": repr(error)}
+            print_result(result)
+            results.append(result)
+
+    not_run.sort(key=RGI_IDs.index)
+    return results, not_run
+
+
+def run_batch(params):
+    RGI_IDs = get_RGI_IDs(params)
+
+    assert len(RGI_IDs) > 0, "No glacier given to igm_run_batch, set batch_RGI_IDs or batch_RGI_IDs_file"
+
+    params_dict = vars(params).copy()
+    params_dict["batch_folder"] = os.path.abspath(params.batch_folder)
+    os.makedirs(params_dict["batch_folder"], exist_ok=True)
+
+    # the spawned workers inherit the environment of this process
+    environment = worker_environment(params_dict)
+    previous = {key: os.environ.get(key) for key in environment}
+    os.environ.update(environment)
+
+    # when a worker dies, the glaciers not run are run again one at a time on a
+    # new pool, such that the glacier killing its worker is the first one not
+    # run, it is skipped and the others are run again on batch_workers workers
+    results = []
+    remaining = list(RGI_IDs)
+    max_workers = params.batch_workers
+    try:
+        while len(remaining) > 0:
+            results_pool, remaining = run_pool(remaining, params_dict, max_workers)
+            results += results_pool
+            if len(remaining) == 0:
+                break
+            if max_workers == 1:
+                result = {
+                    "RGI_ID": remaining.pop(0),
+                    "done": False,
+                    "time": 0.0,
+                    "error": "the worker process died",
+                }
+                print_result(result)
+                results.append(result)
+                max_workers = params.batch_workers
+            else:
+                max_workers = 1
+    finally:
+        for key, value in previous.items():
+            if value is None:
+                os.environ.pop(key)
+            else:
+                os.environ[key] = value
+
+    # keep the order of the list of glaciers in the summary
+    results.sort(key=lambda result: RGI_IDs.index(result["RGI_ID"]))
+
+    with open(os.path.join(params_dict["batch_folder"], "batch_summary.txt"), "w") as f:
+        for result in results:
+            print(
+                "%s %s %.1f %s"
+                % (
+                    result["RGI_ID"],
+                    "done" if result["done"] else "skipped",
+                    result["time"],
+                    result.get("error", ""),
+                ),
+                file=f,
+            )
+
+    print(
+        "IGM batch : %s out of %s glaciers done"
+        % (sum([result["done"] for result in results]), len(results))
+    )
+
+    return results
+
+
+def main() -> None:
+    parser = params_core()
+    params_batch(parser)
+    params, _ = parser.parse_known_args()
+
+    imported_modules = setup_igm_modules(params)
+    params = setup_igm_params(parser, imported_modules)
+
+    if params.print_params:
+        print_params(params=params)
+
+    if not params.url_data=="":
+        download_unzip_and_store(params.url_data,params.folder_data)
+
+    run_batch(params)
+
+
+if __name__ == "__main__":
+    main()
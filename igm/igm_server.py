@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+
+# Copyright (C) 2021-2023 Guillaume Jouvet <guillaume.jouvet@unil.ch>
+# Published under the GNU GPL (Version 3), check at the LICENSE file
+
+"""
+Server mode: a long-lived process, listening on a UNIX socket, that runs the
+simulations submitted with igm_submit (or submit_job from python) one after
+the other. Tensorflow, the emulators (see load_emulator) and the traced
+tf.functions are kept between the jobs, such that the fixed cost of each run
+(e.g. in a parameter sweep) is paid once.
+
+A job is a JSON message {"folder": ..., "param_file": ..., "params": {...}},
+the simulation is run in the folder with the parameter file as igm_run would,
+and the parameters of "params" override those of the file. The answer lists
+the files written by the run:
+{"folder": ..., "done": ..., "time": ..., "outputs": [...], "error": ...}
+"""
+
+import os
+import sys
+import gc
+import json
+import time
+import socket
+import argparse
+import traceback
+from typing import Any, Dict, List
+from igm import (
+    State,
+    params_core,
+    load_modules,
+    get_modules_list,
+    load_user_defined_params,
+    run_intializers,
+    run_processes,
+    run_finalizers,
+    add_logger,
+)
+
+
+def params_server(parser):
+    parser.add_argument(
+        "--server_socket",
+        type=str,
+        default="igm.sock",
+        help="UNIX socket on which igm_server listens and to which igm_submit sends the jobs",
+    )
+
+
+def list_files(folder: str) -> Dict[str, float]:
+    files = {}
+    for root, dirs, names in os.walk(folder):
+        for name in names:
+            path = os.path.join(root, name)
+            files[path] = os.path.getmtime(path)
+    return files
+
+
+def job_params(job: Dict[str, Any], imported_modules: List) -> argparse.Namespace:
+    """Parse the parameters of a job as igm_run does with its command line."""
+    parser = params_core()
+    for module in imported_modules:
+        module.params(parser)
+    params, _ = parser.parse_known_args(args=["--param_file", job["param_file"]])
+
+    params_dict = load_user_defined_params(
+        param_file=job["param_file"], params_dict=vars(params)
+    )
+    for key in job.get("params", {}):
+        if key not in params_dict:
+            raise ValueError(f"The parameter {key} of the job is not recognized by IGM.")
+    params_dict.update(job.get("params", {}))
+
+    parser.set_defaults(**params_dict)
+    params, _ = parser.parse_known_args(args=[])
+    return params
+
+
+def run_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    import tensorflow as tf
+
+    modules_before = set(sys.modules)
+    cwd = os.getcwd()
+    folder = None
+    before = {}
+    start = time.time()
+    try:
+        folder = os.path.abspath(job["folder"])
+        job = dict(job, param_file=job.get("param_file", "params.json"))
+
+        # custom modules are looked for in the folder of the job
+        sys.path.insert(0, folder)
+        before = list_files(folder)
+        os.chdir(folder)
+
+        modules_dict = get_modules_list(job["param_file"])
+        modules_dict = {
+            key: job.get("params", {}).get(key, value) for key, value in modules_dict.items()
+        }
+        imported_modules = load_modules(modules_dict)
+        params = job_params(job, imported_modules)
+
+        state = State()
+
+        if params.logging:
+            add_logger(params=params, state=state)
+
+        with tf.device(f"/GPU:{params.gpu_id}"):  # type: ignore for linting checks
+            run_intializers(imported_modules, params, state)
+            run_processes(imported_modules, params, state)
+            run_finalizers(imported_modules, params, state)
+
+        result = {"folder": folder, "done": True}
+
+    except Exception as error:
+        traceback.print_exc()
+        result = {"folder": folder, "done": False, "error": repr(error)}
+
+    finally:
+        os.chdir(cwd)
+        if folder is not None:
+            sys.path.remove(folder)
+            # the custom modules of a job are not seen by the next ones
+            for name in set(sys.modules) - modules_before:
+                path = getattr(sys.modules[name], "__file__", None) or ""
+                if os.path.abspath(path).startswith(folder + os.sep):
+                    del sys.modules[name]
+        gc.collect()
+
+    result["time"] = time.time() - start
+    result["outputs"] = sorted(
+        [
+            path
+            for path, mtime in (list_files(folder) if folder is not None else {}).items()
+            if (path not in before) or (mtime > before[path])
+        ]
+    )
+    return result
+
+
+def receive(connection: socket.socket) -> Dict[str, Any]:
+    data = b""
+    while not data.endswith(b"\n"):
+        chunk = connection.recv(65536)
+        if not chunk:
+            break
+        data += chunk
+    return json.loads(data.decode())
+
+
+def send(connection: socket.socket, message: Dict[str, Any]) -> None:
+    connection.sendall((json.dumps(message) + "\n").encode())
+
+
+def serve(socket_path: str) -> None:
+    """Run the jobs received on the socket, until a job {"command": "shutdown"}."""
+    # tensorflow is imported once, before the first job
+    import tensorflow as tf
+
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(socket_path)
+    server.listen()
+    print("IGM server : listening on " + socket_path)
+
+    try:
+        while True:
+            connection, _ = server.accept()
+            with connection:
+                try:
+                    job = receive(connection)
+                    if job.get("command", "") == "shutdown":
+                        send(connection, {"done": True})
+                        break
+                    print("IGM server : running " + str(job.get("folder")))
+                    result = run_job(job)
+                    print("IGM server : %s done in %.1f s" % (result["folder"], result["time"]))
+                    send(connection, result)
+                except Exception as error:
+                    # a malformed job or a lost connection does not stop the server
+                    traceback.print_exc()
+                    try:
+                        send(connection, {"done": False, "error": repr(error)})
+                    except OSError:
+                        pass
+    finally:
+        server.close()
+        os.remove(socket_path)
+
+
+def submit_job(job: Dict[str, Any], socket_path: str = "igm.sock") -> Dict[str, Any]:
+    """Send a job to the server and wait for its result."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(socket_path)
+        send(connection, job)
+        return receive(connection)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run the jobs submitted with igm_submit.")
+    params_server(parser)
+    params, _ = parser.parse_known_args()
+
+    serve(os.path.abspath(params.server_socket))
+
+
+def main_submit() -> None:
+    parser = argparse.ArgumentParser(
+        description="Run a simulation of the current folder with igm_server."
+    )
+    params_server(parser)
+    parser.add_argument(
+        "--param_file",
+        type=str,
+        default="params.json",
+        help="Path for the JSON parameter file. (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--shutdown",
+        action="store_true",
+        help="Stop the server",
+    )
+    params, _ = parser.parse_known_args()
+
+    if params.shutdown:
+        submit_job({"command": "shutdown"}, params.server_socket)
+        return
+
+    result = submit_job(
+        {"folder": os.getcwd(), "param_file": params.param_file}, params.server_socket
+    )
+
+    if result["done"]:
+        print("IGM server : done in %.1f s, outputs :" % result["time"])
+        for path in result["outputs"]:
+            print("     " + path)
+    else:
+        print("IGM server : failed (%s)" % result["error"])
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
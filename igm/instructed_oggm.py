@@ -15,6 +15,7 @@ from oggm import cfg, utils
 from oggm.cfg import G, SEC_IN_YEAR, SEC_IN_DAY
 
 import igm
+import igm.modules.process.iceflow
 from oggm.core.sia2d import Model2D
 
 
@@ -100,7 +101,7 @@ class IGM_Model2D(Model2D):
         self.x = x
         self.y = y
 
-        self.params.retrain_iceflow_emulator_freq = 0
+        self.params.iflo_retrain_emulator_freq = 0
 
         # intialize
         self.state.thk = tf.Variable(self.ice_thick)
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+
+"""
+Copyright (C) 2021-2023 Guillaume Jouvet <guillaume.jouvet@unil.ch>
+Published under the GNU GPL (Version 3), check at the LICENSE file
+
+The manifest lists the parameters of the modules of the igm package, such that
+the parameters can be parsed and validated without importing the modules (and
+therefore tensorflow). Each entry holds a hash of the sources of the module, a
+module whose sources changed since the manifest was written is imported as
+before. The manifest is written in the package when it is built (see
+setup.py), and in a source tree with: python -m igm.manifest
+
+The params functions are read from the sources of the modules, not imported,
+such that the manifest can be written where tensorflow (or any other dependency
+of the modules) is not installed, as in the isolated environment of pip.
+"""
+
+import os
+import ast
+import json
+import hashlib
+import types
+from typing import Any, Dict, List, Optional
+
+from igm.common import str2bool
+
+MANIFEST_FILE = os.path.join(os.path.dirname(__file__), "modules", "manifest.json")
+
+MODULE_FOLDERS = ["preproc", "process", "postproc"]
+
+# types of the arguments that can be written in the manifest
+ARGUMENT_TYPES = {
+    "str": str,
+    "int": int,
+    "float": float,
+    "bool": bool,
+    "list": list,
+    "dict": dict,
+    "str2bool": str2bool,
+}
+
+_manifest = None
+
+
+class RecordingParser:
+    """Collects the arguments added by the params function of a module."""
+
+    def __init__(self):
+        self.arguments = []
+
+    def add_argument(self, *flags, **kwargs):
+        self.arguments.append((list(flags), kwargs))
+
+
+def module_hash(module_folder: str, module_name: str) -> str:
+    path = os.path.join(os.path.dirname(__file__), "modules", module_folder, module_name)
+    sha = hashlib.sha1()
+    for root, dirs, files in sorted(os.walk(path)):
+        dirs.sort()
+        for f in sorted(files):
+            if f.endswith(".py"):
+                with open(os.path.join(root, f), "rb") as fid:
+                    sha.update(f.encode())
+                    sha.update(fid.read())
+    return sha.hexdigest()
+
+
+def encode_arguments(arguments: List) -> Optional[List]:
+    """Returns None if an argument can not be written in the manifest."""
+    names = {value: name for name, value in ARGUMENT_TYPES.items()}
+    encoded = []
+    for flags, kwargs in arguments:
+        kwargs = dict(kwargs)
+        if "type" in kwargs:
+            if kwargs["type"] not in names:
+                return None
+            kwargs["type"] = names[kwargs["type"]]
+        try:
+            if not json.loads(json.dumps(kwargs)) == kwargs:
+                return None
+        except TypeError:
+            return None
+        encoded.append({"flags": flags, "kwargs": kwargs})
+    return encoded
+
+
+def decode_arguments(encoded: List) -> List:
+    arguments = []
+    for argument in encoded:
+        kwargs = dict(argument["kwargs"])
+        if "type" in kwargs:
+            kwargs["type"] = ARGUMENT_TYPES[kwargs["type"]]
+        arguments.append((argument["flags"], kwargs))
+    return arguments
+
+
+def read_params_function(module_folder: str, module_name: str) -> Optional[Any]:
+    """
+    Returns the params function of the module, read from its sources without
+    importing it, or None if it needs more than str2bool and the params
+    functions of the module (params, params_*) and of other modules of igm
+    """
+    path = os.path.join(os.path.dirname(__file__), "modules", module_folder, module_name)
+    namespace = {"str2bool": str2bool}
+    functions = []
+    for f in sorted(os.listdir(path)):
+        if not f.endswith(".py"):
+            continue
+        with open(os.path.join(path, f), "r") as fid:
+            tree = ast.parse(fid.read())
+        for node in tree.body:
+            if isinstance(node, ast.FunctionDef):
+                # the params function of the module, and its params_* helpers
+                if (node.name == "params_" + module_name) | (
+                    node.name.startswith("params_") & (f != module_name + ".py")
+                ) | ((node.name == "params") & (f == module_name + ".py")):
+                    functions.append(node)
+            elif isinstance(node, ast.ImportFrom) and (node.module or "").startswith(
+                "igm.modules."
+            ):
+                # e.g. from igm.modules.process.clim_oggm import params as params_clim_oggm
+                # or from igm.modules.process.iceflow import iceflow (for iceflow.params)
+                parts = node.module.split(".")
+                if not len(parts) == 4:
+                    continue
+                other = read_params_function(parts[2], parts[3])
+                if other is None:
+                    continue
+                for alias in node.names:
+                    if alias.name == "params":
+                        namespace[alias.asname or alias.name] = other
+                    elif alias.name == parts[3]:
+                        namespace[alias.asname or alias.name] = types.SimpleNamespace(
+                            params=other
+                        )
+
+    if not [node.name for node in functions].count("params") == 1:
+        return None
+    if not len(set(node.name for node in functions)) == len(functions):
+        return None
+
+    try:
+        exec(compile(ast.Module(body=functions, type_ignores=[]), path, "exec"), namespace)
+        namespace["params"](RecordingParser())
+    except Exception:
+        # e.g. a default value or an annotation defined elsewhere in the module
+        return None
+
+    return namespace["params"]
+
+
+def make_manifest() -> Dict[str, Any]:
+    """Records the parameters of all the modules of the package."""
+    manifest = {}
+    for module_folder in MODULE_FOLDERS:
+        path = os.path.join(os.path.dirname(__file__), "modules", module_folder)
+        for module_name in sorted(os.listdir(path)):
+            if not os.path.exists(os.path.join(path, module_name, "__init__.py")):
+                continue
+            params = read_params_function(module_folder, module_name)
+            if params is None:
+                print(f"Module {module_name} not in the manifest: params not readable")
+                continue
+            parser = RecordingParser()
+            params(parser)
+            arguments = encode_arguments(parser.arguments)
+            if arguments is None:
+                print(f"Module {module_name} not in the manifest: unsupported argument")
+                continue
+            manifest[f"{module_folder}/{module_name}"] = {
+                "hash": module_hash(module_folder, module_name),
+                "arguments": arguments,
+            }
+    return manifest
+
+
+def write_manifest(path: str = MANIFEST_FILE) -> None:
+    with open(path, "w") as f:
+        json.dump(make_manifest(), f, indent=1)
+
+
+def get_manifest_arguments(module_folder: str, module_name: str) -> Optional[List]:
+    """
+    Returns the arguments of the module (as pairs of flags and keyword arguments
+    of add_argument) if the manifest is up to date for this module, else None.
+    """
+    global _manifest
+    if _manifest is None:
+        if os.path.exists(MANIFEST_FILE):
+            with open(MANIFEST_FILE, "r") as f:
+                _manifest = json.load(f)
+        else:
+            _manifest = {}
+
+    entry = _manifest.get(f"{module_folder}/{module_name}")
+    if entry is None:
+        return None
+    if not entry["hash"] == module_hash(module_folder, module_name):
+        return None
+    return decode_arguments(entry["arguments"])
+
+
+if __name__ == "__main__":
+    write_manifest()
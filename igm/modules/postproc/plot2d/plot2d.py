@@ -108,10 +108,10 @@ def update(params, state):
                     s=0.5,
                     cmap="RdBu",
                 )
-        state.ax.set_title("YEAR : " + str(state.t.numpy()), size=15)
+        state.ax.set_title("YEAR : " + str(float(state.t)), size=15)
 
         if not hasattr(state, "already_set_cbar"):
-            state.cbar = plt.colorbar(im, label=params.plt2d_var)
+            state.cbar = state.fig.colorbar(im, ax=state.ax, label=params.plt2d_var)
             state.already_set_cbar = True
 
         if params.plt2d_live:
@@ -124,8 +124,8 @@ def update(params, state):
                 clear_output(wait=True)
                 display(state.fig)
         else:
-            plt.savefig(
-                params.plt2d_var + "-" + str(state.t.numpy()).zfill(4) + ".png",
+            state.fig.savefig(
+                params.plt2d_var + "-" + str(float(state.t)).zfill(4) + ".png",
                 bbox_inches="tight",
                 pad_inches=0.2,
             )
@@ -134,5 +134,16 @@ def update(params, state):
         state.tcomp_plot2d[-1] *= -1
 
 
+def async_fields(params, state):
+    # live plots are drawn by the main thread
+    if params.plt2d_live:
+        return None
+
+    return [
+        "topg", "thk", "ubar", "vbar", params.plt2d_var,
+        "particle_x", "particle_y", "particle_r",
+    ]
+
+
 def finalize(params, state):
     pass
@@ -52,18 +52,18 @@ def finalize(params, state):
 
     ################################################################
 
-    modules = [A for A in state.__dict__.keys() if "tcomp_" in A]
+    timings = _get_timings(state)
 
-    state.tcomp_all = [np.sum([np.sum(getattr(state, m)) for m in modules])]
+    state.tcomp_all = [np.sum([np.sum(timings[m]) for m in timings])]
 
     print("Computational statistics report:")
     with open("computational-statistics.txt", "w") as f:
-        for m in modules:
+        for m in timings:
             CELA = (
-                m[6:],
-                np.mean(getattr(state, m)),
-                np.sum(getattr(state, m)),
-                len(getattr(state, m)),
+                m,
+                np.mean(timings[m]),
+                np.sum(timings[m]),
+                len(timings[m]),
             )
             print(
                 "     %24s  |  mean time per it : %8.4f  |  total : %8.4f  |  number it : %8.0f"
@@ -80,6 +80,21 @@ def finalize(params, state):
     _plot_computational_pie(params, state)
 
 
+def _get_timings(state):
+    """
+    Return the computational times of each module, measured by the profiler if
+    activated (option --profile), else the tcomp_ lists filled by the modules
+    """
+    if hasattr(state, "profiler"):
+        return state.profiler.durations
+
+    return {
+        m[6:]: getattr(state, m)
+        for m in state.__dict__.keys()
+        if ("tcomp_" in m) & (not m == "tcomp_all")
+    }
+
+
 def _plot_computational_pie(params, state):
     """
     Plot to the computational time of each model components in a pie
@@ -96,12 +111,11 @@ def _plot_computational_pie(params, state):
     total = []
     name = []
 
-    modules = [A for A in state.__dict__.keys() if "tcomp_" in A]
-    modules.remove("tcomp_all")
+    timings = _get_timings(state)
 
-    for m in modules:
-        total.append(np.sum(getattr(state, m)[1:]))
-        name.append(m[6:])
+    for m in timings:
+        total.append(np.sum(timings[m][1:]))
+        name.append(m)
 
     sumallindiv = np.sum(total)
 
@@ -22,6 +22,7 @@ def initialize(params, state):
 def update(params, state):
     """
     This serves to print key info on the fly during computation
+    (in ensemble mode, the ice volume is averaged over the members)
     """
     if state.saveresult:
         print(
@@ -31,10 +32,14 @@ def update(params, state):
                 state.it,
                 state.t,
                 state.dt_target,
-                np.sum(state.thk) * (state.dx**2) / 10**9,
+                np.sum(state.thk) * (state.dx**2) / 10**9 / params.ensemble_size,
             )
         )
 
 
+def async_fields(params, state):
+    return ["dt_target", "thk"]
+
+
 def finalize(params, state):
     pass
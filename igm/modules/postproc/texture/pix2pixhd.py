@@ -25,7 +25,7 @@ class Pix2PixHDPipeline:
         self.params: Any = params
 
     def run(self) -> None:
-        year = int(round(self.state.t.numpy()))
+        year = int(round(float(self.state.t)))
 
         self.image.values = self.feature_normalizer.normalize_all(self.image.values)
 
@@ -2,5 +2,6 @@ from .write_ncdf import (
 	params,
 	initialize,
 	finalize,
-	update
+	update,
+	async_fields
 )
\ No newline at end of file
@@ -11,7 +11,7 @@ import tensorflow as tf
 import argparse
 from netCDF4 import Dataset
 
-from igm.modules.utils import getmag
+from igm.modules.utils import getmag, LazyFloat
 
 
 def params(parser):
@@ -115,7 +115,7 @@ def update(params, state):
             E.units = "yr"
             E.long_name = "time"
             E.axis = "T"
-            E[0] = state.t.numpy()
+            E[0] = float(state.t)
 
             nc.createDimension("y", len(state.y))
             E = nc.createVariable("y", np.dtype("float32").char, ("y",))
@@ -141,18 +141,21 @@ def update(params, state):
                     params.iflo_Nz
                 )  # TODO: fix this, that's not what we want
 
+            # in ensemble mode, a single file gathers all members
+            if params.ensemble_size > 1:
+                nc.createDimension("member", params.ensemble_size)
+                E = nc.createVariable("member", np.dtype("int32").char, ("member",))
+                E.long_name = "ensemble member"
+                E[:] = np.arange(params.ensemble_size)
+
             for var in params.wncd_vars_to_save:
                 if hasattr(state, var):
-                    if vars(state)[var].numpy().ndim == 2:
-                        E = nc.createVariable(
-                            var, np.dtype("float32").char, ("time", "y", "x")
-                        )
-                        E[0, :, :] = vars(state)[var].numpy()
-                    elif vars(state)[var].numpy().ndim == 3:
-                        E = nc.createVariable(
-                            var, np.dtype("float32").char, ("time", "z", "y", "x")
-                        )
-                        E[0, :, :, :] = vars(state)[var].numpy()
+                    E = nc.createVariable(
+                        var,
+                        np.dtype("float32").char,
+                        ("time",) + _dimensions(params, vars(state)[var].numpy().ndim),
+                    )
+                    E[0] = vars(state)[var].numpy()
                     if var in state.var_info_ncdf_ex.keys():
                         E.long_name = state.var_info_ncdf_ex[var][0]
                         E.units = state.var_info_ncdf_ex[var][1]
@@ -161,20 +164,17 @@ def update(params, state):
         else:
             if hasattr(state, "logger"):
                 state.logger.info(
-                    "Write NCDF ex file at time : " + str(state.t.numpy())
+                    "Write NCDF ex file at time : %s", LazyFloat(state.t)
                 )
 
             nc = Dataset( params.wncd_output_file, "a", format="NETCDF4" )
 
             d = nc.variables["time"][:].shape[0]
-            nc.variables["time"][d] = state.t.numpy()
+            nc.variables["time"][d] = float(state.t)
 
             for var in params.wncd_vars_to_save:
                 if hasattr(state, var):
-                    if vars(state)[var].numpy().ndim == 2:
-                        nc.variables[var][d, :, :] = vars(state)[var].numpy()
-                    elif vars(state)[var].numpy().ndim == 3:
-                        nc.variables[var][d, :, :, :] = vars(state)[var].numpy()
+                    nc.variables[var][d] = vars(state)[var].numpy()
 
             nc.close()
 
@@ -182,5 +182,31 @@ def update(params, state):
         state.tcomp_write_ncdf[-1] *= -1
 
 
+def async_fields(params, state):
+    # the magnitudes and means are computed from their components
+    components = {
+        "velbar_mag": ["ubar", "vbar"],
+        "velsurf_mag": ["uvelsurf", "vvelsurf"],
+        "velbase_mag": ["uvelbase", "vvelbase"],
+        "meanprec": ["precipitation"],
+        "meantemp": ["air_temp"],
+    }
+    fields = []
+    for var in params.wncd_vars_to_save:
+        fields += components.get(var, [var])
+    return fields
+
+
 def finalize(params, state):
     pass
+
+
+def _dimensions(params, ndim):
+    """
+    return the dimensions of a variable from its number of dimensions, the
+    first one being the member axis for fields of an ensemble
+    """
+    if (params.ensemble_size > 1) & (ndim > 2):
+        return ("member", "y", "x") if ndim == 3 else ("member", "z", "y", "x")
+    else:
+        return ("y", "x") if ndim == 2 else ("z", "y", "x")
@@ -46,7 +46,7 @@ def update(params, state):
 
         f = os.path.join(
             "trajectories",
-            "traj-" + "{:06d}".format(int(state.t.numpy())) + ".csv",
+            "traj-" + "{:06d}".format(int(float(state.t))) + ".csv",
         )
 
         ID = tf.cast(tf.range(state.particle_x.shape[0]), dtype="float32")
@@ -70,12 +70,12 @@ def update(params, state):
 
         ft = os.path.join("trajectories", "time.dat")
         with open(ft, "a") as f:
-            print(state.t.numpy(), file=f)
+            print(float(state.t), file=f)
 
         if params.wpar_add_topography:
             ftt = os.path.join(
                 "trajectories",
-                "usurf-" + "{:06d}".format(int(state.t.numpy())) + ".csv",
+                "usurf-" + "{:06d}".format(int(float(state.t))) + ".csv",
             )
             array = tf.transpose(
                 tf.stack(
@@ -92,5 +92,12 @@ def update(params, state):
         state.tcomp_write_particles[-1] *= -1
 
 
+def async_fields(params, state):
+    return [
+        "particle_x", "particle_y", "particle_z", "particle_r", "particle_t",
+        "particle_englt", "particle_topg", "particle_thk", "usurf",
+    ]
+
+
 def finalize(params, state):
     pass
@@ -2,5 +2,6 @@ from .write_tif import (
 	params,
 	initialize,
 	finalize,
-	update
+	update,
+	async_fields
 )
\ No newline at end of file
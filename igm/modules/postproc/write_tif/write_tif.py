@@ -58,5 +58,9 @@ def update(params, state):
             del src
 
 
+def async_fields(params, state):
+    return list(params.wtif_vars_to_save)
+
+
 def finalize(params, state):
     pass
\ No newline at end of file
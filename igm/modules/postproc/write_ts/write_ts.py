@@ -7,6 +7,8 @@ import numpy as np
 import os
 from netCDF4 import Dataset
 
+from igm.modules.utils import LazyFloat
+
 
 def params(parser):
     parser.add_argument(
@@ -27,7 +29,11 @@ def initialize(params, state):
 
 def update(params, state):
     if state.saveresult:
-        vol = np.sum(state.thk) * (state.dx**2) / 10**9
+        if params.precision_float64:
+            # the sum over large grids loses digits in float32
+            vol = np.sum(np.asarray(state.thk, dtype="float64")) * (float(state.dx)**2) / 10**9
+        else:
+            vol = np.sum(state.thk) * (state.dx**2) / 10**9
         area = np.sum(state.thk > 1) * (state.dx**2) / 10**6
 
         if not hasattr(state, "already_called_update_write_ts"):
@@ -43,11 +49,13 @@ def update(params, state):
             E.units = "yr"
             E.long_name = "time"
             E.axis = "T"
-            E[0] = state.t.numpy()
+            E[0] = float(state.t)
 
+            # the sums in float64 are not truncated on disk
+            dtype = "float64" if params.precision_float64 else "float32"
             for var in ["vol", "area"]:
-                E = nc.createVariable(var, np.dtype("float32").char, ("time"))
-                E[0] = vars()[var].numpy()
+                E = nc.createVariable(var, np.dtype(dtype).char, ("time"))
+                E[0] = float(vars()[var])
                 E.long_name = state.var_info_ncdf_ts[var][0]
                 E.units = state.var_info_ncdf_ts[var][1]
             nc.close()
@@ -55,17 +63,21 @@ def update(params, state):
         else:
             if hasattr(state, "logger"):
                 state.logger.info(
-                    "Write NCDF ts file at time : " + str(state.t.numpy())
+                    "Write NCDF ts file at time : %s", LazyFloat(state.t)
                 )
 
             nc = Dataset( params.wts_output_file, "a", format="NETCDF4" )
             d = nc.variables["time"][:].shape[0]
 
-            nc.variables["time"][d] = state.t.numpy()
+            nc.variables["time"][d] = float(state.t)
             for var in ["vol", "area"]:
-                nc.variables[var][d] = vars()[var].numpy()
+                nc.variables[var][d] = float(vars()[var])
             nc.close()
 
 
+def async_fields(params, state):
+    return ["thk"]
+
+
 def finalize(params, state):
     pass
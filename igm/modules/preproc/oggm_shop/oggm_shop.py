@@ -96,6 +96,12 @@ def params(parser):
         default=False,
         help="Run all the glaciers in the world",
     )
+    parser.add_argument(
+        "--oggm_max_grid_size",
+        type=int,
+        default=0,
+        help="Skip glaciers whose grid has more points than this number, 0 means no limit (useful with igm_run_batch to avoid GPU memory overflow)",
+    )
 
 def initialize(params, state):
 
@@ -107,6 +113,9 @@ def initialize(params, state):
     ncpath = os.path.join(params.oggm_RGI_ID, "gridded_data.nc")
     if not os.path.exists(ncpath):
         msg = f'OGGM data issue with glacier {params.oggm_RGI_ID}'
+        if params.oggm_run_batch:
+            # igm_run_batch catches the error and moves on to the next glacier
+            raise ValueError(msg)
         if hasattr(state, "logger"):
             state.logger.info(msg)
         else:
@@ -121,13 +130,14 @@ def initialize(params, state):
     x = np.squeeze(nc.variables["x"]).astype("float32")
     y = np.flip(np.squeeze(nc.variables["y"]).astype("float32"))
 
-    #If you know that grids above a certain size are going to make your GPU memory explode,
-    #activating this commented block and setting the number in the if statement to your
-    #maximum threshold will cause IGM to skip execution and move on to the next one
-    #(only relevant if using igm_run_batch, hence why I've not made it a parameter yet)
-    # if len(x)*len(y) >= 160000:
-    #     print('Skipping this one: '+params.oggm_RGI_ID)
-    #     return
+    # If you know that grids above a certain size are going to make your GPU memory explode,
+    # setting oggm_max_grid_size to your maximum threshold will cause IGM to skip execution
+    # (igm_run_batch then moves on to the next glacier)
+    if (params.oggm_max_grid_size > 0) & (len(x) * len(y) > params.oggm_max_grid_size):
+        nc.close()
+        raise ValueError(
+            f"Grid of glacier {params.oggm_RGI_ID} is too large: {len(x)}x{len(y)}"
+        )
 
     try:
         thk = np.flipud(np.squeeze(nc.variables[params.oggm_thk_source]).astype("float32"))
@@ -327,6 +337,9 @@ def finalize(params, state):
 #########################################################################
 
 
+_oggm_initialized = False
+
+
 def _oggm_util(RGIs, params):
     """
     Function written by Fabien Maussion
@@ -349,14 +362,22 @@ def _oggm_util(RGIs, params):
         #   - xarray
         #   - oggm
 
-        # Initialize OGGM and set up the default run parameters
-        cfg.initialize_minimal()
+        # Initialize OGGM and set up the default run parameters, this is done
+        # once per process when running a batch of glaciers
+        global _oggm_initialized
+        if not (params.oggm_run_batch & _oggm_initialized):
+            cfg.initialize_minimal()
+            _oggm_initialized = True
 
         cfg.PARAMS["continue_on_error"] = True
         cfg.PARAMS["use_multiprocessing"] = False
 
         WD = "OGGM-prepro"
 
+        # workers of igm_run_batch must not share (and reset) the same directory
+        if params.oggm_run_batch:
+            WD += "-" + str(os.getpid())
+
         # Where to store the data for the run - should be somewhere you have access to
         cfg.PATHS["working_dir"] = utils.gettempdir(dirname=WD, reset=True)
 
@@ -391,6 +412,8 @@ def _oggm_util(RGIs, params):
         # In my view this code should almost never be needed
 
         WD = "OGGM-dir"
+        if params.oggm_run_batch:
+            WD += "-" + str(os.getpid())
 
         # Initialize OGGM and set up the default run parameters
         cfg.initialize()
@@ -3,4 +3,4 @@
 # Copyright (C) 2021-2023 Guillaume Jouvet <guillaume.jouvet@unil.ch>
 # Published under the GNU GPL (Version 3), check at the LICENSE file
 
-from . import iceflow
\ No newline at end of file
+# modules are imported at first use, such that importing igm does not import tensorflow
\ No newline at end of file
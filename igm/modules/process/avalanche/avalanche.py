@@ -7,6 +7,8 @@ import matplotlib.pyplot as plt
 import tensorflow as tf
 import time
 
+from igm.modules.utils import LazyFloat
+
 
 def params(parser):
     parser.add_argument(
@@ -26,13 +28,13 @@ def params(parser):
 
 def initialize(params, state):
     state.tcomp_avalanche = []
-    state.tlast_avalanche = tf.Variable(params.time_start, dtype=tf.float32)
+    state.tlast_avalanche = params.time_start
 
 
 def update(params, state):
     if (state.t - state.tlast_avalanche) >= params.avalanche_update_freq:
         if hasattr(state, "logger"):
-            state.logger.info("Update AVALANCHE at time : " + str(state.t.numpy()))
+            state.logger.info("Update AVALANCHE at time : %s", LazyFloat(state.t))
 
         state.tcomp_avalanche.append(time.time())
 
@@ -44,68 +46,7 @@ def update(params, state):
         )
         Ho = tf.maximum(H, 0)
 
-        count = 0
-
-        while True:
-            count += 1
-
-            dZidx_down = tf.pad(
-                tf.maximum(Zi[:, 1:] - Zi[:, :-1], 0), [[0, 0], [1, 0]], "CONSTANT"
-            )
-            dZidx_up = tf.pad(
-                tf.maximum(Zi[:, :-1] - Zi[:, 1:], 0), [[0, 0], [0, 1]], "CONSTANT"
-            )
-            dZidx = tf.maximum(dZidx_down, dZidx_up)
-
-            dZidy_left = tf.pad(
-                tf.maximum(Zi[1:, :] - Zi[:-1, :], 0), [[1, 0], [0, 0]], "CONSTANT"
-            )
-            dZidy_right = tf.pad(
-                tf.maximum(Zi[:-1, :] - Zi[1:, :], 0), [[0, 1], [0, 0]], "CONSTANT"
-            )
-            dZidy = tf.maximum(dZidy_right, dZidy_left)
-
-            grad = tf.math.sqrt(dZidx**2 + dZidy**2)
-            gradT = dZidy_left + dZidy_right + dZidx_down + dZidx_up
-            gradT = tf.where(gradT == 0, 1, gradT)
-            grad = tf.where(Ho < 0.1, 0, grad)
-
-            mxGrad = tf.reduce_max(grad)
-            if mxGrad <= 1.1 * dHRepose:
-                break
-
-            delH = tf.maximum(0, (grad - dHRepose) / 3.0)
-
-            Htmp = Ho
-            Ho = tf.maximum(0, Htmp - delH)
-            delH = Htmp - Ho
-
-            delHup = tf.pad(
-                delH[:, :-1] * dZidx_up[:, :-1] / gradT[:, :-1],
-                [[0, 0], [1, 0]],
-                "CONSTANT",
-            )
-            delHdn = tf.pad(
-                delH[:, 1:] * dZidx_down[:, 1:] / gradT[:, 1:],
-                [[0, 0], [0, 1]],
-                "CONSTANT",
-            )
-            delHrt = tf.pad(
-                delH[:-1, :] * dZidy_right[:-1, :] / gradT[:-1, :],
-                [[1, 0], [0, 0]],
-                "CONSTANT",
-            )
-            delHlt = tf.pad(
-                delH[1:, :] * dZidy_left[1:, :] / gradT[1:, :],
-                [[0, 1], [0, 0]],
-                "CONSTANT",
-            )
-
-            Ho = tf.maximum(0, Ho + delHdn + delHup + delHlt + delHrt)
-
-            Zi = Zb + Ho
-
-        # print(count)
+        Ho = _avalanche(Ho, Zi, Zb, dHRepose)
 
         # fig = plt.figure(figsize=(10, 10))
         # plt.imshow( Ho + tf.where(H<0,H,0) - state.thk ,origin='lower'); plt.colorbar()
@@ -114,7 +55,7 @@ def update(params, state):
 
         state.usurf = state.topg + state.thk
 
-        state.tlast_avalanche.assign(state.t)
+        state.tlast_avalanche = float(state.t)
 
         state.tcomp_avalanche[-1] -= time.time()
         state.tcomp_avalanche[-1] *= -1
@@ -122,3 +63,75 @@ def update(params, state):
 
 def finalize(params, state):
     pass
+
+
+@tf.function()
+def _avalanche(Ho, Zi, Zb, dHRepose):
+    # the stopping criterion is evaluated in the graph (tf.while_loop), such that
+    # iterating does not require a device to host transfer at each iteration
+
+    def relax(Ho, Zi, go_on):
+        dZidx_down = tf.pad(
+            tf.maximum(Zi[:, 1:] - Zi[:, :-1], 0.0), [[0, 0], [1, 0]], "CONSTANT"
+        )
+        dZidx_up = tf.pad(
+            tf.maximum(Zi[:, :-1] - Zi[:, 1:], 0.0), [[0, 0], [0, 1]], "CONSTANT"
+        )
+        dZidx = tf.maximum(dZidx_down, dZidx_up)
+
+        dZidy_left = tf.pad(
+            tf.maximum(Zi[1:, :] - Zi[:-1, :], 0.0), [[1, 0], [0, 0]], "CONSTANT"
+        )
+        dZidy_right = tf.pad(
+            tf.maximum(Zi[:-1, :] - Zi[1:, :], 0.0), [[0, 1], [0, 0]], "CONSTANT"
+        )
+        dZidy = tf.maximum(dZidy_right, dZidy_left)
+
+        grad = tf.math.sqrt(dZidx**2 + dZidy**2)
+        gradT = dZidy_left + dZidy_right + dZidx_down + dZidx_up
+        gradT = tf.where(gradT == 0, 1.0, gradT)
+        grad = tf.where(Ho < 0.1, 0.0, grad)
+
+        mxGrad = tf.reduce_max(grad)
+        go_on = mxGrad > 1.1 * dHRepose
+
+        delH = tf.maximum(0.0, (grad - dHRepose) / 3.0)
+
+        Htmp = Ho
+        Hn = tf.maximum(0.0, Htmp - delH)
+        delH = Htmp - Hn
+
+        delHup = tf.pad(
+            delH[:, :-1] * dZidx_up[:, :-1] / gradT[:, :-1],
+            [[0, 0], [1, 0]],
+            "CONSTANT",
+        )
+        delHdn = tf.pad(
+            delH[:, 1:] * dZidx_down[:, 1:] / gradT[:, 1:],
+            [[0, 0], [0, 1]],
+            "CONSTANT",
+        )
+        delHrt = tf.pad(
+            delH[:-1, :] * dZidy_right[:-1, :] / gradT[:-1, :],
+            [[1, 0], [0, 0]],
+            "CONSTANT",
+        )
+        delHlt = tf.pad(
+            delH[1:, :] * dZidy_left[1:, :] / gradT[1:, :],
+            [[0, 1], [0, 0]],
+            "CONSTANT",
+        )
+
+        Hn = tf.maximum(0.0, Hn + delHdn + delHup + delHlt + delHrt)
+
+        # once the slopes are below the angle of repose, the thickness is kept
+        Ho = tf.where(go_on, Hn, Ho)
+        Zi = tf.where(go_on, Zb + Hn, Zi)
+
+        return Ho, Zi, go_on
+
+    Ho, Zi, go_on = tf.while_loop(
+        lambda Ho, Zi, go_on: go_on, relax, [Ho, Zi, tf.constant(True)]
+    )
+
+    return Ho
@@ -10,7 +10,7 @@ import tensorflow as tf
 import time
 from netCDF4 import Dataset
 import json
-from igm.modules.utils import interp1d_tf
+from igm.modules.utils import interp1d_tf, LazyFloat
 
 
 def params(parser):
@@ -111,7 +111,7 @@ def initialize(params, state):
         dtype="float32", trainable=False
     )
 
-    state.tlast_clim_oggm = tf.Variable(-(10**10), dtype="float32", trainable=False)
+    state.tlast_clim_oggm = -(10.0**10)
     state.tcomp_clim_oggm = []
 
     if params.clim_oggm_clim_trend_array == []:
@@ -131,7 +131,7 @@ def initialize(params, state):
 def update(params, state):
     if (state.t - state.tlast_clim_oggm) >= params.clim_oggm_update_freq:
         if hasattr(state, "logger"):
-            state.logger.info("update climate at time : " + str(state.t.numpy()))
+            state.logger.info("update climate at time : %s", LazyFloat(state.t))
 
         state.tcomp_clim_oggm.append(time.time())
 
@@ -178,7 +178,7 @@ def update(params, state):
         state.meanprec = tf.math.reduce_mean(state.precipitation, axis=0)
         state.meantemp = tf.math.reduce_mean(state.air_temp, axis=0)
 
-        state.tlast_clim_oggm.assign(state.t)
+        state.tlast_clim_oggm = float(state.t)
 
         state.tcomp_clim_oggm[-1] -= time.time()
         state.tcomp_clim_oggm[-1] *= -1
@@ -192,7 +192,7 @@ def initialize(params, state):
 
 def update(params, state):
     if hasattr(state, "logger"):
-        state.logger.info("Update ENTHALPY at time : " + str(state.t.numpy()))
+        state.logger.info("Update ENTHALPY at time : %s", LazyFloat(state.t))
 
     state.tcomp_enthalpy.append(time.time())
 
@@ -301,6 +301,7 @@ def update(params, state):
         params.enth_spy,
         params.enth_KtdivKc,
         params.enth_drain_ice_column,
+        params.precision_float64,
     )
 
     state.basalMeltRate = tf.clip_by_value(state.basalMeltRate, 0.0, 10.0**10)
@@ -610,9 +611,9 @@ def solve_TDMA_new(L, M, U, R):
 
     nz = tf.shape(M)[0]
 
-    w = tf.TensorArray(dtype=tf.float32, size=nz-1)
-    g = tf.TensorArray(dtype=tf.float32, size=nz)
-    p = tf.TensorArray(dtype=tf.float32, size=nz)
+    w = tf.TensorArray(dtype=M.dtype, size=nz-1)
+    g = tf.TensorArray(dtype=M.dtype, size=nz)
+    p = tf.TensorArray(dtype=M.dtype, size=nz)
 
     # Forward sweep
     w = w.write(0, U[0] / M[0])
@@ -765,6 +766,7 @@ def compute_enthalpy_basalmeltrate(
     spy,
     KtdivKc,
     drain_ice_column,
+    float64=False,
 ):
     nz, ny, nx = E.shape
 
@@ -812,7 +814,12 @@ def compute_enthalpy_basalmeltrate(
 
     # return the results of the solving of the boundary value problem (tridiagonal pb)
 #    E = solve_TDMA(L, M, U, R)
-    E = solve_TDMA_new(L, M, U, R)
+    if float64:
+        # the forward sweep accumulates the rounding errors along the column
+        E = solve_TDMA_new(*[tf.cast(A, "float64") for A in [L, M, U, R]])
+        E = tf.cast(E, "float32")
+    else:
+        E = solve_TDMA_new(L, M, U, R)
 
     # lower-bound at T = -30°C
     Emin = ci * (243.15 - ref_temp)
@@ -47,7 +47,7 @@ def initialize(params, state):
 
     if not hasattr(state,"tcomp_gflex"):
         state.tcomp_gflex = []
-        state.tlast_gflex = tf.Variable(params.time_start, dtype=tf.float32)
+        state.tlast_gflex = params.time_start
         state.topg0 = state.usurf - state.thk
 
     state.flex = F2D()
@@ -122,7 +122,7 @@ def update(params, state):
 
     if (state.t - state.tlast_gflex) >= params.gflex_update_freq:
         if hasattr(state, "logger"):
-            state.logger.info("Update gflex at time : " + str(state.t.numpy()))
+            state.logger.info("Update gflex at time : %s", LazyFloat(state.t))
 
         state.tcomp_gflex.append(time.time())
 
@@ -183,7 +183,7 @@ def update(params, state):
         # plt.imshow(state.flex.w)
         # plt.colorbar()
 
-        state.tlast_gflex.assign(state.t)
+        state.tlast_gflex = float(state.t)
 
         state.tcomp_gflex[-1] -= time.time()
         state.tcomp_gflex[-1] *= -1
@@ -36,14 +36,14 @@ def params(parser):
 
 def initialize(params, state):
     state.tcomp_glerosion = []
-    state.tlast_erosion = tf.Variable(params.time_start, dtype=tf.float32)
+    state.tlast_erosion = params.time_start
 
 
 def update(params, state):
     if (state.t - state.tlast_erosion) >= params.glerosion_update_freq:
         if hasattr(state, "logger"):
             state.logger.info(
-                "update topg_glacial_erosion at time : " + str(state.t.numpy())
+                "update topg_glacial_erosion at time : %s", LazyFloat(state.t)
             )
 
         state.tcomp_glerosion.append(time.time())
@@ -58,7 +58,7 @@ def update(params, state):
         # THIS WORK ONLY FOR GROUNDED ICE, TO BE ADAPTED FOR FLOATING ICE
         state.usurf = state.topg + state.thk
 
-        state.tlast_erosion.assign(state.t)
+        state.tlast_erosion = float(state.t)
 
         state.tcomp_glerosion[-1] -= time.time()
         state.tcomp_glerosion[-1] *= -1
@@ -2,5 +2,8 @@ from .iceflow import (
     params,
     initialize,
     finalize,
-    update
+    update,
+    fused_fields,
+    fused_prepare,
+    fused_step
 )
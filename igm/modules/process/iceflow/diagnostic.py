@@ -3,8 +3,11 @@ import tensorflow as tf
 
 from .utils import *
 from .solve import *
+from .solve import _solver_optimizer
 from .emulate import *
 
+from igm.async_postproc import Snapshot, AsyncWorker
+
 def initialize_iceflow_diagnostic(params,state):
 
     initialize_iceflow_emulator(params,state)
@@ -18,6 +21,12 @@ def initialize_iceflow_diagnostic(params,state):
         tf.zeros((params.iflo_Nz, state.thk.shape[0], state.thk.shape[1]))
     )
 
+    # the reference solves run in a background thread, one at a time
+    if params.iflo_diagnostic_async:
+        state.diagnostic_solve = ReferenceSolve(params, state)
+        state.diagnostic_worker = AsyncWorker(1)
+        state.diagnostic_nb_skipped = 0
+
 def update_iceflow_diagnostic(params, state):
     
     if params.iflo_retrain_emulator_freq > 0:
@@ -29,21 +38,89 @@ def update_iceflow_diagnostic(params, state):
     update_iceflow_emulated(params, state)
 
     if state.it % 10 == 0:
-        UT, VT, Cost_Glen = solve_iceflow(params, state, state.UT, state.VT)
-        state.UT.assign(UT)
-        state.VT.assign(VT)
-        COST_Glen = Cost_Glen[-1].numpy()
+        if params.iflo_diagnostic_async:
+            submit_reference_solve(params, state, COST_Emulator)
+        else:
+            UT, VT, Cost_Glen = solve_iceflow(params, state, state.UT, state.VT)
+            state.UT.assign(UT)
+            state.VT.assign(VT)
+
+            append_errors(state, state.U - state.UT, state.V - state.VT, Cost_Glen, COST_Emulator)
+
+
+def append_errors(state, dU, dV, Cost_Glen, COST_Emulator):
+    COST_Glen = Cost_Glen[-1].numpy()
+
+    print("nb solve iterations :", len(Cost_Glen))
+
+    l1, l2 = computemisfit(state, state.thk, dU, dV)
+
+    ERR = [float(state.t), COST_Glen, COST_Emulator, l1, l2]
+
+    print(ERR)
+
+    with open("errors.txt", "ab") as f:
+        np.savetxt(f, np.expand_dims(ERR, axis=0), delimiter=",", fmt="%5.5f")
 
-        print("nb solve iterations :", len(Cost_Glen))
 
-        l1, l2 = computemisfit(state, state.thk, state.U - state.UT, state.V - state.VT)
+class ReferenceSolve:
+    """
+    Reference solve of the diagnostic mode run by an AsyncWorker on a
+    snapshot of the state (iflo_diagnostic_async), from the velocity of the
+    previous reference solve and with its own optimizer. The misfit is
+    appended to errors.txt once the solve is done.
+    """
 
-        ERR = [state.t.numpy(), COST_Glen, COST_Emulator, l1, l2]
+    def __init__(self, params, state):
+        self.UT = tf.Variable(state.UT)
+        self.VT = tf.Variable(state.VT)
+        self.optimizer = _solver_optimizer(params)
 
-        print(ERR)
+    def run(self, params, snapshot):
+        view = snapshot.view({})
+        UT, VT, Cost_Glen = solve_iceflow(
+            params, view, self.UT, self.VT, optimizer=self.optimizer
+        )
+        self.UT.assign(UT)
+        self.VT.assign(VT)
 
-        with open("errors.txt", "ab") as f:
-            np.savetxt(f, np.expand_dims(ERR, axis=0), delimiter=",", fmt="%5.5f")
+        append_errors(view, view.U - UT, view.V - VT, Cost_Glen, view.diagnostic_cost_emulator)
+
+
+def submit_reference_solve(params, state, COST_Emulator):
+    """
+    Queue a reference solve on a snapshot of the state, or skip it if the
+    previous one is still waiting, such that the time loop never waits.
+    """
+    worker = state.diagnostic_worker
+    if worker.error is not None:
+        raise worker.error
+
+    if worker.queue.full():
+        state.diagnostic_nb_skipped += 1
+        return
+
+    state.diagnostic_cost_emulator = COST_Emulator
+    snapshot = Snapshot(state, params.iflo_fieldin + ["U", "V", "t"])
+    worker.submit((state.diagnostic_solve, params, snapshot))
+
+
+def finalize_iceflow_diagnostic(params, state):
+    """Wait for the reference solves still running, and keep the last reference velocity."""
+    if not params.iflo_diagnostic_async:
+        return
+
+    state.diagnostic_worker.close()
+    if state.diagnostic_worker.error is not None:
+        raise state.diagnostic_worker.error
+
+    state.UT.assign(state.diagnostic_solve.UT)
+    state.VT.assign(state.diagnostic_solve.VT)
+
+    print(
+        "Diagnostic : %d reference solves skipped, the previous one was still waiting"
+        % state.diagnostic_nb_skipped
+    )
 
 
 def computemisfit(state, thk, U, V):
@@ -0,0 +1,176 @@
+import numpy as np
+import tensorflow as tf
+import os
+import time
+import argparse
+
+from .utils import *
+from .energy_iceflow import *
+from .neural_network import *
+from .emulate import *
+from .solve import *
+from .solve import _solver_optimizer
+
+
+def distillation(params, state):
+    """
+    Train the cnn architectures of iflo_distill_architectures to reproduce the
+    teacher, the emulator or the solver if iflo_type is "solved", on states
+    sampled around the initial one (see distillation_samples). The fastest
+    student whose velocity error on the test samples (one sample out of two)
+    is below iflo_distill_budget is saved with its measured cost in
+    iflo_distill_directory (emulators in the working directory by default),
+    where it is found as the pretrained emulator of its configuration.
+    """
+    samples = distillation_samples(params, state)
+    X = tf.concat([fieldin_to_X(params, fieldin) for fieldin in samples], axis=0)
+    Y = tf.concat([teacher_outputs(params, state, fieldin) for fieldin in samples], axis=0)
+    mask = tf.expand_dims(tf.cast(X[..., params.iflo_fieldin.index("thk")] > 0, "float32"), -1)
+
+    X_train, Y_train, mask_train = X[::2], Y[::2], mask[::2]
+    X_test, Y_test, mask_test = X[1::2], Y[1::2], mask[1::2]
+
+    state.distill_results = []
+    for architecture in params.iflo_distill_architectures:
+        student_params = argparse.Namespace(**vars(params))
+        student_params.iflo_network = "cnn"
+        student_params.iflo_nb_layers, student_params.iflo_nb_out_filter = [
+            int(n) for n in architecture.split("_")
+        ]
+        model = cnn(student_params, X.shape[-1], Y.shape[-1])
+
+        start = time.time()
+        train_student(params, model, X_train, Y_train, mask_train)
+        training = time.time() - start
+
+        state.distill_results.append(
+            {
+                "architecture": architecture,
+                "params": student_params,
+                "model": model,
+                "error": float(_relative_error(model(X_test), Y_test, mask_test)),
+                "time": inference_time(model, X_test[:1]),
+                "training": training,
+            }
+        )
+
+    print("Distillation (error on the test samples, inference time on one sample):")
+    for result in state.distill_results:
+        print(
+            "     cnn %6s  |  error : %.3f  |  inference : %7.2f ms  |  training : %6.1f s"
+            % (result["architecture"], result["error"], 1000 * result["time"], result["training"])
+        )
+
+    candidates = [r for r in state.distill_results if r["error"] <= params.iflo_distill_budget]
+    if len(candidates) == 0:
+        print("No student below the error budget %s" % params.iflo_distill_budget)
+        state.distill_selected = None
+        return
+
+    state.distill_selected = min(candidates, key=lambda r: r["time"])
+    register_student(params, state.distill_selected)
+
+
+def distillation_samples(params, state, nb=None):
+    """
+    Input fields around those of the state: the ice thickness is scaled by a
+    factor in [0.5, 1.5], the Arrhenius factor and the sliding coefficient
+    by factors in [0.5, 2] (log-uniform), with a fixed seed
+    """
+    rng = np.random.default_rng(0)
+    fields = {f: vars(state)[f] for f in params.iflo_fieldin}
+
+    samples = []
+    for i in range(params.iflo_distill_nb_samples if nb is None else nb):
+        s = rng.uniform(0.5, 1.5)
+        sample = dict(fields)
+        sample["thk"] = s * fields["thk"]
+        sample["usurf"] = fields["usurf"] + (s - 1) * fields["thk"]
+        sample["arrhenius"] = np.exp(rng.uniform(np.log(0.5), np.log(2))) * fields["arrhenius"]
+        sample["slidingco"] = np.exp(rng.uniform(np.log(0.5), np.log(2))) * fields["slidingco"]
+        samples.append([sample[f] for f in params.iflo_fieldin])
+    return samples
+
+
+def teacher_outputs(params, state, fieldin):
+    """Outputs (Y) of the emulator on the fields, or of the solver if iflo_type is "solved"."""
+    if not params.iflo_type == "solved":
+        # the padding of the fields for the emulator is done by emulate_UV
+        U, V = emulate_UV(params, state, fieldin)
+        return UV_to_Y(params, U, V)
+
+    U = tf.Variable(tf.zeros_like(state.U))
+    V = tf.Variable(tf.zeros_like(state.V))
+    U, V, Cost_Glen = solve_iceflow(
+        params, state, U, V,
+        fieldin=[tf.expand_dims(f, axis=0) for f in fieldin],
+        optimizer=_solver_optimizer(params),
+    )
+    return UV_to_Y(params, U, V)
+
+
+def _relative_error(Y, Y_ref, mask):
+    """Relative L2 error of the velocities on the ice-covered cells."""
+    return tf.sqrt(
+        tf.reduce_sum(mask * (Y - Y_ref) ** 2) / tf.reduce_sum(mask * Y_ref**2)
+    )
+
+
+def train_student(params, model, X, Y, mask):
+    """Adam on the squared relative error, on batches of iflo_distill_batch_size samples drawn at random."""
+    optimizer = tf.keras.optimizers.Adam(learning_rate=params.iflo_distill_lr)
+    rng = np.random.default_rng(0)
+
+    @tf.function
+    def step(X, Y, mask):
+        with tf.GradientTape() as tape:
+            loss = _relative_error(model(X, training=True), Y, mask) ** 2
+        grads = tape.gradient(loss, model.trainable_variables)
+        optimizer.apply_gradients(zip(grads, model.trainable_variables))
+        return loss
+
+    for i in range(params.iflo_distill_nbit):
+        batch = rng.choice(X.shape[0], min(params.iflo_distill_batch_size, X.shape[0]), replace=False)
+        loss = step(tf.gather(X, batch), tf.gather(Y, batch), tf.gather(mask, batch))
+        if (i + 1) % 100 == 0:
+            print("distillation : ", i + 1, np.sqrt(loss.numpy()))
+
+
+def inference_time(model, X, nb_repeats=10):
+    """Median time of an evaluation of the model (eager, as in update_iceflow_emulated)."""
+    model(X)  # warm-up
+    times = []
+    for i in range(nb_repeats):
+        start = time.time()
+        model(X).numpy()
+        times.append(time.time() - start)
+    return float(np.median(times))
+
+
+def register_student(params, result):
+    """
+    Save the student as pinnbp_<Nz>_<vert_spacing>_cnn_<nb_layers>_<nb_out_filter>_
+    <dim_arrhenius>_<new_friction_param> in iflo_distill_directory, an existing
+    emulator is not overwritten
+    """
+    directory = params.iflo_distill_directory
+
+    name = "pinnbp_" + "_".join(str(c) for c in emulator_config(result["params"]))
+    result["path"] = os.path.join(directory, name)
+
+    if os.path.exists(result["path"]):
+        print("Distilled emulator not saved, " + result["path"] + " already exists")
+        return
+
+    save_emulator(result["params"], result["model"], result["path"])
+
+    with open(os.path.join(result["path"], "cost.dat"), "w") as fid:
+        fid.write("%.4f  %s \n" % (result["error"], "# relative error of the velocities against the teacher"))
+        fid.write("%.2f  %s \n" % (1000 * result["time"], "# inference time (ms) on the distillation samples"))
+        fid.write("%d  %s \n" % (result["model"].count_params(), "# number of weights"))
+        fid.write("%s  %s \n" % (params.iflo_type, "# teacher (solved: the solver, otherwise the emulator)"))
+
+    print("Distilled emulator saved in " + result["path"])
+
+    # the directory is indexed again, with the new emulator
+    clear_emulator_registry(directory)
@@ -2,58 +2,140 @@
 import numpy as np 
 import tensorflow as tf 
 import os
+import math
+import weakref
+from pathlib import Path
+from types import SimpleNamespace
 
 from .utils import *
 from .energy_iceflow import *
 from .neural_network import *
+from .quantize import *
 
 from igm import emulators
 import importlib_resources
   
+# pretrained emulators already read from disk by this process, such that successive
+# runs in the same process (e.g. with igm_run_batch) do not load them again
+_loaded_emulators = {}
+
+# functions evaluating the emulators compiled with XLA, see compiled_inference
+_compiled_inference = {}
+
+# pretrained emulators by directory and configuration, see emulator_registry
+_emulator_registry = {}
+
+# input fields of the emulators by directory, see read_fieldin
+_emulator_fieldin = {}
+
+def emulator_config(params):
+    """Configuration of the emulator given by the parameters, as in the names of the emulators."""
+    return (
+        params.iflo_Nz,
+        int(params.iflo_vert_spacing),
+        params.iflo_network,
+        params.iflo_nb_layers,
+        params.iflo_nb_out_filter,
+        params.iflo_dim_arrhenius,
+        int(params.iflo_new_friction_param),
+    )
+
+def emulator_registry(directory=""):
+    """
+    Pretrained emulators of the igm package (directories with a model.h5)
+    indexed by their configuration (Nz, vert_spacing, network, nb_layers,
+    nb_out_filter, dim_arrhenius, new_friction_param), read from their names
+    pinnbp_<Nz>_<vert_spacing>_<network>_<...>, once per process. The emulators
+    of directory (e.g. the distilled ones, iflo_distill_directory) are indexed
+    too, and are preferred to those of the package
+    """
+    registry = {}
+    for d in ["", os.path.abspath(directory) if directory else ""]:
+        if d not in _emulator_registry:
+            _emulator_registry[d] = {}
+            root = importlib_resources.files(emulators) if d == "" else Path(d)
+            for path in (root.iterdir() if root.is_dir() else []):
+                part = path.name.split("_")
+                if (part[0] == "pinnbp") & (len(part) == 8):
+                    if path.joinpath("model.h5").is_file():
+                        config = (int(part[1]), int(part[2]), part[3]) + tuple(
+                            int(p) for p in part[4:]
+                        )
+                        _emulator_registry[d][config] = path
+        registry.update(_emulator_registry[d])
+    return registry
+
+def clear_emulator_registry(directory=""):
+    """The directory is indexed again by the next call to emulator_registry."""
+    _emulator_registry.pop(os.path.abspath(directory) if directory else "", None)
+
+def read_fieldin(dirpath):
+    """Input fields of the emulator stored in dirpath (fieldin.dat), read once per process."""
+    dirpath = str(dirpath)
+    if dirpath not in _emulator_fieldin:
+        with open(os.path.join(dirpath, "fieldin.dat"), "r") as fid:
+            _emulator_fieldin[dirpath] = [line.split()[0] for line in fid if line.strip()]
+    return _emulator_fieldin[dirpath]
+
+def load_emulator(dirpath, copy=True):
+    """
+    Return a fresh copy of the pretrained emulator stored in dirpath, the copy
+    can be retrained without altering the emulator used by other runs. Runs
+    that do not modify the emulator share it (copy=False), and therefore its
+    compiled inference, such that it is built from the disk once per process
+    """
+    dirpath = str(dirpath)
+    if dirpath not in _loaded_emulators:
+        _loaded_emulators[dirpath] = tf.keras.models.load_model(
+            os.path.join(dirpath, "model.h5"), compile=False
+        )
+    if not copy:
+        return _loaded_emulators[dirpath]
+    model = tf.keras.models.clone_model(_loaded_emulators[dirpath])
+    model.set_weights(_loaded_emulators[dirpath].get_weights())
+    model.compile()
+    return model
+
+def clone_emulator(model, precision):
+    """
+    Return a copy of the emulator computing with the keras precision policy
+    precision (float32, mixed_bfloat16 or mixed_float16), the weights are kept
+    in float32 such that the copy can be retrained, saved and checkpointed
+    """
+    policy = tf.keras.mixed_precision.Policy(precision)
+
+    def clone_layer(layer):
+        config = layer.get_config()
+        config["dtype"] = policy
+        return layer.__class__.from_config(config)
+
+    clone = tf.keras.models.clone_model(model, clone_function=clone_layer)
+    clone.set_weights(model.get_weights())
+    clone.compile()
+    return clone
+
 def initialize_iceflow_emulator(params,state):
 
+    state.opti_retrain_schedule = RetrainingSchedule(params.iflo_retrain_emulator_lr)
+
     if (int(tf.__version__.split(".")[1]) <= 10) | (int(tf.__version__.split(".")[1]) >= 16) :
         state.opti_retrain = getattr(tf.keras.optimizers,params.iflo_optimizer_emulator)(
-            learning_rate=params.iflo_retrain_emulator_lr
+            learning_rate=state.opti_retrain_schedule
         )
     else:
         state.opti_retrain = getattr(tf.keras.optimizers.legacy,params.iflo_optimizer_emulator)( 
-            learning_rate=params.iflo_retrain_emulator_lr
+            learning_rate=state.opti_retrain_schedule
         )
 
-    direct_name = (
-        "pinnbp"
-        + "_"
-        + str(params.iflo_Nz)
-        + "_"
-        + str(int(params.iflo_vert_spacing))
-        + "_"
-    )
-    direct_name += (
-        params.iflo_network
-        + "_"
-        + str(params.iflo_nb_layers)
-        + "_"
-        + str(params.iflo_nb_out_filter)
-        + "_"
-    )
-    direct_name += (
-        str(params.iflo_dim_arrhenius)
-        + "_"
-        + str(int(params.iflo_new_friction_param))
-    )
-
     if params.iflo_pretrained_emulator:
         if params.iflo_emulator == "":
-            if os.path.exists(
-                importlib_resources.files(emulators).joinpath(direct_name)
-            ):
-                dirpath = importlib_resources.files(emulators).joinpath(direct_name)
-                print(
-                    "Found pretrained emulator in the igm package: " + direct_name
-                )
+            dirpath = emulator_registry(params.iflo_distill_directory).get(
+                emulator_config(params)
+            )
+            if dirpath is not None:
+                print("Found pretrained emulator: " + str(dirpath))
             else:
-                print("No pretrained emulator found in the igm package")
+                print("No pretrained emulator found in the igm package or in iflo_distill_directory")
         else:
             if os.path.exists(params.iflo_emulator):
                 dirpath = params.iflo_emulator
@@ -61,17 +143,14 @@ def initialize_iceflow_emulator(params,state):
             else:
                 print("----------------------------------> No pretrained emulator found ")
 
-        fieldin = []
-        fid = open(os.path.join(dirpath, "fieldin.dat"), "r")
-        for fileline in fid:
-            part = fileline.split()
-            fieldin.append(part[0])
-        fid.close()
-        assert params.iflo_fieldin == fieldin
-        state.iceflow_model = tf.keras.models.load_model(
-            os.path.join(dirpath, "model.h5"), compile=False
+        assert params.iflo_fieldin == read_fieldin(dirpath)
+        # the emulator is shared if it is neither retrained nor restored
+        copy = (
+            (params.iflo_retrain_emulator_freq > 0)
+            | params.iflo_run_data_assimilation
+            | (not params.restart_from == "")
         )
-        state.iceflow_model.compile() 
+        state.iceflow_model = load_emulator(dirpath, copy=copy)
     else:
         print("----------------------------------> No pretrained emulator, start from scratch.") 
         nb_inputs = len(params.iflo_fieldin) + (params.iflo_dim_arrhenius == 3) * (
@@ -86,6 +165,27 @@ def initialize_iceflow_emulator(params,state):
         elif params.iflo_network=='unet':
             state.iceflow_model = unet(params, nb_inputs, nb_outputs)
 
+    assert params.precision in ["float32", "mixed_bfloat16", "mixed_float16"]
+
+    # inputs of the last evaluation, and statistics of the skipped ones
+    state.emulator_fieldin_ref = None
+    state.emulator_skipped_in_row = 0
+    state.emulator_nb_skipped = 0
+    state.emulator_nb_evaluated = 0
+    state.emulator_skip_error = []
+
+    # quantized from the float32 emulator, see iflo_inference_backend
+    initialize_quantized_emulator(params, state)
+
+    if not params.precision == "float32":
+        state.iceflow_model = clone_emulator(state.iceflow_model, params.precision)
+
+    # the float16 gradients of the retraining underflow without loss scaling
+    if params.precision == "mixed_float16":
+        state.opti_retrain = tf.keras.mixed_precision.LossScaleOptimizer(
+            state.opti_retrain
+        )
+
     # direct_name = 'pinnbp_10_4_cnn_16_32_2_1'        
     # dirpath = importlib_resources.files(emulators).joinpath(direct_name)
     # iceflow_model_pretrained = tf.keras.models.load_model(
@@ -99,60 +199,312 @@ def initialize_iceflow_emulator(params,state):
 def update_iceflow_emulated(params, state):
     # Define the input of the NN, include scaling
 
-    Ny, Nx = state.thk.shape
-    N = params.iflo_Nz
-
     fieldin = [vars(state)[f] for f in params.iflo_fieldin]
 
+    if params.iflo_emulator_skip_tol > 0:
+        if _skip_inference(params, state, fieldin):
+            state.emulator_nb_skipped += 1
+            state.emulator_skipped_in_row += 1
+            return
+        U_cached = tf.identity(state.U)
+
+    if params.iflo_crop_active:
+        update_active_window(params, state)
+        fieldin = crop_to_window(fieldin, state.active_window)
+
+        if params.iflo_emulator_jit:
+            U, V, fields = emulate_iceflow_compiled(params, state, fieldin)
+        else:
+            U, V = emulate_UV(params, state, fieldin)
+
+        shape = state.thk.shape[-2:]
+        state.U.assign(extend_from_window(U, state.active_window, shape))
+        state.V.assign(extend_from_window(V, state.active_window, shape))
+
+        update_2d_iceflow_variables(params, state)
+
+    elif params.iflo_emulator_jit:
+        U, V, fields = emulate_iceflow_compiled(params, state, fieldin)
+
+        state.U.assign(U)
+        state.V.assign(V)
+
+        for key in fields:
+            vars(state)[key] = fields[key]
+
+    else:
+        U, V = emulate_UV(params, state, fieldin)
+
+        state.U.assign(U)
+        state.V.assign(V)
+
+        update_2d_iceflow_variables(params, state)
+
+    if params.iflo_emulator_skip_tol > 0:
+        _update_inference_cache(params, state, U_cached)
+
+
+def _skip_inference(params, state, fieldin):
+    """
+    True if the inputs of the emulator changed by less than
+    iflo_emulator_skip_tol (max. change relative to the max. of each field)
+    since its last evaluation, the velocities are then kept, unless
+    iflo_emulator_skip_max evaluations were already skipped in a row
+    """
+    if (state.emulator_fieldin_ref is None) | (
+        state.emulator_skipped_in_row >= params.iflo_emulator_skip_max
+    ):
+        return False
+
+    change = tf.reduce_max(
+        tf.stack(
+            [
+                tf.reduce_max(tf.abs(f - r)) / (tf.reduce_max(tf.abs(r)) + 10 ** (-10))
+                for f, r in zip(fieldin, state.emulator_fieldin_ref)
+            ]
+        )
+    )
+
+    return bool(change < params.iflo_emulator_skip_tol)
+
+
+def _update_inference_cache(params, state, U_cached):
+    # the error induced by the skipped evaluations is the change of the
+    # velocity at the next evaluation
+    if state.emulator_skipped_in_row > 0:
+        state.emulator_skip_error.append(
+            float(
+                tf.reduce_max(tf.abs(state.U - U_cached))
+                / (tf.reduce_max(tf.abs(state.U)) + 10 ** (-10))
+            )
+        )
+
+    state.emulator_fieldin_ref = [tf.identity(vars(state)[f]) for f in params.iflo_fieldin]
+    state.emulator_skipped_in_row = 0
+    state.emulator_nb_evaluated += 1
+
+
+def compiled_inference(params, model):
+    """
+    Return the function mapping the input fields to U, V and the 2D velocities
+    with the emulator model, compiled with XLA. The functions are kept between
+    runs (e.g. with igm_run_batch) for the emulators shared by the runs, each
+    one is traced once per shape of the (padded) domain
+    """
+    key = (
+        id(model),
+        params.precision,
+        repr(sorted([(k, v) for k, v in vars(params).items() if k.startswith("iflo_")])),
+    )
+    if key not in _compiled_inference:
+        # the function does not keep the emulator alive, but its variables
+        model_ref = weakref.ref(model)
+
+        @tf.function(jit_compile=True)
+        def inference(fieldin, vert_weight):
+            Ny, Nx = fieldin[0].shape[-2:]
+            emulator = SimpleNamespace(
+                iceflow_model=model_ref(), PAD=compute_PAD(params, Nx, Ny)
+            )
+            U, V = emulate_UV(params, emulator, fieldin)
+            return U, V, compute_2d_iceflow_variables(U, V, vert_weight)
+
+        _compiled_inference[key] = inference
+        weakref.finalize(model, _compiled_inference.pop, key, None)
+
+    return _compiled_inference[key]
+
+
+def emulate_iceflow_compiled(params, state, fieldin):
+    """
+    Same as emulate_UV followed by compute_2d_iceflow_variables, compiled with
+    XLA. The domain is padded, by replicating its last row and column, to a
+    multiple of iflo_emulator_bucket (and of iflo_multiple_window_size), such
+    that domains of close sizes are not retraced
+    """
+    Ny, Nx = fieldin[0].shape[-2:]
+
+    multiple = math.lcm(
+        max(params.iflo_emulator_bucket, 1), max(params.iflo_multiple_window_size, 1)
+    )
+    NNy = multiple * math.ceil(Ny / multiple)
+    NNx = multiple * math.ceil(Nx / multiple)
+
+    # the edges are replicated, zeros would be seen as a cliff by the emulator
+    fieldin = [
+        tf.concat([f, tf.repeat(f[..., -1:, :], NNy - Ny, axis=-2)], axis=-2)
+        for f in fieldin
+    ]
+    fieldin = [
+        tf.concat([f, tf.repeat(f[..., -1:], NNx - Nx, axis=-1)], axis=-1)
+        for f in fieldin
+    ]
+
+    U, V, fields = compiled_inference(params, state.iceflow_model)(
+        fieldin, state.vert_weight
+    )
+
+    fields = {key: fields[key][..., :Ny, :Nx] for key in fields}
+
+    return U[..., :Ny, :Nx], V[..., :Ny, :Nx], fields
+
+
+def emulate_UV(params, state, fieldin):
+    """
+    Evaluate the emulator on the input fields, and return U and V, possibly
+    upper-bounded. This function does not modify the state, so it can be used
+    within a compiled step.
+    """
+
+    Ny, Nx = fieldin[0].shape[-2:]
+
+    if (params.iflo_tile_size > 0) & (max(Ny, Nx) > params.iflo_tile_size):
+        return tiled_emulate_UV(params, state, fieldin)
+
     X = fieldin_to_X(params, fieldin)
 
     if params.iflo_exclude_borders>0:
         iz = params.iflo_exclude_borders
         X = tf.pad(X, [[0, 0], [iz, iz], [iz, iz], [0, 0]], "SYMMETRIC")
         
+    # the quantized copy of the emulator replaces it for the inference
+    model = vars(state).get("iceflow_quantized", state.iceflow_model)
+
     if params.iflo_multiple_window_size==0:
-        Y = state.iceflow_model(X)
+        Y = model(X)
     else:
-        Y = state.iceflow_model(tf.pad(X, state.PAD, "CONSTANT"))[:, :Ny, :Nx, :]
+        # padded for the size of the fields, which may be a window or a tile
+        Y = model(tf.pad(X, compute_PAD(params, Nx, Ny), "CONSTANT"))[:, :Ny, :Nx, :]
+
+    # the emulator may compute in lower precision (params.precision)
+    Y = tf.cast(Y, "float32")
 
     if params.iflo_exclude_borders>0:
         iz = params.iflo_exclude_borders
         Y = Y[:, iz:-iz, iz:-iz, :]
 
     U, V = Y_to_UV(params, Y)
-    U = U[0]
-    V = V[0]
 
-    #    U = tf.where(state.thk > 0, U, 0)
+    # the batch axis is kept as member axis in ensemble mode
+    if len(fieldin[0].shape) == 2:
+        U = U[0]
+        V = V[0]
 
-    state.U.assign(U)
-    state.V.assign(V)
+    #    U = tf.where(state.thk > 0, U, 0)
 
     # If requested, the speeds are artifically upper-bounded
     if params.iflo_force_max_velbar > 0:
-        velbar_mag = getmag3d(state.U, state.V)
-        state.U.assign(
-            tf.where(
+        velbar_mag = getmag3d(U, V)
+        U = tf.where(
                 velbar_mag >= params.iflo_force_max_velbar,
-                params.iflo_force_max_velbar * (state.U / velbar_mag),
-                state.U,
+                params.iflo_force_max_velbar * (U / velbar_mag),
+                U,
             )
-        )
-        state.V.assign(
-            tf.where(
+        V = tf.where(
                 velbar_mag >= params.iflo_force_max_velbar,
-                params.iflo_force_max_velbar * (state.V / velbar_mag),
-                state.V,
+                params.iflo_force_max_velbar * (V / velbar_mag),
+                V,
             )
-        )
 
-    update_2d_iceflow_variables(params, state)
+    return U, V
+
+
+class RetrainingSchedule(tf.keras.optimizers.schedules.LearningRateSchedule):
+    """
+    Learning rate of the retraining, decaying by 5% every 1000 iterations,
+    counted from the start of each retraining (see restart)
+    """
+
+    def __init__(self, learning_rate):
+        self.learning_rate = learning_rate
+        self.start = tf.Variable(0, dtype="int64", trainable=False)
+
+    def restart(self, iterations):
+        self.start.assign(tf.cast(iterations, "int64"))
+
+    def __call__(self, step):
+        epoch = tf.cast(tf.cast(step, "int64") - self.start, "float32")
+        return self.learning_rate * 0.95 ** (epoch / 1000)
+
+    def get_config(self):
+        return {"learning_rate": self.learning_rate}
+
+
+def retraining_step(params, state):
+    """
+    Return the compiled iteration of the retraining on the patches X, whose
+    geometry (iceflow_geometry_X, without the excluded borders) is prepared
+    once for all the iterations: the
+    gradients of the energy (summed over the patches) are accumulated over
+    micro-batches of iflo_retrain_emulator_microbatch patches (all the patches
+    at once if 0), and applied once. It returns the energy terms (summed over
+    the patches) and the maximum surface speed, which stay on the device
+    """
+    model, optimizer = state.iceflow_model, state.opti_retrain
+    if getattr(state, "retraining_step_of", None) == (model, optimizer):
+        return state.retraining_step
+
+    iz = params.iflo_exclude_borders
+
+    @tf.function
+    def step(X, geometry):
+        nb, Ny, Nx = X.shape[:3]
+        PAD = compute_PAD(params, Nx, Ny)
+        size = params.iflo_retrain_emulator_microbatch
+        size = nb if size <= 0 else min(size, nb)
+
+        grads = [tf.zeros_like(v) for v in model.trainable_variables]
+        costs = tf.zeros(4)
+        velsurf_max = 0.0
+        for start in range(0, nb, size):
+            XX = X[start : start + size]
+            G = {k: g[start : start + size] for k, g in geometry.items()}
+            with tf.GradientTape() as t:
+                Y = model(tf.pad(XX, PAD, "CONSTANT"))[:, :Ny, :Nx, :]
+                Y = tf.cast(Y, "float32")
+
+                if iz > 0:
+                    C = iceflow_energy_geometry_Y(params, G, Y[:, iz:-iz, iz:-iz, :])
+                else:
+                    C = iceflow_energy_geometry_Y(params, G, Y)
+
+                # the patches have the same size, mean over a patch summed over the patches
+                C = tf.stack([tf.reduce_mean(c) for c in C]) * XX.shape[0]
+                COST = tf.reduce_sum(C)
+
+                if params.precision == "mixed_float16":
+                    LOSS = optimizer.get_scaled_loss(COST)
+                else:
+                    LOSS = COST
+
+            g = t.gradient(LOSS, model.trainable_variables)
+            if params.precision == "mixed_float16":
+                g = optimizer.get_unscaled_gradients(g)
+            grads = [a + b for a, b in zip(grads, g)]
+            costs = costs + C
+
+            U, V = Y_to_UV(params, Y)
+            velsurf_max = tf.maximum(
+                velsurf_max, tf.reduce_max(tf.sqrt(U[:, -1] ** 2 + V[:, -1] ** 2))
+            )
+
+        optimizer.apply_gradients(zip(grads, model.trainable_variables))
+
+        return costs, velsurf_max
+
+    state.retraining_step = step
+    state.retraining_step_of = (model, optimizer)
+    return step
 
 
 def update_iceflow_emulator(params, state):
     if (state.it < 0) | (state.it % params.iflo_retrain_emulator_freq == 0):
         fieldin = [vars(state)[f] for f in params.iflo_fieldin]
 
+        if params.iflo_crop_active:
+            update_active_window(params, state)
+            fieldin = crop_to_window(fieldin, state.active_window)
+
 ########################
 
         # thkext = tf.pad(state.thk,[[1,1],[1,1]],"CONSTANT",constant_values=1)
@@ -179,54 +531,43 @@ def update_iceflow_emulator(params, state):
             state.it < 0
         ) * params.iflo_retrain_emulator_nbit_init)
 
-        iz = params.iflo_exclude_borders 
-
-        for epoch in range(nbit):
-            cost_emulator = tf.Variable(0.0)
-
-            for i in range(X.shape[0]):
-                with tf.GradientTape() as t:
+        if params.iflo_retrain_emulator_adaptive & (state.it >= 0):
+            if not _retraining_needed(params, state, X, PAD):
+                nbit = 0
 
-                    Y = state.iceflow_model(tf.pad(X[i:i+1, :, :, :], PAD, "CONSTANT"))[:,:Ny,:Nx,:]
-                    
-                    if iz>0:
-                        C_shear, C_slid, C_grav, C_float = iceflow_energy_XY(params, X[i : i + 1, iz:-iz, iz:-iz, :], Y[:, iz:-iz, iz:-iz, :])
-                    else:
-                        C_shear, C_slid, C_grav, C_float = iceflow_energy_XY(params, X[i : i + 1, :, :, :], Y[:, :, :, :])
- 
-                    COST = tf.reduce_mean(C_shear) + tf.reduce_mean(C_slid) \
-                         + tf.reduce_mean(C_grav)  + tf.reduce_mean(C_float)
-                    
-                    if (epoch + 1) % 100 == 0:
-                        print("---------- > ", tf.reduce_mean(C_shear).numpy(), tf.reduce_mean(C_slid).numpy(), tf.reduce_mean(C_grav).numpy(), tf.reduce_mean(C_float).numpy())
-
-#                    state.C_shear = tf.pad(C_shear[0],[[0,1],[0,1]],"CONSTANT")
-#                    state.C_slid  = tf.pad(C_slid[0],[[0,1],[0,1]],"CONSTANT")
-#                    state.C_grav  = tf.pad(C_grav[0],[[0,1],[0,1]],"CONSTANT")
-#                    state.C_float = C_float[0] 
-
-                    # print(state.C_shear.shape, state.C_slid.shape, state.C_grav.shape, state.C_float.shape,state.thk.shape )
+        step = retraining_step(params, state)
+        state.opti_retrain_schedule.restart(state.opti_retrain.iterations)
 
-                    cost_emulator = cost_emulator + COST
-
-                    if (epoch + 1) % 100 == 0:
-                        U, V = Y_to_UV(params, Y)
-                        U = U[0]
-                        V = V[0]
-                        velsurf_mag = tf.sqrt(U[-1] ** 2 + V[-1] ** 2)
-                        print("train : ", epoch, COST.numpy(), np.max(velsurf_mag))
-
-                grads = t.gradient(COST, state.iceflow_model.trainable_variables)
+        iz = params.iflo_exclude_borders
+        if nbit > 0:
+            geometry = iceflow_geometry_X(params, X[:, iz:-iz, iz:-iz, :] if iz > 0 else X)
 
-                state.opti_retrain.apply_gradients(
-                    zip(grads, state.iceflow_model.trainable_variables)
-                )
+        for epoch in range(nbit):
+            costs, velsurf_max = step(X, geometry)
+            cost_emulator = tf.reduce_sum(costs)
 
-                state.opti_retrain.lr = params.iflo_retrain_emulator_lr * (
-                    0.95 ** (epoch / 1000)
-                )
+            if (epoch + 1) % 100 == 0:
+                print("---------- > ", *costs.numpy())
+                print("train : ", epoch, cost_emulator.numpy(), velsurf_max.numpy())
 
             state.COST_EMULATOR.append(cost_emulator)
+
+            # stop once the cost plateaus
+            if params.iflo_retrain_emulator_adaptive & (epoch > 0):
+                previous, cost = [float(c) for c in state.COST_EMULATOR[-2:]]
+                if abs(previous - cost) < params.iflo_retrain_emulator_plateau_tol * abs(previous):
+                    break
+
+        # the velocities of the previous emulator are not reused
+        if nbit > 0:
+            state.emulator_fieldin_ref = None
+            state.emulator_skipped_in_row = 0
+
+        if params.iflo_retrain_emulator_adaptive & (nbit > 0):
+            state.emulator_thk_ref = tf.identity(state.thk)
+            state.emulator_usurf_ref = tf.identity(state.usurf)
+            state.emulator_cost_ref = _emulator_cost(params, state, X, PAD)
+            state.emulator_nb_retraining = getattr(state, "emulator_nb_retraining", 0) + 1
             
     
     if len(params.iflo_save_cost_emulator)>0:
@@ -234,6 +575,43 @@ def update_iceflow_emulator(params, state):
 
 
 
+def _retraining_needed(params, state, X, PAD):
+    """
+    Whether the geometry or the energy of the emulated velocities (as
+    minimised by the retraining) changed beyond the tolerances since the last
+    retraining. The geometry is looked at first, as it is cheaper
+    """
+    if not hasattr(state, "emulator_cost_ref"):
+        return True
+
+    change = tf.maximum(
+        tf.reduce_max(tf.abs(state.thk - state.emulator_thk_ref)),
+        tf.reduce_max(tf.abs(state.usurf - state.emulator_usurf_ref)),
+    )
+    if change > params.iflo_retrain_emulator_geom_tol:
+        return True
+
+    cost = _emulator_cost(params, state, X, PAD)
+    reference = state.emulator_cost_ref
+    return abs(cost - reference) > params.iflo_retrain_emulator_cost_tol * abs(reference)
+
+
+def _emulator_cost(params, state, X, PAD):
+    """Energy of the emulated velocities on the patches X, as in the retraining."""
+    Ny, Nx = X.shape[1:3]
+    iz = params.iflo_exclude_borders
+    cost = 0.0
+    for i in range(X.shape[0]):
+        Y = state.iceflow_model(tf.pad(X[i:i+1, :, :, :], PAD, "CONSTANT"))[:,:Ny,:Nx,:]
+        Y = tf.cast(Y, "float32")
+        if iz>0:
+            C = iceflow_energy_XY(params, X[i : i + 1, iz:-iz, iz:-iz, :], Y[:, iz:-iz, iz:-iz, :])
+        else:
+            C = iceflow_energy_XY(params, X[i : i + 1, :, :, :], Y)
+        cost += sum([float(tf.reduce_mean(c)) for c in C])
+    return cost
+
+
 # def _update_iceflow_emulator_lbfgs(params, state):
 
 #     import tensorflow_probability as tfp
@@ -277,6 +655,83 @@ def update_iceflow_emulator(params, state):
  
 
 
+def tiled_emulate_UV(params, state, fieldin):
+    """
+    Same as emulate_UV, evaluated on tiles of iflo_tile_size cells one after
+    the other, such that the memory used by the emulator does not depend on
+    the size of the domain. The output within iflo_tile_halo cells (the
+    receptive field of the emulator) of the inner edges of a tile is
+    discarded, and neighbouring tiles are blended over iflo_tile_overlap cells
+    in the middle of their overlap. The tiles of a row are stitched before the
+    next row is evaluated
+    """
+    assert params.iflo_tile_size >= 2 * params.iflo_tile_halo + 3 * params.iflo_tile_overlap
+
+    Ny, Nx = fieldin[0].shape[-2:]
+    starts_y, sy = _tiling(params, Ny)
+    starts_x, sx = _tiling(params, Nx)
+
+    emulator = SimpleNamespace(
+        iceflow_model=vars(state).get("iceflow_quantized", state.iceflow_model),
+        PAD=compute_PAD(params, sx, sy),
+    )
+
+    U_rows, V_rows = [], []
+    for y in starts_y:
+        tiles = [
+            emulate_UV(params, emulator, [f[..., y : y + sy, x : x + sx] for f in fieldin])
+            for x in starts_x
+        ]
+        U_rows.append(_stitch_tiles(params, [U for U, V in tiles], starts_x, axis=-1))
+        V_rows.append(_stitch_tiles(params, [V for U, V in tiles], starts_x, axis=-1))
+
+    U = _stitch_tiles(params, U_rows, starts_y, axis=-2)
+    V = _stitch_tiles(params, V_rows, starts_y, axis=-2)
+
+    return U, V
+
+
+def _tiling(params, N):
+    """Starts of the tiles along an axis of N cells, and their size."""
+    size = params.iflo_tile_size
+    if N <= size:
+        return [0], N
+    # evenly spaced tiles, the last one ends at the edge of the domain
+    stride = size - 2 * params.iflo_tile_halo - params.iflo_tile_overlap
+    nb = math.ceil((N - size) / stride) + 1
+    return [round(i * (N - size) / (nb - 1)) for i in range(nb)], size
+
+
+def _stitch_tiles(params, tiles, starts, axis):
+    """Concatenate the tiles along axis (-2 or -1), blending them in the middle of their overlaps."""
+    assert params.iflo_tile_blend in ["linear", "cosine"]
+
+    overlap = params.iflo_tile_overlap
+    t = (np.arange(overlap) + 0.5) / max(overlap, 1)
+    if params.iflo_tile_blend == "cosine":
+        t = 0.5 * (1 - np.cos(np.pi * t))
+    weight = tf.constant(t if axis == -1 else t[:, None], tiles[0].dtype)
+
+    def cut(i, start, end):
+        start, end = start - starts[i], end - starts[i]
+        return tiles[i][..., start:end, :] if axis == -2 else tiles[i][..., start:end]
+
+    size = tiles[0].shape[axis]
+    pieces = []
+    begin = 0
+    for i in range(len(tiles) - 1):
+        end = (starts[i] + size + starts[i + 1]) // 2 - overlap // 2
+        pieces.append(cut(i, begin, end))
+        pieces.append(
+            (1 - weight) * cut(i, end, end + overlap)
+            + weight * cut(i + 1, end, end + overlap)
+        )
+        begin = end + overlap
+    pieces.append(cut(len(tiles) - 1, begin, starts[-1] + size))
+
+    return tf.concat(pieces, axis)
+
+
 def _split_into_patches(X, nbmax):
     XX = []
     ny = X.shape[1]
@@ -286,24 +741,30 @@ def _split_into_patches(X, nbmax):
     ly = int(ny / sy)
     lx = int(nx / sx)
 
-    for i in range(sx):
-        for j in range(sy):
-            XX.append(X[0, j * ly : (j + 1) * ly, i * lx : (i + 1) * lx, :])
+    # patches are taken from all members in ensemble mode
+    for k in range(X.shape[0]):
+        for i in range(sx):
+            for j in range(sy):
+                XX.append(X[k, j * ly : (j + 1) * ly, i * lx : (i + 1) * lx, :])
 
     return tf.stack(XX, axis=0)
 
 
 def save_iceflow_model(params, state):
-    directory = "iceflow-model"
-    
+    save_emulator(params, state.iceflow_model, "iceflow-model")
+
+
+def save_emulator(params, model, directory):
+    """Save the emulator as the pretrained ones (model.h5, fieldin.dat, vert_grid.dat)."""
     import shutil
 
     if os.path.exists(directory):
         shutil.rmtree(directory)
 
-    os.mkdir(directory)
+    os.makedirs(directory)
 
-    state.iceflow_model.save(os.path.join(directory, "model.h5"))
+    # the emulator is saved in float32 whatever the precision of the run
+    clone_emulator(model, "float32").save(os.path.join(directory, "model.h5"))
 
     #    fieldin_dim=[0,0,1*(params.iflo_dim_arrhenius==3),0,0]
 
@@ -19,7 +19,7 @@ def _compute_gradient_stag(s, dX, dY):
 
 
 @tf.function(experimental_relax_shapes=True)
-def _compute_strainrate_Glen_tf(U, V, thk, slidingco, dX, ddz, sloptopgx, sloptopgy, thr):
+def _compute_strainrate_Glen_tf(U, V, thk, slidingco, dX, ddz, sloptopgx, sloptopgy, thr, Nz):
     # Compute horinzontal derivatives
     dUdx = (U[:, :, :, 1:] - U[:, :, :, :-1]) / dX[0, 0, 0]
     dVdx = (V[:, :, :, 1:] - V[:, :, :, :-1]) / dX[0, 0, 0]
@@ -33,7 +33,7 @@ def _compute_strainrate_Glen_tf(U, V, thk, slidingco, dX, ddz, sloptopgx, slopto
     dVdy = (dVdy[:, :, :, :-1] + dVdy[:, :, :, 1:]) / 2
 
     # homgenize sizes in the vertical plan on the stagerred grid
-    if U.shape[1] > 1:
+    if Nz > 1:
         dUdx = (dUdx[:, :-1, :, :] + dUdx[:, 1:, :, :]) / 2
         dVdx = (dVdx[:, :-1, :, :] + dVdx[:, 1:, :, :]) / 2
         dUdy = (dUdy[:, :-1, :, :] + dUdy[:, 1:, :, :]) / 2
@@ -43,7 +43,7 @@ def _compute_strainrate_Glen_tf(U, V, thk, slidingco, dX, ddz, sloptopgx, slopto
     Um = (U[:, :, 1:, 1:] + U[:, :, 1:, :-1] + U[:, :, :-1, 1:] + U[:, :, :-1, :-1]) / 4
     Vm = (V[:, :, 1:, 1:] + V[:, :, 1:, :-1] + V[:, :, :-1, 1:] + V[:, :, :-1, :-1]) / 4
 
-    if U.shape[1] > 1:
+    if Nz > 1:
         # vertical derivative if there is at least two layears
         dUdz = (Um[:, 1:, :, :] - Um[:, :-1, :, :]) / tf.maximum(ddz, thr)
         dVdz = (Vm[:, 1:, :, :] - Vm[:, :-1, :, :]) / tf.maximum(ddz, thr)
@@ -102,11 +102,18 @@ def _stag8(B):
 
 
 def iceflow_energy(params, U, V, fieldin):
+    return iceflow_energy_geometry(params, U, V, iceflow_geometry(params, fieldin))
+
+
+def iceflow_geometry(params, fieldin):
+    """
+    Fields of the energy which do not depend on the velocity, such that the
+    energy can be evaluated for many velocities (e.g. the iterations of the
+    solver) on the same geometry with iceflow_energy_geometry
+    """
     thk, usurf, arrhenius, slidingco, dX = fieldin
 
-    return _iceflow_energy(
-        U,
-        V,
+    return _iceflow_geometry(
         thk,
         usurf,
         arrhenius,
@@ -116,14 +123,26 @@ def iceflow_energy(params, U, V, fieldin):
         params.iflo_vert_spacing,
         params.iflo_exp_glen,
         params.iflo_exp_weertman,
+        params.iflo_new_friction_param,
+        params.iflo_cf_cond,
+        params.iflo_cf_eswn,
+    )
+
+
+def iceflow_energy_geometry(params, U, V, geometry):
+    return _iceflow_energy_geometry(
+        U,
+        V,
+        geometry,
+        params.iflo_Nz,
+        params.iflo_exp_glen,
+        params.iflo_exp_weertman,
         params.iflo_regu_glen,
         params.iflo_regu_weertman,
         params.iflo_thr_ice_thk,
         params.iflo_ice_density,
         params.iflo_gravity_cst,
-        params.iflo_new_friction_param,
         params.iflo_cf_cond,
-        params.iflo_cf_eswn,
         params.iflo_regu,
         params.iflo_min_sr,
         params.iflo_max_sr,
@@ -132,9 +151,7 @@ def iceflow_energy(params, U, V, fieldin):
 
 
 @tf.function(experimental_relax_shapes=True)
-def _iceflow_energy(
-    U,
-    V,
+def _iceflow_geometry(
     thk,
     usurf,
     arrhenius,
@@ -144,21 +161,10 @@ def _iceflow_energy(
     vert_spacing,
     exp_glen,
     exp_weertman,
-    regu_glen,
-    regu_weertman,
-    thr_ice_thk,
-    ice_density,
-    gravity_cst,
     new_friction_param,
     iflo_cf_cond,
     iflo_cf_eswn,
-    iflo_regu,
-    min_sr,
-    max_sr,
-    iflo_force_negative_gravitational_energy
 ):
-    # warning, the energy is here normalized dividing by int_Omega
-
     COND = (
         (thk[:, 1:, 1:] > 0)
         & (thk[:, 1:, :-1] > 0)
@@ -176,7 +182,7 @@ def _iceflow_energy(
         dz = tf.stack([_stag4(thk) * z for z in temd], axis=1)  # formerly ..
         #dz = (tf.expand_dims(tf.expand_dims(temd,axis=-1),axis=-1)*tf.expand_dims(_stag4(thk),axis=0))
     else:
-        dz = tf.expand_dims(_stag4(thk), axis=0)
+        dz = tf.expand_dims(_stag4(thk), axis=1)
 
     # B has Unit Mpa y^(1/n)
     B = 2.0 * arrhenius ** (-1.0 / exp_glen)
@@ -190,18 +196,94 @@ def _iceflow_energy(
         else:
             C = (slidingco + 10 ** (-12)) ** -(1.0 / exp_weertman)
 
-    p = 1.0 + 1.0 / exp_glen
-    s = 1.0 + 1.0 / exp_weertman
-
-    sloptopgx, sloptopgy = _compute_gradient_stag(usurf - thk, dX, dX)
-    sloptopgx = tf.expand_dims(sloptopgx, axis=1)
-    sloptopgy = tf.expand_dims(sloptopgy, axis=1)
+    lsurf = usurf - thk
 
     # TODO : sloptopgx, sloptopgy must be the elevaion of layers! not the bedrock, this probably has very little effects.
+    sloptopgx, sloptopgy = _compute_gradient_stag(lsurf, dX, dX)
+
+    slopsurfx, slopsurfy = _compute_gradient_stag(usurf, dX, dX)
+
+    geometry = {
+        "COND": COND,
+        "dz": dz,
+        # B on the staggered grid (2D or 3D)
+        "B": _stag4(B) if len(B.shape) == 3 else _stag8(B),
+        "C": C,
+        "dX": dX,
+        "sloptopgx": sloptopgx,
+        "sloptopgy": sloptopgy,
+        "slopsurfx": tf.expand_dims(slopsurfx, axis=1),
+        "slopsurfy": tf.expand_dims(slopsurfy, axis=1),
+    }
+
+    # if activae this applies the stress condition along the calving front
+    if iflo_cf_cond:
+
+        ################################################################
+
+    #   Check formula (17) in [Jouvet and Graeser 2012], Unit is Mpa 
+        P =tf.where(lsurf<0, 0.5 * 10 ** (-6) * 9.81 * 910 * ( thk**2 - (1000/910)*lsurf**2 ) , 0.0)  / dX[:, 0:1, 0:1] 
+        
+        if len(iflo_cf_eswn) == 0:
+            thkext = tf.pad(thk,[[0,0],[1,1],[1,1]],"CONSTANT",constant_values=1)
+            lsurfext = tf.pad(lsurf,[[0,0],[1,1],[1,1]],"CONSTANT",constant_values=1)
+        else:
+            thkext = thk
+            thkext = tf.pad(thkext,[[0,0],[1,0],[0,0]],"CONSTANT",constant_values=1.0*('S' not in iflo_cf_eswn))
+            thkext = tf.pad(thkext,[[0,0],[0,1],[0,0]],"CONSTANT",constant_values=1.0*('N' not in iflo_cf_eswn))
+            thkext = tf.pad(thkext,[[0,0],[0,0],[1,0]],"CONSTANT",constant_values=1.0*('W' not in iflo_cf_eswn))
+            thkext = tf.pad(thkext,[[0,0],[0,0],[0,1]],"CONSTANT",constant_values=1.0*('E' not in iflo_cf_eswn)) 
+            lsurfext = lsurf
+            lsurfext = tf.pad(lsurfext,[[0,0],[1,0],[0,0]],"CONSTANT",constant_values=1.0*('S' not in iflo_cf_eswn))
+            lsurfext = tf.pad(lsurfext,[[0,0],[0,1],[0,0]],"CONSTANT",constant_values=1.0*('N' not in iflo_cf_eswn))
+            lsurfext = tf.pad(lsurfext,[[0,0],[0,0],[1,0]],"CONSTANT",constant_values=1.0*('W' not in iflo_cf_eswn))
+            lsurfext = tf.pad(lsurfext,[[0,0],[0,0],[0,1]],"CONSTANT",constant_values=1.0*('E' not in iflo_cf_eswn)) 
+        
+        # this permits to locate the calving front in a cell in the 4 directions
+        geometry["CF_W"] = P * tf.where((lsurf<0)&(thk>0)&(thkext[:,1:-1,:-2]==0)&(lsurfext[:,1:-1,:-2]<=0),1.0,0.0)
+        geometry["CF_E"] = P * tf.where((lsurf<0)&(thk>0)&(thkext[:,1:-1,2:]==0)&(lsurfext[:,1:-1,2:]<=0),1.0,0.0) 
+        geometry["CF_S"] = P * tf.where((lsurf<0)&(thk>0)&(thkext[:,:-2,1:-1]==0)&(lsurfext[:,:-2,1:-1]<=0),1.0,0.0)
+        geometry["CF_N"] = P * tf.where((lsurf<0)&(thk>0)&(thkext[:,2:,1:-1]==0)&(lsurfext[:,2:,1:-1]<=0),1.0,0.0)
+
+        if Nz > 1:
+            geometry["weight"] = tf.stack([tf.ones_like(thk) * z for z in temd], axis=1) # dimensionless, 
+
+    return geometry
+
+
+@tf.function(experimental_relax_shapes=True)
+def _iceflow_energy_geometry(
+    U,
+    V,
+    geometry,
+    Nz,
+    exp_glen,
+    exp_weertman,
+    regu_glen,
+    regu_weertman,
+    thr_ice_thk,
+    ice_density,
+    gravity_cst,
+    iflo_cf_cond,
+    iflo_regu,
+    min_sr,
+    max_sr,
+    iflo_force_negative_gravitational_energy
+):
+    # warning, the energy is here normalized dividing by int_Omega
+
+    COND, dz, B, C, dX = [geometry[k] for k in ["COND", "dz", "B", "C", "dX"]]
+
+    sloptopgx, sloptopgy = geometry["sloptopgx"], geometry["sloptopgy"]
+
+    p = 1.0 + 1.0 / exp_glen
+    s = 1.0 + 1.0 / exp_weertman
 
     # sr has unit y^(-1)
     srx, srz = _compute_strainrate_Glen_tf(
-        U, V, thk, C, dX, dz, sloptopgx, sloptopgy, thr=thr_ice_thk
+        U, V, None, C, dX, dz,
+        tf.expand_dims(sloptopgx, axis=1), tf.expand_dims(sloptopgy, axis=1),
+        thr=thr_ice_thk, Nz=Nz
     )
     
     sr = srx + srz
@@ -215,24 +297,20 @@ def _iceflow_energy(
 
     # C_shear is unit  Mpa y^(1/n) y^(-1-1/n) * m = Mpa m/y
     if len(B.shape) == 3:
-        C_shear = _stag4(B) * tf.reduce_sum(dz * ((srcapped + regu_glen**2) ** ((p-2) / 2)) * sr, axis=1 ) / p
+        C_shear = B * tf.reduce_sum(dz * ((srcapped + regu_glen**2) ** ((p-2) / 2)) * sr, axis=1 ) / p
     else:
-        C_shear = tf.reduce_sum( _stag8(B) * dz * ((srcapped + regu_glen**2) ** ((p-2) / 2)) * sr, axis=1 ) / p
+        C_shear = tf.reduce_sum( B * dz * ((srcapped + regu_glen**2) ** ((p-2) / 2)) * sr, axis=1 ) / p
         
     if iflo_regu > 0:
         
         srx = tf.where(COND, srx, 0.0)
  
         if len(B.shape) == 3:
-            C_shear_2 = _stag4(B) * tf.reduce_sum(dz * ((srx + regu_glen**2) ** (p / 2)), axis=1 ) / p
+            C_shear_2 = B * tf.reduce_sum(dz * ((srx + regu_glen**2) ** (p / 2)), axis=1 ) / p
         else:
-            C_shear_2 = tf.reduce_sum( _stag8(B) * dz * ((srx + regu_glen**2) ** (p / 2)), axis=1 ) / p 
+            C_shear_2 = tf.reduce_sum( B * dz * ((srx + regu_glen**2) ** (p / 2)), axis=1 ) / p 
 
         C_shear = C_shear + iflo_regu*C_shear_2
-        
-    lsurf = usurf - thk
-
-    sloptopgx, sloptopgy = _compute_gradient_stag(lsurf, dX, dX)
 
     # C_slid is unit Mpa y^m m^(-m) * m^(1+m) * y^(-1-m)  = Mpa  m/y
     N = (
@@ -242,9 +320,7 @@ def _iceflow_energy(
     )
     C_slid = _stag4(C) * N ** (s / 2) / s
 
-    slopsurfx, slopsurfy = _compute_gradient_stag(usurf, dX, dX)
-    slopsurfx = tf.expand_dims(slopsurfx, axis=1)
-    slopsurfy = tf.expand_dims(slopsurfy, axis=1)
+    slopsurfx, slopsurfy = geometry["slopsurfx"], geometry["slopsurfy"]
 
     if Nz > 1:
         uds = _stag8(U) * slopsurfx + _stag8(V) * slopsurfy
@@ -267,46 +343,21 @@ def _iceflow_energy(
     # if activae this applies the stress condition along the calving front
     if iflo_cf_cond:
 
-        ################################################################
-        
-        lsurf = usurf - thk
-        
-    #   Check formula (17) in [Jouvet and Graeser 2012], Unit is Mpa 
-        P =tf.where(lsurf<0, 0.5 * 10 ** (-6) * 9.81 * 910 * ( thk**2 - (1000/910)*lsurf**2 ) , 0.0)  / dX[:, 0, 0] 
-        
-        if len(iflo_cf_eswn) == 0:
-            thkext = tf.pad(thk,[[0,0],[1,1],[1,1]],"CONSTANT",constant_values=1)
-            lsurfext = tf.pad(lsurf,[[0,0],[1,1],[1,1]],"CONSTANT",constant_values=1)
-        else:
-            thkext = thk
-            thkext = tf.pad(thkext,[[0,0],[1,0],[0,0]],"CONSTANT",constant_values=1.0*('S' not in iflo_cf_eswn))
-            thkext = tf.pad(thkext,[[0,0],[0,1],[0,0]],"CONSTANT",constant_values=1.0*('N' not in iflo_cf_eswn))
-            thkext = tf.pad(thkext,[[0,0],[0,0],[1,0]],"CONSTANT",constant_values=1.0*('W' not in iflo_cf_eswn))
-            thkext = tf.pad(thkext,[[0,0],[0,0],[0,1]],"CONSTANT",constant_values=1.0*('E' not in iflo_cf_eswn)) 
-            lsurfext = lsurf
-            lsurfext = tf.pad(lsurfext,[[0,0],[1,0],[0,0]],"CONSTANT",constant_values=1.0*('S' not in iflo_cf_eswn))
-            lsurfext = tf.pad(lsurfext,[[0,0],[0,1],[0,0]],"CONSTANT",constant_values=1.0*('N' not in iflo_cf_eswn))
-            lsurfext = tf.pad(lsurfext,[[0,0],[0,0],[1,0]],"CONSTANT",constant_values=1.0*('W' not in iflo_cf_eswn))
-            lsurfext = tf.pad(lsurfext,[[0,0],[0,0],[0,1]],"CONSTANT",constant_values=1.0*('E' not in iflo_cf_eswn)) 
-        
-        # this permits to locate the calving front in a cell in the 4 directions
-        CF_W = tf.where((lsurf<0)&(thk>0)&(thkext[:,1:-1,:-2]==0)&(lsurfext[:,1:-1,:-2]<=0),1.0,0.0)
-        CF_E = tf.where((lsurf<0)&(thk>0)&(thkext[:,1:-1,2:]==0)&(lsurfext[:,1:-1,2:]<=0),1.0,0.0) 
-        CF_S = tf.where((lsurf<0)&(thk>0)&(thkext[:,:-2,1:-1]==0)&(lsurfext[:,:-2,1:-1]<=0),1.0,0.0)
-        CF_N = tf.where((lsurf<0)&(thk>0)&(thkext[:,2:,1:-1]==0)&(lsurfext[:,2:,1:-1]<=0),1.0,0.0)
+        # the pressure P is included in CF_W, CF_E, CF_S, CF_N
+        CF_W, CF_E, CF_S, CF_N = [geometry[k] for k in ["CF_W", "CF_E", "CF_S", "CF_N"]]
  
         if Nz > 1:
             # Blatter-Pattyn
-            weight = tf.stack([tf.ones_like(thk) * z for z in temd], axis=1) # dimensionless, 
+            weight = geometry["weight"]
             C_float = (
-                  P * tf.reduce_sum(weight * _stag2(U), axis=1) * CF_W
-                - P * tf.reduce_sum(weight * _stag2(U), axis=1) * CF_E 
-                + P * tf.reduce_sum(weight * _stag2(V), axis=1) * CF_S 
-                - P * tf.reduce_sum(weight * _stag2(V), axis=1) * CF_N 
+                  tf.reduce_sum(weight * _stag2(U), axis=1) * CF_W
+                - tf.reduce_sum(weight * _stag2(U), axis=1) * CF_E 
+                + tf.reduce_sum(weight * _stag2(V), axis=1) * CF_S 
+                - tf.reduce_sum(weight * _stag2(V), axis=1) * CF_N 
             ) 
         else:
             # SSA
-            C_float = ( P * U * CF_W - P * U * CF_E  + P * V * CF_S - P * V * CF_N )  
+            C_float = ( U * CF_W - U * CF_E  + V * CF_S - V * CF_N )  
 
         ###########################################################
 
@@ -346,6 +397,7 @@ def _iceflow_energy(
     return C_shear, C_slid, C_grav, C_float
 
 
+
 # @tf.function(experimental_relax_shapes=True)
 def iceflow_energy_XY(params, X, Y):
     U, V = Y_to_UV(params, Y)
@@ -355,11 +407,22 @@ def iceflow_energy_XY(params, X, Y):
     return iceflow_energy(params, U, V, fieldin)
 
 
+def iceflow_geometry_X(params, X):
+    return iceflow_geometry(params, X_to_fieldin(params, X))
+
+
+def iceflow_energy_geometry_Y(params, geometry, Y):
+    U, V = Y_to_UV(params, Y)
+
+    return iceflow_energy_geometry(params, U, V, geometry)
+
+
 def Y_to_UV(params, Y):
     N = params.iflo_Nz
 
-    U = tf.experimental.numpy.moveaxis(Y[:, :, :, :N], [-1], [1])
-    V = tf.experimental.numpy.moveaxis(Y[:, :, :, N:], [-1], [1])
+    # tf.transpose rather than moveaxis, which copies the rank to the host
+    U = tf.transpose(Y[:, :, :, :N], [0, 3, 1, 2])
+    V = tf.transpose(Y[:, :, :, N:], [0, 3, 1, 2])
 
     return U, V
 
@@ -383,6 +446,13 @@ def fieldin_to_X(params, fieldin):
 
     fieldin_dim = [0, 0, 1 * (params.iflo_dim_arrhenius == 3), 0, 0]
 
+    # in ensemble mode, thk has a leading member axis, which becomes the batch
+    # axis of X, fields shared by all members (e.g. dX) are broadcasted
+    if len(fieldin[0].shape) == 3:
+        for f in fieldin:
+            X.append(tf.broadcast_to(f, fieldin[0].shape))
+        return tf.stack(X, axis=-1)
+
     for f, s in zip(fieldin, fieldin_dim):
         if s == 0:
             X.append(tf.expand_dims(f, axis=-1))
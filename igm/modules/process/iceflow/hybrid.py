@@ -0,0 +1,28 @@
+import numpy as np 
+import tensorflow as tf 
+
+from .utils import *
+from .solve import *
+from .emulate import *
+
+def initialize_iceflow_hybrid(params,state):
+
+    initialize_iceflow_emulator(params,state)
+
+    initialize_iceflow_solver(params,state)
+
+def update_iceflow_hybrid(params, state):
+    """
+    The velocities predicted by the emulator are the initial guess of the
+    solver, which stops after iflo_hybrid_nbitmax iterations or once the
+    energy decreases by less than iflo_hybrid_tol (relative)
+    """
+
+    if params.iflo_retrain_emulator_freq > 0:
+        update_iceflow_emulator(params, state)
+
+    update_iceflow_emulated(params, state)
+
+    update_iceflow_solved(
+        params, state, nbitmax=params.iflo_hybrid_nbitmax, tol=params.iflo_hybrid_tol
+    )
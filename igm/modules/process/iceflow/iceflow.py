@@ -50,9 +50,11 @@ from .params_iceflow import *
 from .emulate import *
 from .solve import *
 from .diagnostic import *
+from .hybrid import *
 from .utils import *
 from .optimize import *
 from .pretraining import *
+from .distill import *
 
 def params(parser):
 
@@ -68,6 +70,11 @@ def initialize(params, state):
 
     state.tcomp_iceflow = []
 
+    if params.ensemble_size > 1:
+        # only the emulated 2D-arrhenius ice flow handles the member axis
+        assert (params.iflo_type == "emulated") & (params.iflo_dim_arrhenius == 2)
+        initialize_ensemble(params, state)
+
     if params.iflo_run_pretraining:
         pretraining(params, state)
 
@@ -86,11 +93,18 @@ def initialize(params, state):
         # define the second velocity field
         initialize_iceflow_diagnostic(params,state)
 
+    elif params.iflo_type == "hybrid":
+        # define the emulator and the solver
+        initialize_iceflow_hybrid(params,state)
+
     # create the vertica discretization
     define_vertical_weight(params, state)
 
     # padding is necessary when using U-net emulator
-    state.PAD = compute_PAD(params,state.thk.shape[1],state.thk.shape[0])
+    state.PAD = compute_PAD(params,state.thk.shape[-1],state.thk.shape[-2])
+
+    if params.iflo_run_distillation:
+        distillation(params, state)
 
     if not params.iflo_type == "solved":
         update_iceflow_emulated(params, state)
@@ -105,7 +119,7 @@ def initialize(params, state):
 
 def update(params, state):
     if hasattr(state, "logger"):
-        state.logger.info("Update ICEFLOW at time : " + str(state.t.numpy()))
+        state.logger.info("Update ICEFLOW at time : %s", LazyFloat(state.t))
 
     state.tcomp_iceflow.append(time.time())
 
@@ -121,12 +135,67 @@ def update(params, state):
     elif params.iflo_type == "diagnostic":
         update_iceflow_diagnostic(params, state)
 
+    elif params.iflo_type == "hybrid":
+        update_iceflow_hybrid(params, state)
+
     state.tcomp_iceflow[-1] -= time.time()
     state.tcomp_iceflow[-1] *= -1
 
+def fused_fields(params, state):
+    # only the emulated ice flow can be compiled within a fused step
+    if not params.iflo_type == "emulated":
+        return None
+
+    # the quantized emulator runs out of the graph of tensorflow
+    if not params.iflo_inference_backend == "keras":
+        return None
+
+    # the skipped inferences and the active window depend on the values of the fields
+    if (params.iflo_emulator_skip_tol > 0) | params.iflo_crop_active:
+        return None
+
+    return params.iflo_fieldin + [
+        "U", "V", "uvelbase", "vvelbase", "ubar", "vbar", "uvelsurf", "vvelsurf"
+    ]
+
+def fused_prepare(params, state):
+    # retraining the emulator stays out of the compiled graph
+    if params.iflo_retrain_emulator_freq > 0:
+        update_iceflow_emulator(params, state)
+
+def fused_step(params, state, fields):
+    fieldin = [fields[f] for f in params.iflo_fieldin]
+
+    fields["U"], fields["V"] = emulate_UV(params, state, fieldin)
+
+    fields.update(
+        compute_2d_iceflow_variables(fields["U"], fields["V"], state.vert_weight)
+    )
+
+    return fields
+
 def finalize(params, state):
     if params.iflo_save_model:
         save_iceflow_model(params, state)
+
+    if params.iflo_type == "diagnostic":
+        finalize_iceflow_diagnostic(params, state)
+
+    if (params.iflo_type in ["solved", "hybrid"]) & (len(getattr(state, "nbit_solver", [])) > 0):
+        print(
+            "Iceflow solver : %.1f iterations per time step on average (min %d, max %d)"
+            % (np.mean(state.nbit_solver), np.min(state.nbit_solver), np.max(state.nbit_solver))
+        )
+
+    if (params.iflo_emulator_skip_tol > 0) & hasattr(state, "emulator_nb_skipped"):
+        print(
+            "Emulator : %d evaluations skipped over %d, max. relative change of the velocity after skipped ones : %.1e"
+            % (
+                state.emulator_nb_skipped,
+                state.emulator_nb_skipped + state.emulator_nb_evaluated,
+                max(state.emulator_skip_error, default=0),
+            )
+        )
    
  
   
\ No newline at end of file
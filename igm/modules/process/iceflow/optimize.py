@@ -117,6 +117,8 @@ def optimize(params, state):
             else:
                 Y = state.iceflow_model(tf.pad(X, state.PAD, "CONSTANT"))[:, :Ny, :Nx, :]
 
+            Y = tf.cast(Y, "float32")
+
             U, V = Y_to_UV(params, Y)
 
             U = U[0]
@@ -200,24 +202,22 @@ def optimize(params, state):
                 var_to_opti.append(vars()[f])
 
             # Compute gradient of COST w.r.t. X
-            grads = tf.Variable(t.gradient(cost_total, var_to_opti))
+            grads = t.gradient(cost_total, var_to_opti)
 
             # this serve to restict the optimization of controls to the mask
             if params.sole_mask:
-                for ii in range(grads.shape[0]):
+                for ii in range(len(grads)):
                     if not "slidingco" == params.opti_control[ii]:
-                        grads[ii].assign(tf.where((state.icemaskobs > 0.5), grads[ii], 0))
+                        grads[ii] = tf.where((state.icemaskobs > 0.5), grads[ii], 0)
                     else:
-                        grads[ii].assign(tf.where((state.icemaskobs == 1), grads[ii], 0))
+                        grads[ii] = tf.where((state.icemaskobs == 1), grads[ii], 0)
             else:
-                for ii in range(grads.shape[0]):
+                for ii in range(len(grads)):
                     if not "slidingco" == params.opti_control[ii]:
-                        grads[ii].assign(tf.where((state.icemaskobs > 0.5), grads[ii], 0))
+                        grads[ii] = tf.where((state.icemaskobs > 0.5), grads[ii], 0)
 
             # One step of descent -> this will update input variable X
-            optimizer.apply_gradients(
-                zip([grads[i] for i in range(grads.shape[0])], var_to_opti)
-            )
+            optimizer.apply_gradients(zip(grads, var_to_opti))
 
             ###################
 
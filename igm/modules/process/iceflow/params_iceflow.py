@@ -17,12 +17,26 @@ def params_iceflow(parser):
         help="Run the data assimilation scheme",
     )
 
+    parser.add_argument(
+        "--iflo_run_distillation",
+        type=str2bool,
+        default=False,
+        help="Train smaller cnn emulators to reproduce the emulator (or the solver), and save the fastest one meeting iflo_distill_budget",
+    )
+
     # type of ice flow computations
     parser.add_argument(
         "--iflo_type",
         type=str,
         default="emulated",
-        help="Type of iceflow: it can emulated (default), solved, or in diagnostic mode to investigate the fidelity of the emulator towads the solver",
+        help="Type of iceflow: it can emulated (default), solved, hybrid (the emulator gives the initial guess of the solver), or in diagnostic mode to investigate the fidelity of the emulator towads the solver",
+    )
+
+    parser.add_argument(
+        "--iflo_diagnostic_async",
+        type=str2bool,
+        default=False,
+        help="In diagnostic mode, run the reference solves in a background thread on a snapshot of the state, a solve is skipped if the previous one is still waiting",
     )
 
     parser.add_argument(
@@ -102,6 +116,48 @@ def params_iceflow(parser):
         default=False,
         help="save the iceflow emaultor at the end of the simulation",
     )
+    parser.add_argument(
+        "--iflo_distill_architectures",
+        type=list,
+        default=["4_8", "4_16", "6_16", "8_8", "8_16"],
+        help="Architectures of the distilled emulators (cnn), as nb_layers_nb_out_filter",
+    )
+    parser.add_argument(
+        "--iflo_distill_budget",
+        type=float,
+        default=0.05,
+        help="Maximum relative error (L2 on the ice-covered cells) of the velocities of a distilled emulator against the teacher",
+    )
+    parser.add_argument(
+        "--iflo_distill_nb_samples",
+        type=int,
+        default=64,
+        help="Number of states sampled around the initial one for the distillation, half of them for the training, half for the test",
+    )
+    parser.add_argument(
+        "--iflo_distill_batch_size",
+        type=int,
+        default=4,
+        help="Number of samples per iteration of the training of the distilled emulators",
+    )
+    parser.add_argument(
+        "--iflo_distill_nbit",
+        type=int,
+        default=5000,
+        help="Number of iterations of the training of each distilled emulator",
+    )
+    parser.add_argument(
+        "--iflo_distill_lr",
+        type=float,
+        default=0.001,
+        help="Learning rate of the training of the distilled emulators",
+    )
+    parser.add_argument(
+        "--iflo_distill_directory",
+        type=str,
+        default="emulators",
+        help="Directory where the distilled emulator is saved, whose emulators are used as pretrained emulators with those of the igm package",
+    )
 
     # vertical discretization
     parser.add_argument(
@@ -142,6 +198,48 @@ def params_iceflow(parser):
         default=True,
         help="This permits to stop the solver if the energy does not decrease",
     )
+    parser.add_argument(
+        "--iflo_solve_compiled",
+        type=str2bool,
+        default=False,
+        help="Run the iterations of the solver in a compiled loop (tf.while_loop), with the stopping criteria and the costs on the device",
+    )
+    parser.add_argument(
+        "--iflo_multigrid_levels",
+        type=int,
+        default=0,
+        help="Number of coarser grids (each twice coarser) of the V-cycle of coarse-grid corrections of the velocity at each solve (0 to solve on the grid of the state only)",
+    )
+    parser.add_argument(
+        "--iflo_multigrid_nbit",
+        type=int,
+        default=100,
+        help="Maximum number of iterations of the solver on the coarsest grid",
+    )
+    parser.add_argument(
+        "--iflo_multigrid_nbit_smooth",
+        type=int,
+        default=10,
+        help="Number of iterations of the solver on the intermediate coarser grids, before and after their coarse-grid correction",
+    )
+    parser.add_argument(
+        "--iflo_multigrid_tol",
+        type=float,
+        default=0.001,
+        help="Stop the solver on the coarsest grid once the energy decreases by less than this (relative) in an iteration",
+    )
+    parser.add_argument(
+        "--iflo_hybrid_nbitmax",
+        type=int,
+        default=20,
+        help="Maximum number of iterations of the solver after the emulator in hybrid mode",
+    )
+    parser.add_argument(
+        "--iflo_hybrid_tol",
+        type=float,
+        default=0.001,
+        help="In hybrid mode, stop the solver once the energy decreases by less than this (relative) in an iteration",
+    )
 
     # emualtion parameters
     parser.add_argument(
@@ -187,6 +285,36 @@ def params_iceflow(parser):
         default=750,
         help="Size of the patch used for retraining the emulator, this is usefull for large size arrays, otherwise the GPU memory can be overloaded",
     )
+    parser.add_argument(
+        "--iflo_retrain_emulator_microbatch",
+        type=int,
+        default=1,
+        help="Number of patches evaluated together in an iteration of the retraining, the gradients of all the patches are accumulated and applied once, 0 means all the patches at once",
+    )
+    parser.add_argument(
+        "--iflo_retrain_emulator_adaptive",
+        type=str2bool,
+        default=False,
+        help="Retrain the emulator (every iflo_retrain_emulator_freq time steps) only if the geometry or the energy changed beyond the tolerances below, and stop the iterations once the cost plateaus",
+    )
+    parser.add_argument(
+        "--iflo_retrain_emulator_geom_tol",
+        type=float,
+        default=2.0,
+        help="With iflo_retrain_emulator_adaptive, retrain if the ice thickness or surface changed by more than this (m) since the last retraining",
+    )
+    parser.add_argument(
+        "--iflo_retrain_emulator_cost_tol",
+        type=float,
+        default=0.01,
+        help="With iflo_retrain_emulator_adaptive, retrain if the energy of the emulated velocities changed by more than this (relative) since the last retraining",
+    )
+    parser.add_argument(
+        "--iflo_retrain_emulator_plateau_tol",
+        type=float,
+        default=0.001,
+        help="With iflo_retrain_emulator_adaptive, stop the retraining once the cost decreases by less than this (relative) in an iteration",
+    )
     parser.add_argument(
         "--iflo_multiple_window_size",
         type=int,
@@ -199,6 +327,84 @@ def params_iceflow(parser):
         default=0,
         help="This permits to artifically upper-bound velocities, active if > 0",
     )
+    parser.add_argument(
+        "--iflo_emulator_jit",
+        type=str2bool,
+        default=False,
+        help="Evaluate the emulator and derive the 2D velocities in a single function compiled with XLA",
+    )
+    parser.add_argument(
+        "--iflo_emulator_bucket",
+        type=int,
+        default=32,
+        help="With iflo_emulator_jit, the domain is padded to a multiple of this size such that domains of close sizes share the same compiled function",
+    )
+    parser.add_argument(
+        "--iflo_emulator_skip_tol",
+        type=float,
+        default=0.0,
+        help="Keep the velocities of the last evaluation of the emulator while its inputs changed by less than this since (max. change relative to the max. of each field), active if > 0",
+    )
+    parser.add_argument(
+        "--iflo_emulator_skip_max",
+        type=int,
+        default=10,
+        help="Maximum number of evaluations of the emulator skipped in a row with iflo_emulator_skip_tol",
+    )
+    parser.add_argument(
+        "--iflo_inference_backend",
+        type=str,
+        default="keras",
+        help="Evaluate the emulator with keras, or with a copy quantized for CPUs with TensorFlow Lite (tflite), which does not follow the retraining",
+    )
+    parser.add_argument(
+        "--iflo_inference_quantization",
+        type=str,
+        default="float16",
+        help="Quantization of the emulator with iflo_inference_backend tflite: float32 (none), float16, dynamic (int8 weights) or int8 (int8 weights and activations, calibrated on the input fields), the emulators of the igm package lose their accuracy in int8 (see benchmarks/bench_quantized_inference.py)",
+    )
+    parser.add_argument(
+        "--iflo_inference_tflite",
+        type=str,
+        default="",
+        help="File of the quantized emulator with iflo_inference_backend tflite, read if it exists, otherwise written after the quantization",
+    )
+    parser.add_argument(
+        "--iflo_crop_active",
+        type=str2bool,
+        default=False,
+        help="Evaluate and retrain the emulator only on the bounding box of the ice extended by iflo_crop_halo cells, the velocities are zero outside",
+    )
+    parser.add_argument(
+        "--iflo_crop_halo",
+        type=int,
+        default=16,
+        help="Number of cells added around the ice with iflo_crop_active, it should cover the receptive field of the emulator",
+    )
+    parser.add_argument(
+        "--iflo_tile_size",
+        type=int,
+        default=0,
+        help="If > 0, the emulator is evaluated on overlapping tiles of this size (in cells) one after the other, which bounds its memory for large domains, it must be at least 2 iflo_tile_halo + 3 iflo_tile_overlap",
+    )
+    parser.add_argument(
+        "--iflo_tile_halo",
+        type=int,
+        default=16,
+        help="Number of cells discarded at the inner edges of the tiles with iflo_tile_size, it should cover the receptive field of the emulator",
+    )
+    parser.add_argument(
+        "--iflo_tile_overlap",
+        type=int,
+        default=8,
+        help="Number of cells over which neighbouring tiles are blended with iflo_tile_size",
+    )
+    parser.add_argument(
+        "--iflo_tile_blend",
+        type=str,
+        default="cosine",
+        help="Weights blending the tiles over their overlap: linear or cosine",
+    )
 
     # CNN parameters
     parser.add_argument(
@@ -307,6 +513,18 @@ def params_iceflow(parser):
         default=False,
         help="iflo_optimizer_lbfgs",
     )
+    parser.add_argument(
+        "--iflo_optimizer_newton",
+        type=str2bool,
+        default=False,
+        help="Solve the iceflow with a truncated Newton method (Newton-CG with Hessian-vector products and line search)",
+    )
+    parser.add_argument(
+        "--iflo_newton_cg_nbit",
+        type=int,
+        default=20,
+        help="Maximum number of conjugate gradient iterations (Hessian-vector products) per Newton iteration",
+    )
     
     parser.add_argument(
         "--iflo_optimizer_emulator",
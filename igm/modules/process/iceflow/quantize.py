@@ -0,0 +1,154 @@
+import numpy as np
+import tensorflow as tf
+import os
+import json
+import hashlib
+
+from .energy_iceflow import *
+
+
+class QuantizedEmulator:
+    """
+    Emulator converted to TensorFlow Lite (see quantize_emulator), called as
+    the Keras model it replaces for the inference on CPU. The interpreter is
+    resized when the shape of the input changes (e.g. domain, tiles, batch)
+    """
+
+    def __init__(self, content):
+        self.interpreter = tf.lite.Interpreter(
+            model_content=content, num_threads=os.cpu_count()
+        )
+        self.input = self.interpreter.get_input_details()[0]["index"]
+        self.output = self.interpreter.get_output_details()[0]["index"]
+        self.shape = None
+
+    def __call__(self, X):
+        X = np.asarray(X, dtype=np.float32)
+        if not X.shape == self.shape:
+            self.interpreter.resize_tensor_input(self.input, X.shape)
+            self.interpreter.allocate_tensors()
+            self.shape = X.shape
+        self.interpreter.set_tensor(self.input, X)
+        self.interpreter.invoke()
+        return tf.constant(self.interpreter.get_tensor(self.output))
+
+
+def calibration_samples(params, fieldin, scales=[0.5, 0.75, 1.0, 1.25, 1.5]):
+    """
+    Inputs of the emulator representative of a run, for the calibration of the
+    int8 quantization: the input fields with the ice thickness scaled
+    """
+    fields = dict(zip(params.iflo_fieldin, fieldin))
+    samples = []
+    for s in scales:
+        scaled = dict(fields)
+        scaled["thk"] = s * fields["thk"]
+        scaled["usurf"] = fields["usurf"] + (s - 1) * fields["thk"]
+        samples.append(fieldin_to_X(params, [scaled[f] for f in params.iflo_fieldin]))
+    return samples
+
+
+def quantize_emulator(params, model, samples):
+    """
+    Convert the emulator to TensorFlow Lite, with its weights in float32
+    (iflo_inference_quantization "float32"), in float16 ("float16"), in int8 (dynamic, the activations
+    stay in float32) or with weights and activations in int8 ("int8"), the
+    ranges of the activations being calibrated on the samples. Inputs and
+    outputs stay in float32.
+    """
+    assert params.iflo_inference_quantization in ["float32", "float16", "dynamic", "int8"]
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if not params.iflo_inference_quantization == "float32":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+
+    if params.iflo_inference_quantization == "float16":
+        converter.target_spec.supported_types = [tf.float16]
+
+    elif params.iflo_inference_quantization == "int8":
+        converter.representative_dataset = lambda: (
+            [np.asarray(X, dtype=np.float32)] for X in samples
+        )
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+
+    return converter.convert()
+
+
+def quantization_config(params, model):
+    """
+    Emulator and quantization a TensorFlow Lite file was converted from, saved
+    next to it (<iflo_inference_tflite>.json), the weights are given by their hash
+    """
+    sha = hashlib.sha1()
+    for w in model.weights:
+        sha.update(np.ascontiguousarray(w.numpy()).tobytes())
+
+    return {
+        "emulator": params.iflo_emulator,
+        "Nz": params.iflo_Nz,
+        "vert_spacing": params.iflo_vert_spacing,
+        "network": params.iflo_network,
+        "nb_layers": params.iflo_nb_layers,
+        "nb_out_filter": params.iflo_nb_out_filter,
+        "dim_arrhenius": params.iflo_dim_arrhenius,
+        "new_friction_param": params.iflo_new_friction_param,
+        "fieldin": params.iflo_fieldin,
+        "quantization": params.iflo_inference_quantization,
+        "weights": sha.hexdigest(),
+    }
+
+
+def _read_tflite(params, config):
+    """Content of iflo_inference_tflite, None if it is missing or was converted from another config."""
+    path = params.iflo_inference_tflite
+    if (path == "") or (not os.path.exists(path)):
+        return None
+
+    saved = None
+    if os.path.exists(path + ".json"):
+        with open(path + ".json", "r") as f:
+            saved = json.load(f)
+
+    if not saved == config:
+        print("Quantized emulator " + path + " converted from another emulator, converted again")
+        return None
+
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def initialize_quantized_emulator(params, state):
+    """
+    Quantized copy of the emulator used for the inference if
+    iflo_inference_backend is "tflite": read from iflo_inference_tflite if this
+    file exists and was converted from the same emulator and quantization
+    (see quantization_config), otherwise converted from the current fields,
+    and saved to iflo_inference_tflite if given, such that the next runs reuse it
+    """
+    assert params.iflo_inference_backend in ["keras", "tflite"]
+
+    if params.iflo_inference_backend == "keras":
+        return
+
+    # the quantized copy is made once, it would not follow the retraining
+    assert params.iflo_retrain_emulator_freq == 0
+    assert not params.iflo_run_data_assimilation
+    assert not params.iflo_emulator_jit
+
+    config = quantization_config(params, state.iceflow_model)
+    content = _read_tflite(params, config)
+
+    if content is not None:
+        print("Quantized emulator read from " + params.iflo_inference_tflite)
+    else:
+        fieldin = [vars(state)[f] for f in params.iflo_fieldin]
+        content = quantize_emulator(params, state.iceflow_model, calibration_samples(params, fieldin))
+
+        if not params.iflo_inference_tflite == "":
+            with open(params.iflo_inference_tflite, "wb") as f:
+                f.write(content)
+            with open(params.iflo_inference_tflite + ".json", "w") as f:
+                json.dump(config, f, indent=1)
+            print("Quantized emulator saved to " + params.iflo_inference_tflite)
+
+    state.iceflow_quantized = QuantizedEmulator(content)
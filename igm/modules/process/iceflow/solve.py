@@ -2,36 +2,59 @@ import numpy as np
 import tensorflow as tf 
 from .utils import *
 from .energy_iceflow import *
+from igm.modules.utils import LazyFloat
 
-def initialize_iceflow_solver(params,state):
+def _solver_optimizer(params):
 
     if int(tf.__version__.split(".")[1]) <= 10:
-        state.optimizer = getattr(tf.keras.optimizers,params.iflo_optimizer_solver)(
+        return getattr(tf.keras.optimizers,params.iflo_optimizer_solver)(
             learning_rate=params.iflo_solve_step_size
         )
     else:
-        state.optimizer = getattr(tf.keras.optimizers.legacy,params.iflo_optimizer_solver)(
+        return getattr(tf.keras.optimizers.legacy,params.iflo_optimizer_solver)(
             learning_rate=params.iflo_solve_step_size
         )
 
-def solve_iceflow(params, state, U, V):
+def initialize_iceflow_solver(params,state):
+
+    state.optimizer = _solver_optimizer(params)
+
+    # number of iterations of the solver at each time step
+    state.nbit_solver = []
+
+def solve_iceflow(params, state, U, V, nbitmax=None, tol=0.0, fieldin=None, optimizer=None):
     """
-    solve_iceflow
+    solve_iceflow, in at most nbitmax iterations (iflo_solve_nbitmax if None),
+    stopping once the energy decreases by less than tol (relative) if tol > 0,
+    on the fields of the state unless fieldin is given (e.g. a coarser grid)
     """
 
+    if params.iflo_solve_compiled & (fieldin is None) & (optimizer is None):
+        return solve_iceflow_compiled(params, state, U, V, nbitmax, tol)
+
     Cost_Glen = []
 
-    for i in range(params.iflo_solve_nbitmax):
+    if nbitmax is None:
+        nbitmax = params.iflo_solve_nbitmax
+
+    if fieldin is None:
+        fieldin = [
+            tf.expand_dims(vars(state)[f], axis=0) for f in params.iflo_fieldin
+        ]
+
+    if optimizer is None:
+        optimizer = state.optimizer
+
+    # the geometry is prepared once for all the iterations
+    geometry = iceflow_geometry(params, fieldin)
+
+    for i in range(nbitmax):
         with tf.GradientTape() as t:
             t.watch(U)
             t.watch(V)
 
-            fieldin = [
-                tf.expand_dims(vars(state)[f], axis=0) for f in params.iflo_fieldin
-            ]
-
-            C_shear, C_slid, C_grav, C_float = iceflow_energy(
-                params, tf.expand_dims(U, axis=0), tf.expand_dims(V, axis=0), fieldin
+            C_shear, C_slid, C_grav, C_float = iceflow_energy_geometry(
+                params, tf.expand_dims(U, axis=0), tf.expand_dims(V, axis=0), geometry
             )
 
             COST = tf.reduce_mean(C_shear) + tf.reduce_mean(C_slid) \
@@ -53,38 +76,234 @@ def solve_iceflow(params, state, U, V):
                     if Cost_Glen[-1] >= Cost_Glen[-2]:
                         break
 
-            grads = tf.Variable(t.gradient(COST, [U, V]))
+            if (tol > 0) & (i > 0):
+                if abs(Cost_Glen[-2] - Cost_Glen[-1]) < tol * abs(Cost_Glen[-1]):
+                    break
 
-            state.optimizer.apply_gradients(
-                zip([grads[i] for i in range(grads.shape[0])], [U, V])
-            )
+            grads = t.gradient(COST, [U, V])
+
+            optimizer.apply_gradients(zip(grads, [U, V]))
 
             if (i + 1) % 100 == 0:
                 velsurf_mag = tf.sqrt(U[-1] ** 2 + V[-1] ** 2)
                 print("solve :", i, COST.numpy(), np.max(velsurf_mag))
 
+    U = tf.where(fieldin[0][0] > 0, U, 0)
+    V = tf.where(fieldin[0][0] > 0, V, 0)
+
+    return U, V, Cost_Glen
+
+def _solve_iceflow_loop(params, optimizer, U, V):
+    """the iterations of solve_iceflow as a tf.while_loop, compiled"""
+
+    @tf.function
+    def loop(fieldin, nbitmax, tol):
+
+        geometry = iceflow_geometry(params, fieldin)
+
+        def body(i, stop, previous, costs):
+            with tf.GradientTape() as t:
+                C_shear, C_slid, C_grav, C_float = iceflow_energy_geometry(
+                    params, tf.expand_dims(U, axis=0), tf.expand_dims(V, axis=0), geometry
+                )
+                COST = tf.reduce_mean(C_shear) + tf.reduce_mean(C_slid) \
+                     + tf.reduce_mean(C_grav)  + tf.reduce_mean(C_float)
+
+            costs = costs.write(i, COST)
+
+            # Stop if the cost no longer decreases, or decreases by less than tol
+            if params.iflo_solve_stop_if_no_decrease:
+                stop = (i > 1) & (COST >= previous)
+            stop = stop | ((tol > 0) & (i > 0) & (tf.abs(previous - COST) < tol * tf.abs(COST)))
+
+            grads = t.gradient(COST, [U, V])
+            tf.cond(stop, tf.no_op, lambda: optimizer.apply_gradients(zip(grads, [U, V])))
+
+            if (i + 1) % 100 == 0:
+                tf.print("solve :", i, COST, tf.reduce_max(tf.sqrt(U[-1] ** 2 + V[-1] ** 2)))
+
+            return i + 1, stop, COST, costs
+
+        i, stop, previous, costs = tf.while_loop(
+            lambda i, stop, previous, costs: (i < nbitmax) & tf.logical_not(stop),
+            body,
+            [0, False, 0.0, tf.TensorArray(tf.float32, size=nbitmax)],
+        )
+
+        return costs.stack()[:i]
+
+    return loop
+
+def solve_iceflow_compiled(params, state, U, V, nbitmax=None, tol=0.0):
+    """
+    solve_iceflow, with the iterations in a compiled tf.while_loop: the
+    stopping criteria are evaluated and the costs are stored on the device,
+    the costs are returned as a single tensor
+    """
+
+    if nbitmax is None:
+        nbitmax = params.iflo_solve_nbitmax
+
+    # the loop is traced once for the velocity fields and the optimizer
+    loop_of = getattr(state, "solve_iceflow_loop_of", (None, None, None))
+    if not all(a is b for a, b in zip(loop_of, (U, V, state.optimizer))):
+        state.solve_iceflow_loop = _solve_iceflow_loop(params, state.optimizer, U, V)
+        state.solve_iceflow_loop_of = (U, V, state.optimizer)
+
+    fieldin = [tf.expand_dims(vars(state)[f], axis=0) for f in params.iflo_fieldin]
+
+    Cost_Glen = state.solve_iceflow_loop(
+        fieldin, tf.constant(nbitmax), tf.constant(tol, dtype=tf.float32)
+    )
+
     U = tf.where(state.thk > 0, U, 0)
     V = tf.where(state.thk > 0, V, 0)
 
     return U, V, Cost_Glen
 
-def solve_iceflow_lbfgs(params, state, U, V):
+def _restrict(f):
+    """average f over 2x2 cells, along its two last axes"""
+    shape = list(f.shape)
+    g = tf.reshape(f, [-1] + shape[-2:])
+    g = tf.nn.avg_pool2d(tf.transpose(g, [1, 2, 0])[None], 2, 2, "SAME")[0]
+    return tf.reshape(tf.transpose(g, [2, 0, 1]), shape[:-2] + list(g.shape[:2]))
+
+def _prolong(f, shape):
+    """bilinear interpolation of f on the grid of the given shape (Ny, Nx)"""
+    g = tf.reshape(f, [-1] + list(f.shape[-2:]))
+    g = tf.image.resize(tf.transpose(g, [1, 2, 0])[None], list(shape))[0]
+    return tf.reshape(tf.transpose(g, [2, 0, 1]), list(f.shape[:-2]) + list(shape))
+
+def _level_cost(params, geometry, U, V, shift=None):
+    """energy on a grid, minus the linear term of the coarse-grid correction if given"""
+    C_shear, C_slid, C_grav, C_float = iceflow_energy_geometry(
+        params, tf.expand_dims(U, axis=0), tf.expand_dims(V, axis=0), geometry
+    )
+    COST = tf.reduce_mean(C_shear) + tf.reduce_mean(C_slid) \
+         + tf.reduce_mean(C_grav)  + tf.reduce_mean(C_float)
+    if shift is not None:
+        COST = COST - tf.reduce_sum(shift[0] * U) - tf.reduce_sum(shift[1] * V)
+    return COST
+
+def _level_gradient(params, geometry, U, V, shift=None):
+    U, V = tf.convert_to_tensor(U), tf.convert_to_tensor(V)
+    with tf.GradientTape() as t:
+        t.watch(U)
+        t.watch(V)
+        COST = _level_cost(params, geometry, U, V, shift)
+    return t.gradient(COST, [U, V])
+
+def _minimize_level(params, geometry, U, V, nbit, tol=0.0, shift=None):
+    """
+    at most nbit iterations of the solver (with a new optimizer) on a coarser
+    grid, stopping once the cost decreases by less than tol (relative) if tol > 0
+    """
+    optimizer = _solver_optimizer(params)
+    U, V = tf.Variable(U), tf.Variable(V)
+    costs = []
+    for i in range(nbit):
+        with tf.GradientTape() as t:
+            COST = _level_cost(params, geometry, U, V, shift)
+        costs.append(COST)
+        if (tol > 0) & (i > 0):
+            if abs(costs[-2] - costs[-1]) < tol * abs(costs[-1]):
+                break
+        grads = t.gradient(COST, [U, V])
+        optimizer.apply_gradients(zip(grads, [U, V]))
+    return tf.convert_to_tensor(U), tf.convert_to_tensor(V)
+
+def _multigrid_cycle(params, geometries, l, U, V, shift=None):
+    """
+    V-cycle of coarse-grid corrections (MG/OPT) of the velocity on grid l:
+    the gradient of the cost is restricted to the coarser grid, where the
+    energy minus a linear term, such that its gradient at the restricted
+    velocity is the restricted gradient, is minimized (recursively), and
+    the correction of the velocity is prolonged, and halved until it
+    decreases the cost of grid l. On the coarser grids, the solver runs
+    iflo_multigrid_nbit_smooth iterations before and after the correction,
+    and up to iflo_multigrid_nbit iterations on the coarsest grid.
+    """
+    if l == len(geometries) - 1:
+        return _minimize_level(
+            params, geometries[l], U, V,
+            params.iflo_multigrid_nbit, params.iflo_multigrid_tol, shift,
+        )
+
+    if l > 0:
+        U, V = _minimize_level(
+            params, geometries[l], U, V, params.iflo_multigrid_nbit_smooth, shift=shift
+        )
+
+    # the transpose of the bilinear prolongation sums about 2x2 cells
+    gU, gV = _level_gradient(params, geometries[l], U, V, shift)
+    UH, VH = _restrict(U), _restrict(V)
+    gUH, gVH = _level_gradient(params, geometries[l + 1], UH, VH)
+    shiftH = (gUH - 4 * _restrict(gU), gVH - 4 * _restrict(gV))
+
+    UH_new, VH_new = _multigrid_cycle(params, geometries, l + 1, UH, VH, shiftH)
+
+    dU = _prolong(UH_new - UH, U.shape[-2:])
+    dV = _prolong(VH_new - VH, V.shape[-2:])
+    cost = _level_cost(params, geometries[l], U, V, shift)
+    for k in range(5):
+        if _level_cost(params, geometries[l], U + dU, V + dV, shift) < cost:
+            U, V = U + dU, V + dV
+            break
+        dU, dV = dU / 2, dV / 2
+
+    if l > 0:
+        U, V = _minimize_level(
+            params, geometries[l], U, V, params.iflo_multigrid_nbit_smooth, shift=shift
+        )
+
+    return U, V
+
+def solve_iceflow_multigrid(params, state, U, V, nbitmax=None, tol=0.0):
+    """
+    Multigrid solve: the fields are restricted (2x2 averages) on
+    iflo_multigrid_levels coarser grids, a V-cycle of coarse-grid corrections
+    (see _multigrid_cycle) corrects the low frequencies of the velocity, and
+    solve_iceflow continues on the grid of the state (post-smoothing). The
+    cycle runs at each solve, the costs are those of the finest grid.
+    """
+
+    fieldin = [tf.expand_dims(vars(state)[f], axis=0) for f in params.iflo_fieldin]
+
+    geometries = [iceflow_geometry(params, fieldin)]
+    for l in range(params.iflo_multigrid_levels):
+        fieldin = [_restrict(f) for f in fieldin]
+        fieldin[params.iflo_fieldin.index("dX")] *= 2
+        geometries.append(iceflow_geometry(params, fieldin))
+
+    U_new, V_new = _multigrid_cycle(params, geometries, 0, U, V)
+    U.assign(U_new)
+    V.assign(V_new)
+
+    return solve_iceflow(params, state, U, V, nbitmax, tol)
+
+def solve_iceflow_lbfgs(params, state, U, V, nbitmax=None, tol=0.0):
+    """
+    Minimize the energy with the L-BFGS of tensorflow_probability, stopping
+    once the energy decreases by less than tol (relative) if tol > 0
+    """
 
     import tensorflow_probability as tfp
 
     Cost_Glen = []
+
+    fieldin = [
+        tf.expand_dims(vars(state)[f], axis=0) for f in params.iflo_fieldin
+    ]
+
+    geometry = iceflow_geometry(params, fieldin)
  
     def COST(UV):
 
         U = UV[0]
         V = UV[1]
 
-        fieldin = [
-            tf.expand_dims(vars(state)[f], axis=0) for f in params.iflo_fieldin
-        ]
-
-        C_shear, C_slid, C_grav, C_float = iceflow_energy(
-            params, tf.expand_dims(U, axis=0), tf.expand_dims(V, axis=0), fieldin
+        C_shear, C_slid, C_grav, C_float = iceflow_energy_geometry(
+            params, tf.expand_dims(U, axis=0), tf.expand_dims(V, axis=0), geometry
         )
 
         COST = tf.reduce_mean(C_shear) + tf.reduce_mean(C_slid) \
@@ -105,8 +324,9 @@ def solve_iceflow_lbfgs(params, state, U, V):
     optimizer = tfp.optimizer.lbfgs_minimize(
             value_and_gradients_function=loss_and_gradients_function,
             initial_position=UV,
-            max_iterations=params.iflo_solve_nbitmax,
-            tolerance=1e-8)
+            max_iterations=params.iflo_solve_nbitmax if nbitmax is None else nbitmax,
+            tolerance=1e-8,
+            f_relative_tolerance=tol)
     
     UV = optimizer.position
 
@@ -115,15 +335,153 @@ def solve_iceflow_lbfgs(params, state, U, V):
  
     return U, V, Cost_Glen
 
-def update_iceflow_solved(params, state):
+def _newton_functions(params):
+    """gradient of the energy and Newton-CG iteration, compiled"""
+
+    def COST(UV, geometry):
+        C_shear, C_slid, C_grav, C_float = iceflow_energy_geometry(
+            params, UV[0:1], UV[1:2], geometry
+        )
+        return tf.reduce_mean(C_shear) + tf.reduce_mean(C_slid) \
+             + tf.reduce_mean(C_grav)  + tf.reduce_mean(C_float)
+
+    def dot(a, b):
+        return tf.reduce_sum(a * b)
+
+    @tf.function
+    def cost_and_gradient(UV, geometry):
+        with tf.GradientTape() as t:
+            t.watch(UV)
+            cost = COST(UV, geometry)
+        return cost, t.gradient(cost, UV)
+
+    def hessian_vector_product(UV, p, geometry):
+        with tf.GradientTape() as t2:
+            t2.watch(UV)
+            with tf.GradientTape() as t1:
+                t1.watch(UV)
+                cost = COST(UV, geometry)
+            grad = t1.gradient(cost, UV)
+        return t2.gradient(grad, UV, output_gradients=p)
+
+    @tf.function
+    def newton_iteration(UV, cost, grad, norm_grad_0, tol, geometry):
+        """
+        One Newton-CG iteration, with the conjugate gradients and the line
+        search as tf.while_loop, returns the new velocity, its cost and
+        gradient, and whether the solver stops (the only value read on the host)
+        """
+        norm_grad = tf.norm(grad)
+
+        # forcing term of the inexact Newton step (superlinear convergence)
+        eta = tf.minimum(0.5, tf.sqrt(norm_grad / norm_grad_0))
+
+        # conjugate gradients on H p = - grad, stopped on negative curvature
+        # (steepest descent if it is met first) or once |r| <= eta |grad|
+        def cg_body(k, p, r, d, rr, stop):
+            Hd = hessian_vector_product(UV, d, geometry)
+            dHd = dot(d, Hd)
+            negative = dHd <= 0
+            alpha = tf.where(negative, 0.0, rr / dHd)
+            p = tf.where(negative, tf.where(k == 0, -grad, p), p + alpha * d)
+            r = r - alpha * Hd
+            rr_new = dot(r, r)
+            converged = tf.sqrt(rr_new) <= eta * norm_grad
+            d = tf.where(negative | converged, d, r + (rr_new / rr) * d)
+            return k + 1, p, r, d, rr_new, negative | converged
+
+        k, p, r, d, rr, stop = tf.while_loop(
+            lambda k, p, r, d, rr, stop: (k < params.iflo_newton_cg_nbit) & tf.logical_not(stop),
+            cg_body,
+            [0, tf.zeros_like(grad), -grad, -grad, dot(grad, grad), norm_grad == 0],
+        )
+
+        # backtracking line search (Armijo condition)
+        slope = dot(grad, p)
+
+        def line_search_body(k, step, accepted):
+            accepted = COST(UV + step * p, geometry) <= cost + 10 ** (-4) * step * slope
+            return k + 1, tf.where(accepted, step, step / 2), accepted
+
+        k, step, accepted = tf.while_loop(
+            lambda k, step, accepted: (k < 10) & tf.logical_not(accepted),
+            line_search_body,
+            [0, tf.constant(1.0), tf.constant(False)],
+        )
+
+        UV_new = tf.where(accepted, UV + step * p, UV)
+        cost_new, grad_new = cost_and_gradient(UV_new, geometry)
+
+        stop = (norm_grad == 0) | tf.logical_not(accepted)
+        stop = stop | ((tol > 0) & (tf.abs(cost - cost_new) < tol * tf.abs(cost_new)))
+
+        return UV_new, cost_new, grad_new, stop
+
+    return cost_and_gradient, newton_iteration
+
+def solve_iceflow_newton(params, state, U, V, nbitmax=None, tol=0.0):
+    """
+    Matrix-free truncated Newton (Newton-CG): at each iteration, the Newton
+    direction is approximated by at most iflo_newton_cg_nbit iterations of
+    conjugate gradients on Hessian-vector products (obtained with nested
+    tapes), and followed by a backtracking (Armijo) line search. Each
+    iteration is compiled, its stopping criterion is the only value read on
+    the host.
+    """
+
+    Cost_Glen = []
+
+    if nbitmax is None:
+        nbitmax = params.iflo_solve_nbitmax
+
+    fieldin = [tf.expand_dims(vars(state)[f], axis=0) for f in params.iflo_fieldin]
+
+    geometry = iceflow_geometry(params, fieldin)
+
+    if not hasattr(state, "newton_functions"):
+        state.newton_functions = _newton_functions(params)
+    cost_and_gradient, newton_iteration = state.newton_functions
+
+    UV = tf.stack([U, V], axis=0)
+
+    cost, grad = cost_and_gradient(UV, geometry)
+    norm_grad_0 = tf.norm(grad)
+    tol = tf.constant(tol, dtype=tf.float32)
+
+    for i in range(nbitmax):
+        # the energy at the start of each iteration, as solve_iceflow records it
+        Cost_Glen.append(cost)
+
+        UV, cost, grad, stop = newton_iteration(UV, cost, grad, norm_grad_0, tol, geometry)
+
+        if stop:
+            break
+
+    U = tf.where(state.thk > 0, UV[0], 0)
+    V = tf.where(state.thk > 0, UV[1], 0)
+
+    return U, V, Cost_Glen
+
+def update_iceflow_solved(params, state, nbitmax=None, tol=0.0):
 
     if params.iflo_optimizer_lbfgs:
-        U, V, Cost_Glen = solve_iceflow_lbfgs(params, state, state.U, state.V)
+        U, V, Cost_Glen = solve_iceflow_lbfgs(params, state, state.U, state.V, nbitmax, tol)
+    elif params.iflo_optimizer_newton:
+        U, V, Cost_Glen = solve_iceflow_newton(params, state, state.U, state.V, nbitmax, tol)
+    elif params.iflo_multigrid_levels > 0:
+        U, V, Cost_Glen = solve_iceflow_multigrid(params, state, state.U, state.V, nbitmax, tol)
     else:
-        U, V, Cost_Glen = solve_iceflow(params, state, state.U, state.V)
+        U, V, Cost_Glen = solve_iceflow(params, state, state.U, state.V, nbitmax, tol)
  
     state.U.assign(U)
     state.V.assign(V)
+
+    state.nbit_solver.append(len(Cost_Glen))
+
+    if hasattr(state, "logger"):
+        state.logger.info(
+            "Iceflow solver : %d iterations at time : %s", state.nbit_solver[-1], LazyFloat(state.t)
+        )
     
     if params.iflo_force_max_velbar > 0:
         velbar_mag = getmag3d(state.U, state.V)
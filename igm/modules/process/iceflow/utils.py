@@ -2,33 +2,36 @@ import numpy as np
 import tensorflow as tf 
 import math
 
+from igm.modules.utils import ensemble_param
+
 def initialize_iceflow_fields(params,state):
 
+    # in ensemble mode, fields have shape (ensemble_size, ny, nx)
+    shape3d = list(state.thk.shape[:-2]) + [params.iflo_Nz] + list(state.thk.shape[-2:])
+
     # here we initialize variable parmaetrizing ice flow
     if not hasattr(state, "arrhenius"):
         if params.iflo_dim_arrhenius == 3:
             state.arrhenius = tf.Variable(
-                tf.ones((params.iflo_Nz, state.thk.shape[0], state.thk.shape[1]))
+                tf.ones(shape3d)
                 * params.iflo_init_arrhenius * params.iflo_enhancement_factor, trainable=False
             )
         else:
             state.arrhenius = tf.Variable(
-                tf.ones_like(state.thk) * params.iflo_init_arrhenius * params.iflo_enhancement_factor, trainable=False
+                tf.ones_like(state.thk)
+                * ensemble_param(params, "iflo_init_arrhenius")
+                * ensemble_param(params, "iflo_enhancement_factor"), trainable=False
             )
 
     if not hasattr(state, "slidingco"):
         state.slidingco = tf.Variable(
-            tf.ones_like(state.thk) * params.iflo_init_slidingco, trainable=False
+            tf.ones_like(state.thk) * ensemble_param(params, "iflo_init_slidingco"), trainable=False
         )
 
     # here we create a new velocity field
     if not hasattr(state, "U"):
-        state.U = tf.Variable(
-            tf.zeros((params.iflo_Nz, state.thk.shape[0], state.thk.shape[1])), trainable=False
-        )
-        state.V = tf.Variable(
-            tf.zeros((params.iflo_Nz, state.thk.shape[0], state.thk.shape[1])), trainable=False
-        )
+        state.U = tf.Variable(tf.zeros(shape3d), trainable=False)
+        state.V = tf.Variable(tf.zeros(shape3d), trainable=False)
 
 def define_vertical_weight(params, state):
     """
@@ -44,12 +47,20 @@ def define_vertical_weight(params, state):
 
 
 def update_2d_iceflow_variables(params, state):
-    state.uvelbase = state.U[0, :, :]
-    state.vvelbase = state.V[0, :, :]
-    state.ubar = tf.reduce_sum(state.U * state.vert_weight, axis=0)
-    state.vbar = tf.reduce_sum(state.V * state.vert_weight, axis=0)
-    state.uvelsurf = state.U[-1, :, :]
-    state.vvelsurf = state.V[-1, :, :]
+    fields = compute_2d_iceflow_variables(state.U, state.V, state.vert_weight)
+    for key in fields:
+        vars(state)[key] = fields[key]
+
+def compute_2d_iceflow_variables(U, V, vert_weight):
+    # the vertical axis is the third last one (the first one except in ensemble mode)
+    return {
+        "uvelbase": U[..., 0, :, :],
+        "vvelbase": V[..., 0, :, :],
+        "ubar": tf.reduce_sum(U * vert_weight, axis=-3),
+        "vbar": tf.reduce_sum(V * vert_weight, axis=-3),
+        "uvelsurf": U[..., -1, :, :],
+        "vvelsurf": V[..., -1, :, :],
+    }
 
 def compute_PAD(params,Nx,Ny):
 
@@ -65,3 +76,45 @@ def compute_PAD(params,Nx,Ny):
     else:
         return [[0, 0], [0, 0], [0, 0], [0, 0]]
     
+
+def update_active_window(params, state):
+    """
+    Bounding box (y0, y1, x0, x1) of the ice (thk > 0) extended by a halo of
+    iflo_crop_halo cells, on which the emulator is evaluated and retrained.
+    It is re-evaluated every iflo_crop_halo // 2 iterations, as the ice front
+    advances by less than one cell per iteration (CFL < 1), the whole domain
+    is taken (and looked at again next time) if there is no ice
+    """
+    it = getattr(state, "it", -1)
+    last = getattr(state, "active_window_it", None)
+    if (last is not None) and (it >= 0):
+        if it - last < max(params.iflo_crop_halo // 2, 1):
+            return
+
+    # the ice of all members in ensemble mode
+    ice = tf.reshape(state.thk > 0, [-1] + state.thk.shape[-2:].as_list())
+    rows = np.where(tf.reduce_any(ice, axis=[0, 2]).numpy())[0]
+    cols = np.where(tf.reduce_any(ice, axis=[0, 1]).numpy())[0]
+
+    Ny, Nx = state.thk.shape[-2:]
+    if len(rows) == 0:
+        state.active_window = (0, Ny, 0, Nx)
+        state.active_window_it = None
+        return
+
+    h = params.iflo_crop_halo
+    state.active_window = (
+        int(max(rows[0] - h, 0)), int(min(rows[-1] + 1 + h, Ny)),
+        int(max(cols[0] - h, 0)), int(min(cols[-1] + 1 + h, Nx)),
+    )
+    state.active_window_it = it
+
+def crop_to_window(fields, window):
+    y0, y1, x0, x1 = window
+    return [f[..., y0:y1, x0:x1] for f in fields]
+
+def extend_from_window(f, window, shape):
+    """Pad with zeros a field computed on the window to the whole domain."""
+    y0, y1, x0, x1 = window
+    paddings = [[0, 0]] * (len(f.shape) - 2) + [[y0, shape[0] - y1], [x0, shape[1] - x1]]
+    return tf.pad(f, paddings)
@@ -114,7 +114,7 @@ def initialize(params, state):
 
 def update(params, state):
     if hasattr(state, "logger"):
-        state.logger.info("Update ICEFLOW at time : " + str(state.t.numpy()))
+        state.logger.info("Update ICEFLOW at time : %s", LazyFloat(state.t))
 
     state.tcomp_iceflow.append(time.time())
 
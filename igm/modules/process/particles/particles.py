@@ -69,9 +69,9 @@ def initialize(params, state):
 
 def update(params, state):
     if hasattr(state, "logger"):
-        state.logger.info("Update particle tracking at time : " + str(state.t.numpy()))
+        state.logger.info("Update particle tracking at time : %s", LazyFloat(state.t))
 
-    if (state.t.numpy() - state.tlast_seeding) >= params.part_frequency_seeding:
+    if (float(state.t) - state.tlast_seeding) >= params.part_frequency_seeding:
         seeding_particles(params, state)
 
         # merge the new seeding points with the former ones
@@ -85,7 +85,7 @@ def update(params, state):
         state.particle_topg = tf.Variable(tf.concat([state.particle_topg, state.nparticle_topg], axis=-1),trainable=False)
         state.particle_thk = tf.Variable(tf.concat([state.particle_thk, state.nparticle_thk], axis=-1),trainable=False)
         
-        state.tlast_seeding = state.t.numpy()
+        state.tlast_seeding = float(state.t)
 
     if (state.particle_x.shape[0]>0)&(state.it >= 0):
         state.tcomp_particles.append(time.time())
@@ -54,9 +54,9 @@ def initialize(params, state):
 
 def update(params, state):
     if hasattr(state, "logger"):
-        state.logger.info("Update particle tracking at time : " + str(state.t.numpy()))
+        state.logger.info("Update particle tracking at time : %s", LazyFloat(state.t))
 
-    if (state.t.numpy() - state.tlast_seeding) >= params.part_frequency_seeding:
+    if (float(state.t) - state.tlast_seeding) >= params.part_frequency_seeding:
         seeding_particles(params, state)
 
         # merge the new seeding points with the former ones
@@ -68,7 +68,7 @@ def update(params, state):
         state.tpos = tf.Variable(tf.concat([state.tpos, state.ntpos], axis=-1))
         state.englt = tf.Variable(tf.concat([state.englt, state.nenglt], axis=-1))
 
-        state.tlast_seeding = state.t.numpy()
+        state.tlast_seeding = float(state.t)
 
     state.tcomp_particles.append(time.time())
 
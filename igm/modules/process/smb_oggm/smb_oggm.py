@@ -10,6 +10,8 @@ import math
 import tensorflow as tf
 import json
 
+from igm.modules.utils import LazyFloat
+
 
 def params(parser):
     parser.add_argument(
@@ -34,7 +36,7 @@ def params(parser):
 
 def initialize(params, state):
     state.tcomp_smb_oggm = []
-    state.tlast_mb = tf.Variable(-1.0e5000)
+    state.tlast_mb = -1.0e5000
 
     # load the given parameters from the json file
     with open(os.path.join(params.oggm_RGI_ID, "mb_calib.json"), "r") as json_file:
@@ -60,7 +62,7 @@ def update(params, state):
     if (state.t - state.tlast_mb) >= params.smb_oggm_update_freq:
         if hasattr(state, "logger"):
             state.logger.info(
-                "Construct mass balance at time : " + str(state.t.numpy())
+                "Construct mass balance at time : %s", LazyFloat(state.t)
             )
 
         state.tcomp_smb_oggm.append(time.time())
@@ -103,7 +105,7 @@ def update(params, state):
                 (state.smb < 0) | (state.icemask > 0.5), state.smb, -10
             )
 
-        state.tlast_mb.assign(state.t)
+        state.tlast_mb = float(state.t)
 
         state.tcomp_smb_oggm[-1] -= time.time()
         state.tcomp_smb_oggm[-1] *= -1
@@ -2,5 +2,7 @@ from .smb_simple import (
     params,
     initialize,
     finalize,
-    update
+    update,
+    fused_fields,
+    fused_step
 )
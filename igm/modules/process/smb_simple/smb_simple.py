@@ -7,7 +7,7 @@ import numpy as np
 import os, sys, shutil
 import time
 import tensorflow as tf
-from igm.modules.utils import interp1d_tf
+from igm.modules.utils import interp1d_tf, ensemble_param, LazyFloat
 
 
 def params(parser):
@@ -29,6 +29,12 @@ def params(parser):
         default=[],
         help="Time dependent parameters for simple mass balance model (time, gradabl, gradacc, ela, accmax)",
     )
+    parser.add_argument(
+        "--smb_simple_ela_shift",
+        type=float,
+        default=0.0,
+        help="Shift added to the ELA (m), e.g. to vary the mass balance among the members of an ensemble (0)",
+    )
 
 
 def initialize(params, state):
@@ -42,7 +48,7 @@ def initialize(params, state):
         state.smbpar = np.array(params.smb_simple_array[1:]).astype(np.float32)
 
     state.tcomp_smb_simple = []
-    state.tlast_mb = tf.Variable(-1.0e5000)
+    state.tlast_mb = -1.0e5000
 
 
 def update(params, state):
@@ -50,29 +56,14 @@ def update(params, state):
     if (state.t - state.tlast_mb) >= params.smb_simple_update_freq:
         if hasattr(state, "logger"):
             state.logger.info(
-                "Construct mass balance at time : " + str(state.t.numpy())
+                "Construct mass balance at time : %s", LazyFloat(state.t)
             )
 
         state.tcomp_smb_simple.append(time.time())
 
-        # get the smb parameters at given time t
-        gradabl = interp1d_tf(state.smbpar[:, 0], state.smbpar[:, 1], state.t)
-        gradacc = interp1d_tf(state.smbpar[:, 0], state.smbpar[:, 2], state.t)
-        ela = interp1d_tf(state.smbpar[:, 0], state.smbpar[:, 3], state.t)
-        maxacc = interp1d_tf(state.smbpar[:, 0], state.smbpar[:, 4], state.t)
-
-        # compute smb from glacier surface elevation and parameters
-        state.smb = state.usurf - ela
-        state.smb *= tf.where(tf.less(state.smb, 0), gradabl, gradacc)
-        state.smb = tf.clip_by_value(state.smb, -100, maxacc)
-
-        # if an icemask exists, then force negative smb aside to prevent leaks
-        if hasattr(state, "icemask"):
-            state.smb = tf.where(
-                (state.smb < 0) | (state.icemask > 0.5), state.smb, -10
-            )
+        state.smb = compute_smb_simple(params, state, state.t, state.usurf)
 
-        state.tlast_mb.assign(state.t)
+        state.tlast_mb = float(state.t)
 
         state.tcomp_smb_simple[-1] -= time.time()
         state.tcomp_smb_simple[-1] *= -1
@@ -80,3 +71,38 @@ def update(params, state):
 
 def finalize(params, state):
     pass
+
+
+def fused_fields(params, state):
+    return ["smb", "tlast_mb", "t", "usurf"]
+
+
+def fused_step(params, state, fields):
+    update_smb = (fields["t"] - fields["tlast_mb"]) >= params.smb_simple_update_freq
+
+    smb = compute_smb_simple(params, state, fields["t"], fields["usurf"])
+
+    fields["smb"] = tf.where(update_smb, smb, fields["smb"])
+    fields["tlast_mb"] = tf.where(update_smb, fields["t"], fields["tlast_mb"])
+
+    return fields
+
+
+def compute_smb_simple(params, state, t, usurf):
+    # get the smb parameters at given time t
+    gradabl = interp1d_tf(state.smbpar[:, 0], state.smbpar[:, 1], t)
+    gradacc = interp1d_tf(state.smbpar[:, 0], state.smbpar[:, 2], t)
+    ela = interp1d_tf(state.smbpar[:, 0], state.smbpar[:, 3], t) \
+        + ensemble_param(params, "smb_simple_ela_shift")
+    maxacc = interp1d_tf(state.smbpar[:, 0], state.smbpar[:, 4], t)
+
+    # compute smb from glacier surface elevation and parameters
+    smb = usurf - ela
+    smb *= tf.where(tf.less(smb, 0), gradabl, gradacc)
+    smb = tf.clip_by_value(smb, -100, maxacc)
+
+    # if an icemask exists, then force negative smb aside to prevent leaks
+    if hasattr(state, "icemask"):
+        smb = tf.where((smb < 0) | (state.icemask > 0.5), smb, -10)
+
+    return smb
@@ -2,5 +2,7 @@ from .thk import (
     params,
     initialize,
     finalize,
-    update
+    update,
+    fused_fields,
+    fused_step
 )
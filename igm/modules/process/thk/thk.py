@@ -6,7 +6,7 @@
 import datetime, time
 import tensorflow as tf
 
-from igm.modules.utils import compute_divflux_slope_limiter
+from igm.modules.utils import compute_divflux_slope_limiter, LazyFloat
 
 def params(parser):
     parser.add_argument(
@@ -45,7 +45,7 @@ def update(params, state):
     if state.it >= 0:
         if hasattr(state, "logger"):
             state.logger.info(
-                "Ice thickness equation at time : " + str(state.t.numpy())
+                "Ice thickness equation at time : %s", LazyFloat(state.t)
             )
 
         state.tcomp_thk.append(time.time())
@@ -75,5 +75,26 @@ def update(params, state):
         state.tcomp_thk[-1] *= -1
 
 
+def fused_fields(params, state):
+    return ["thk", "lsurf", "usurf", "divflux", "smb", "ubar", "vbar", "dt"]
+
+
+def fused_step(params, state, fields):
+    fields["divflux"] = compute_divflux_slope_limiter(
+        fields["ubar"], fields["vbar"], fields["thk"], state.dx, state.dx, fields["dt"], slope_type=params.thk_slope_type
+    )
+
+    fields["thk"] = tf.maximum(fields["thk"] + fields["dt"] * (fields["smb"] - fields["divflux"]), 0)
+
+    if hasattr(state, "sealevel"):
+        fields["lsurf"] = tf.maximum(state.topg,-params.thk_ratio_density*fields["thk"] + state.sealevel)
+    else:
+        fields["lsurf"] = tf.maximum(state.topg,-params.thk_ratio_density*fields["thk"] + params.thk_default_sealevel)
+
+    fields["usurf"] = fields["lsurf"] + fields["thk"]
+
+    return fields
+
+
 def finalize(params, state):
     pass
@@ -8,6 +8,8 @@ import matplotlib.pyplot as plt
 import datetime, time
 import tensorflow as tf
 
+from igm.modules.utils import LazyFloat
+
 
 def params(parser):
     parser.add_argument(
@@ -42,22 +44,27 @@ def params(parser):
 def initialize(params, state):
     state.tcomp_time = []
 
-    # Initialize the time with starting time
-    state.t = tf.Variable(float(params.time_start))
-
     # the first loop is not advancing
     state.it = -1
     state.itsave = -1
 
-    state.dt = tf.Variable(float(params.time_step_max))
-
-    state.dt_target = tf.Variable(float(params.time_step_max))
-
     state.time_save = np.ndarray.tolist(
         np.arange(params.time_start, params.time_end, params.time_save)
     ) + [params.time_end]
 
-    state.time_save = tf.constant(state.time_save, dtype="float32")
+    if params.sync_free:
+        # the clock is kept on the host, such that comparing times (e.g. in
+        # the schedules of the modules) does not synchronise with the device
+        state.t = float(params.time_start)
+        state.dt = float(params.time_step_max)
+        state.dt_target = float(params.time_step_max)
+        state.time_save = np.array(state.time_save, dtype="float32").tolist()
+    else:
+        # Initialize the time with starting time
+        state.t = tf.Variable(float(params.time_start))
+        state.dt = tf.Variable(float(params.time_step_max))
+        state.dt_target = tf.Variable(float(params.time_step_max))
+        state.time_save = tf.constant(state.time_save, dtype="float32")
 
     state.saveresult = True
 
@@ -65,23 +72,27 @@ def initialize(params, state):
 def update(params, state):
     if hasattr(state, "logger"):
         state.logger.info(
-            "Update DT from the CFL condition at time : " + str(state.t.numpy())
+            "Update DT from the CFL condition at time : %s", LazyFloat(state.t)
         )
 
     state.tcomp_time.append(time.time())
 
-    # compute maximum ice velocitiy magnitude 
-    velomax = tf.maximum(
-        tf.reduce_max(tf.abs(state.ubar)),
-        tf.reduce_max(tf.abs(state.vbar)),
-    )
-    # dt_target account for both cfl and dt_max
-    if (velomax > 0) & (params.time_cfl>0):
-        state.dt_target =  tf.minimum(
-            params.time_cfl * state.dx / velomax, params.time_step_max
-        )
+    if params.sync_free:
+        # the time step is the only value copied from the device per iteration
+        state.dt_target = float(compute_dt_target(params, state, state.ubar, state.vbar))
     else:
-        state.dt_target = params.time_step_max
+        # compute maximum ice velocitiy magnitude 
+        velomax = tf.maximum(
+            tf.reduce_max(tf.abs(state.ubar)),
+            tf.reduce_max(tf.abs(state.vbar)),
+        )
+        # dt_target account for both cfl and dt_max
+        if (velomax > 0) & (params.time_cfl>0):
+            state.dt_target =  tf.minimum(
+                params.time_cfl * state.dx / velomax, params.time_step_max
+            )
+        else:
+            state.dt_target = params.time_step_max
 
     state.dt = state.dt_target
 
@@ -95,7 +106,10 @@ def update(params, state):
 
     # the first loop is not advancing
     if state.it >= 0:
-        state.t.assign(state.t + state.dt)
+        if params.sync_free:
+            state.t = float(state.t + state.dt)
+        else:
+            state.t.assign(state.t + state.dt)
 
     state.it += 1
 
@@ -103,5 +117,45 @@ def update(params, state):
     state.tcomp_time[-1] *= -1
 
 
+def fused_fields(params, state):
+    return ["t", "dt", "dt_target", "it", "itsave", "saveresult", "ubar", "vbar"]
+
+
+def fused_step(params, state, fields):
+    # same as update, written with tensor operations only (fused steps are
+    # only used after the first, non-advancing, iteration)
+    dt_target = compute_dt_target(params, state, fields["ubar"], fields["vbar"])
+
+    # modify dt such that times of requested savings are reached exactly
+    time_save_next = tf.gather(state.time_save, fields["itsave"] + 1)
+    saveresult = time_save_next <= fields["t"] + dt_target
+    dt = tf.where(saveresult, time_save_next - fields["t"], dt_target)
+
+    fields["dt_target"] = dt_target
+    fields["dt"] = dt
+    fields["saveresult"] = saveresult
+    fields["itsave"] = fields["itsave"] + tf.cast(saveresult, fields["itsave"].dtype)
+    fields["t"] = fields["t"] + dt
+    fields["it"] = fields["it"] + 1
+
+    return fields
+
+
+def compute_dt_target(params, state, ubar, vbar):
+    # time step from the CFL condition, with tensor operations only
+    velomax = tf.maximum(
+        tf.reduce_max(tf.abs(ubar)),
+        tf.reduce_max(tf.abs(vbar)),
+    )
+    if params.time_cfl > 0:
+        return tf.where(
+            velomax > 0,
+            tf.minimum(params.time_cfl * state.dx / velomax, params.time_step_max),
+            params.time_step_max,
+        )
+    else:
+        return tf.constant(params.time_step_max)
+
+
 def finalize(params, state):
     pass
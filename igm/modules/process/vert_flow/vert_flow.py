@@ -44,6 +44,24 @@ def update(params, state):
 def finalize(params, state):
     pass
 
+def fused_fields(params, state):
+    # only the kinematic method can be compiled within a fused step
+    if not params.vflo_method == "kinematic":
+        return None
+    return ["U", "V", "topg", "thk", "W", "wvelbase", "wvelsurf"]
+
+def fused_step(params, state, fields):
+    dz = vertical_disc_tf(fields["thk"], params.iflo_Nz, params.iflo_vert_spacing)
+
+    fields["W"] = compute_w_kinematic_tf(
+        fields["U"], fields["V"], fields["topg"], fields["thk"], dz, state.dx, state.vert_weight
+    )
+
+    fields["wvelbase"] = fields["W"][0]
+    fields["wvelsurf"] = fields["W"][-1]
+
+    return fields
+
 def _compute_vertical_velocity_kinematic(params, state):
 
     dz = vertical_disc_tf(state.thk, params.iflo_Nz, params.iflo_vert_spacing)
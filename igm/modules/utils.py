@@ -9,6 +9,8 @@ This util files provides a large number of usefull function for other modules
 
 import tensorflow as tf
 
+from igm.common import str2bool  # defined in the core such that parsing does not need tensorflow
+
 # constrains wildcard imports - not necessary but for security reasons - update if a utility is added...
 __all__ = [
     "str2bool",
@@ -18,11 +20,23 @@ __all__ = [
     "compute_divflux",
     "interp1d_tf",
     "complete_data",
-    "interpolate_bilinear_tf"
+    "interpolate_bilinear_tf",
+    "ensemble_param",
+    "initialize_ensemble",
+    "LazyFloat",
 ]
 
-def str2bool(v):
-    return v.lower() in ("true", "1")
+class LazyFloat:
+    """
+    Scalar tensor (e.g. state.t) formatted as a float only when printed, such
+    that log messages that are not emitted cost no device to host transfer
+    """
+
+    def __init__(self, x):
+        self.x = x
+
+    def __str__(self):
+        return str(float(self.x))
 
 
 @tf.function()
@@ -31,8 +45,8 @@ def getmag(u, v):
     return the norm of a 2D vector, e.g. to compute velbase_mag
     """
     return tf.norm(
-        tf.concat([tf.expand_dims(u, axis=-1), tf.expand_dims(v, axis=-1)], axis=2),
-        axis=2,
+        tf.concat([tf.expand_dims(u, axis=-1), tf.expand_dims(v, axis=-1)], axis=-1),
+        axis=-1,
     )
 
 
@@ -160,6 +174,8 @@ def compute_divflux_slope_limiter(u, v, h, dx, dy, dt, slope_type):
     """
     upwind computation of the divergence of the flux : d(u h)/dx + d(v h)/dy
     propose a slope limiter for the upwind scheme with 3 options : godunov, minmod, superbee
+    the fields may carry leading (e.g. ensemble member) axes, the computation
+    is done along the two last axes
     
     References :
     - Numerical Methods for Engineers, Leif Rune Hellevik, book
@@ -169,18 +185,20 @@ def compute_divflux_slope_limiter(u, v, h, dx, dy, dt, slope_type):
      collection of simple python codes that demonstrate some basic techniques used in hydrodynamics codes.
      https://github.com/python-hydro/hydro_examples
     """
+
+    lead = [[0, 0]] * (len(h.shape) - 2)
     
-    u = tf.concat( [u[:, 0:1], 0.5 * (u[:, :-1] + u[:, 1:]), u[:, -1:]], 1 )  # has shape (ny,nx+1)
-    v = tf.concat( [v[0:1, :], 0.5 * (v[:-1, :] + v[1:, :]), v[-1:, :]], 0 )  # has shape (ny+1,nx)
+    u = tf.concat( [u[..., 0:1], 0.5 * (u[..., :-1] + u[..., 1:]), u[..., -1:]], -1 )  # has shape (ny,nx+1)
+    v = tf.concat( [v[..., 0:1, :], 0.5 * (v[..., :-1, :] + v[..., 1:, :]), v[..., -1:, :]], -2 )  # has shape (ny+1,nx)
 
-    Hx = tf.pad(h, [[0,0],[2,2]], 'CONSTANT') # (ny,nx+4)
-    Hy = tf.pad(h, [[2,2],[0,0]], 'CONSTANT') # (ny+4,nx)
+    Hx = tf.pad(h, lead + [[0,0],[2,2]], 'CONSTANT') # (ny,nx+4)
+    Hy = tf.pad(h, lead + [[2,2],[0,0]], 'CONSTANT') # (ny+4,nx)
     
-    sigpx = (Hx[:,2:]-Hx[:,1:-1])/dx    # (ny,nx+2)
-    sigmx = (Hx[:,1:-1]-Hx[:,:-2])/dx   # (ny,nx+2) 
+    sigpx = (Hx[...,2:]-Hx[...,1:-1])/dx    # (ny,nx+2)
+    sigmx = (Hx[...,1:-1]-Hx[...,:-2])/dx   # (ny,nx+2) 
 
-    sigpy = (Hy[2:,:] -Hy[1:-1,:])/dy   # (ny+2,nx)
-    sigmy = (Hy[1:-1,:]-Hy[:-2,:])/dy   # (ny+2,nx) 
+    sigpy = (Hy[...,2:,:] -Hy[...,1:-1,:])/dy   # (ny+2,nx)
+    sigmy = (Hy[...,1:-1,:]-Hy[...,:-2,:])/dy   # (ny+2,nx) 
 
     if slope_type == "godunov":
  
@@ -202,16 +220,16 @@ def compute_divflux_slope_limiter(u, v, h, dx, dy, dt, slope_type):
         sig2y  = minmod( sigmy , 2.0*sigpy )
         slopey = maxmod( sig1y, sig2y)
 
-    w   = Hx[:,1:-2] + 0.5*dx*(1.0 - u*dt/dx)*slopex[:,:-1]      #  (ny,nx+1)      
-    e   = Hx[:,2:-1] - 0.5*dx*(1.0 + u*dt/dx)*slopex[:,1:]       #  (ny,nx+1)    
+    w   = Hx[...,1:-2] + 0.5*dx*(1.0 - u*dt/dx)*slopex[...,:-1]      #  (ny,nx+1)      
+    e   = Hx[...,2:-1] - 0.5*dx*(1.0 + u*dt/dx)*slopex[...,1:]       #  (ny,nx+1)    
     
-    s   = Hy[1:-2,:] + 0.5*dy*(1.0 - v*dt/dy)*slopey[:-1,:]      #  (ny+1,nx)      
-    n   = Hy[2:-1,:] - 0.5*dy*(1.0 + v*dt/dy)*slopey[1:,:]       #  (ny+1,nx)    
+    s   = Hy[...,1:-2,:] + 0.5*dy*(1.0 - v*dt/dy)*slopey[...,:-1,:]      #  (ny+1,nx)      
+    n   = Hy[...,2:-1,:] - 0.5*dy*(1.0 + v*dt/dy)*slopey[...,1:,:]       #  (ny+1,nx)    
      
     Qx = u * tf.where(u > 0, w, e)  #  (ny,nx+1)   
     Qy = v * tf.where(v > 0, s, n)  #  (ny+1,nx)   
      
-    return (Qx[:, 1:] - Qx[:, :-1]) / dx + (Qy[1:, :] - Qy[:-1, :]) / dy  
+    return (Qx[..., 1:] - Qx[..., :-1]) / dx + (Qy[..., 1:, :] - Qy[..., :-1, :]) / dy  
 
 @tf.function()
 def interp1d_tf(xs, ys, x):
@@ -253,6 +271,33 @@ def interp1d_tf(xs, ys, x):
     return tf.cast(tf.reshape(y, tf.shape(x)), dtype)
 
 
+def ensemble_param(params, name):
+    """
+    return the parameter name, or its values for each member of the ensemble
+    with shape (ensemble_size,1,1) if it is varied in params.ensemble_params
+    """
+    if name in params.ensemble_params:
+        values = params.ensemble_params[name]
+        assert len(values) == params.ensemble_size
+        return tf.reshape(tf.constant(values, dtype="float32"), (-1, 1, 1))
+    else:
+        return getattr(params, name)
+
+
+def initialize_ensemble(params, state):
+    """
+    This function adds a leading member axis to the fields that evolve
+    independently for each member of the ensemble (others, e.g. topg and dX,
+    are shared by all members and broadcasted)
+    """
+    for f in ["thk", "usurf"]:
+        if hasattr(state, f) and len(vars(state)[f].shape) == 2:
+            vars(state)[f] = tf.Variable(
+                tf.tile(tf.expand_dims(vars(state)[f], axis=0), [params.ensemble_size, 1, 1]),
+                trainable=False,
+            )
+
+
 def complete_data(state):
     """
     This function adds a postriori import fields such as X, Y, x, dx, ....
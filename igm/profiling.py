@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+
+"""
+Copyright (C) 2021-2023 Guillaume Jouvet <guillaume.jouvet@unil.ch>
+Published under the GNU GPL (Version 3), check at the LICENSE file
+"""
+
+import sys
+import json
+import time
+from typing import Any, List
+
+import tensorflow as tf
+
+
+class Profiler:
+    """
+    Times every call of initialize, update and finalize of the modules (activated
+    with --profile). The devices are synchronised before and after each call such
+    that the timings include the asynchronous computations launched by the
+    module, and the peak memory is sampled after each call (of the GPU if any,
+    else of the process). The calls are exported as a Chrome trace (to open with
+    chrome://tracing or https://ui.perfetto.dev), and a tf.profiler trace can be
+    recorded over a window of iterations (--profile_tf_trace). With
+    --profile_transfers, the device to host copies of tensors (e.g. .numpy(),
+    float() or an "if" on a tensor) are counted for each call.
+    """
+
+    def __init__(self, params: Any):
+        self.params = params
+        self.events = []
+        self.durations = {}
+        self.peak_memory = {}
+        self.transfers = {}
+        self.iteration = 0
+        self.tracing = False
+        self.nb_transfers = 0
+        self._numpy = None
+        if params.profile_transfers:
+            self.count_transfers()
+        self.start = time.perf_counter()
+
+        gpus = tf.config.list_logical_devices("GPU")
+        self.device = gpus[0].name.replace("/device:", "") if len(gpus) > 0 else None
+
+    def count_transfers(self) -> None:
+        """Wrap the copy of eager tensors to numpy, which all conversions go through."""
+        from tensorflow.python.framework import ops
+
+        self._numpy = ops.EagerTensor._numpy
+        profiler = self
+
+        def _numpy(tensor):
+            profiler.nb_transfers += 1
+            return profiler._numpy(tensor)
+
+        ops.EagerTensor._numpy = _numpy
+
+    def stop_counting_transfers(self) -> None:
+        if self._numpy is not None:
+            from tensorflow.python.framework import ops
+
+            ops.EagerTensor._numpy = self._numpy
+            self._numpy = None
+
+    def sync(self) -> None:
+        tf.test.experimental.sync_devices()
+
+    def memory(self) -> float:
+        """Peak memory in Mb since the last reset (GPU) or since the start (CPU)."""
+        if self.device is not None:
+            return tf.config.experimental.get_memory_info(self.device)["peak"] / 2**20
+        try:
+            import resource
+        except ImportError:
+            return 0.0
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss / 2**20 if sys.platform == "darwin" else maxrss / 2**10
+
+    def call(self, name: str, phase: str, function, params: Any, state: Any) -> None:
+        self.sync()
+        if self.device is not None:
+            tf.config.experimental.reset_memory_stats(self.device)
+
+        nb_transfers = self.nb_transfers
+        start = time.perf_counter()
+        if self.tracing:
+            with tf.profiler.experimental.Trace(name, step_num=self.iteration, _r=1):
+                function(params, state)
+        else:
+            function(params, state)
+        self.sync()
+        end = time.perf_counter()
+        nb_transfers = self.nb_transfers - nb_transfers
+
+        memory = self.memory()
+        self.peak_memory[name] = max(self.peak_memory.get(name, 0.0), memory)
+        if phase == "update":
+            self.durations.setdefault(name, []).append(end - start)
+            self.transfers.setdefault(name, []).append(nb_transfers)
+
+        self.events.append(
+            {
+                "name": name,
+                "cat": phase,
+                "ph": "X",
+                "ts": (start - self.start) * 10**6,
+                "dur": (end - start) * 10**6,
+                "pid": 0,
+                "tid": 0,
+                "args": {
+                    "iteration": self.iteration,
+                    "peak_memory_mb": memory,
+                    "transfers": nb_transfers,
+                },
+            }
+        )
+
+    def begin_iteration(self) -> None:
+        self.iteration += 1
+        window = self.params.profile_tf_trace
+        if len(window) == 2:
+            if self.iteration == window[0]:
+                tf.profiler.experimental.start(self.params.profile_tf_logdir)
+                self.tracing = True
+            elif (self.iteration == window[1] + 1) & self.tracing:
+                self.stop_tracing()
+
+    def stop_tracing(self) -> None:
+        tf.profiler.experimental.stop()
+        self.tracing = False
+
+    def wrap(self, modules: List) -> List:
+        return [
+            module if isinstance(module, ProfiledModule) else ProfiledModule(module, self)
+            for module in modules
+        ]
+
+    def summary(self) -> dict:
+        return {
+            name: {
+                "number_it": len(durations),
+                "total": sum(durations),
+                "mean": sum(durations) / len(durations),
+                "peak_memory_mb": self.peak_memory[name],
+                "transfers_per_it": sum(self.transfers[name]) / len(durations),
+            }
+            for name, durations in self.durations.items()
+        }
+
+    def write(self) -> None:
+        if self.tracing:
+            self.stop_tracing()
+        self.stop_counting_transfers()
+        with open(self.params.profile_file, "w") as f:
+            json.dump(
+                {
+                    "traceEvents": self.events,
+                    "displayTimeUnit": "ms",
+                    "otherData": self.summary(),
+                },
+                f,
+            )
+
+        if self.params.profile_transfers:
+            print("Device to host transfers per iteration:")
+            for name, summary in self.summary().items():
+                print("     %24s  |  %8.2f" % (name, summary["transfers_per_it"]))
+
+
+class ProfiledModule:
+    """Module (or fused step) whose calls are timed by the profiler."""
+
+    def __init__(self, module: Any, profiler: Profiler):
+        self.module = module
+        self.profiler = profiler
+        self.name = module.__name__.split(".")[-1]
+
+    def initialize(self, params: Any, state: Any) -> None:
+        self.profiler.call(self.name, "initialize", self.module.initialize, params, state)
+
+    def update(self, params: Any, state: Any) -> None:
+        self.profiler.call(self.name, "update", self.module.update, params, state)
+
+    def finalize(self, params: Any, state: Any) -> None:
+        self.profiler.call(self.name, "finalize", self.module.finalize, params, state)
+
+    def __getattr__(self, name: str) -> Any:
+        if (name in ["module", "profiler", "name"]) or (
+            name.startswith("__") and not name == "__name__"
+        ):
+            raise AttributeError(name)
+        return getattr(self.module, name)
@@ -3,6 +3,7 @@
 # Published under the GNU GPL (Version 3)
 
 from setuptools import setup, find_packages
+from setuptools.command.build_py import build_py
 import os
 
 
@@ -14,6 +15,17 @@ def package_files(directory):
     return paths
 
 
+class build_py_manifest(build_py):
+    """Writes the manifest of the parameters of the modules (igm/manifest.py) in the built package."""
+
+    def run(self):
+        super().run()
+        # the params functions are read from the sources, tensorflow is not needed
+        from igm.manifest import write_manifest
+
+        write_manifest(os.path.join(self.build_lib, "igm", "modules", "manifest.json"))
+
+
 with open("README.md", "r") as f:
     readme = f.read()
 
@@ -25,8 +37,9 @@ setup(
     url="https://github.com/jouvetg/igm",
     license="gpl-3.0",
     packages=find_packages(),
-    entry_points={"console_scripts": ["igm_run = igm.igm_run:main","igm_help = igm.igm_help:main"]},
+    entry_points={"console_scripts": ["igm_run = igm.igm_run:main","igm_help = igm.igm_help:main","igm_run_batch = igm.igm_run_batch:main","igm_server = igm.igm_server:main","igm_submit = igm.igm_server:main_submit"]},
     package_data={"igm": package_files("igm/emulators")},
+    cmdclass={"build_py": build_py_manifest},
     description="IGM - a glacier evolution model",
     long_description=readme,
     long_description_content_type="text/markdown",
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# the set-up shared by the tests (synthetic_setup.py, make_synthetic.py)
+TESTS = os.path.dirname(os.path.abspath(__file__))
+for path in [TESTS, os.path.join(TESTS, "test_full_glacier_evolution_synthetic")]:
+    if path not in sys.path:
+        sys.path.append(path)
@@ -0,0 +1,79 @@
+import os
+import igm
+import make_synthetic
+import tensorflow as tf
+import numpy as np
+
+PARAM_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "params_synthetic.json")
+
+
+def iceflow_setup(glacier=(4000, 9000), **overrides):
+    """
+    Parameters and state of the synthetic set-up (make_synthetic) with the
+    iceflow module, the default parameters being replaced by overrides. If
+    glacier is given, the ice is an elliptic glacier in the middle of the
+    domain with these half-axes (m, along x and y), set before the iceflow
+    module is initialized
+    """
+    parser = igm.params_core()
+    modules = igm.load_modules(
+        {"modules_preproc": [], "modules_process": ["iceflow"], "modules_postproc": []}
+    )
+    for module in [make_synthetic] + modules:
+        module.params(parser)
+    params, __ = parser.parse_known_args(args=[])
+
+    for key, value in overrides.items():
+        setattr(params, key, value)
+
+    state = igm.State()
+    state.it = 0
+    with tf.device(f"/GPU:{params.gpu_id}"):
+        make_synthetic.initialize(params, state)
+
+        if glacier is not None:
+            X, Y = np.meshgrid(state.x, state.y)
+            thk = 300 * np.sqrt(
+                np.maximum(
+                    1 - ((X - 5000) / glacier[0]) ** 2 - ((Y - 10000) / glacier[1]) ** 2, 0
+                )
+            )
+            state.thk = tf.Variable(thk.astype("float32"))
+            state.usurf = state.topg + state.thk
+
+        igm.run_intializers(modules, params, state)
+
+    return params, state
+
+
+def run_synthetic(**overrides):
+    """
+    Run of the synthetic set-up of params_synthetic.json (make_synthetic, with
+    smb_simple, iceflow, time and thk from 2000 to 2030), the parameters,
+    including the lists of modules, being replaced by overrides
+    """
+    modules_dict = igm.get_modules_list(PARAM_FILE)
+    for key in modules_dict:
+        modules_dict[key] = overrides.get(key, modules_dict[key])
+
+    modules = igm.load_modules(modules_dict)
+
+    parser = igm.params_core()
+    for module in modules:
+        module.params(parser)
+    params, _ = parser.parse_known_args(args=[])
+    params = igm.load_user_defined_params(param_file=PARAM_FILE, params_dict=vars(params))
+    parser.set_defaults(**params)
+
+    params, __ = parser.parse_known_args(args=[])
+
+    for key, value in overrides.items():
+        setattr(params, key, value)
+
+    state = igm.State()
+    with tf.device(f"/GPU:{params.gpu_id}"):
+        igm.run_intializers(modules, params, state)
+        igm.run_processes(modules, params, state)
+        igm.run_finalizers(modules, params, state)
+
+    return params, state
@@ -0,0 +1,74 @@
+import igm
+from synthetic_setup import iceflow_setup
+import tensorflow as tf
+import numpy as np
+import pytest
+
+from igm.modules.process.iceflow.emulate import update_iceflow_emulated
+
+
+def setup(crop, multiple_window_size=0, unet=False):
+    # a small glacier in the middle of the domain
+    params, state = iceflow_setup(
+        (2000, 3000),
+        iflo_crop_active=crop,
+        iflo_retrain_emulator_freq=0,
+        iflo_multiple_window_size=multiple_window_size,
+    )
+
+    if unet:
+        state.iceflow_model = tiny_unet(params, multiple_window_size)
+
+    with tf.device(f"/GPU:{params.gpu_id}"):
+        update_iceflow_emulated(params, state)
+
+    return params, state
+
+
+def tiny_unet(params, multiple_window_size):
+    """Encoder-decoder whose skip connection needs sizes multiple of the window."""
+    inputs = tf.keras.layers.Input(shape=[None, None, len(params.iflo_fieldin)])
+    x = tf.keras.layers.Conv2D(8, 3, padding="same")(inputs)
+    y = tf.keras.layers.MaxPool2D(multiple_window_size)(x)
+    y = tf.keras.layers.UpSampling2D(multiple_window_size)(y)
+    x = tf.keras.layers.Concatenate()([x, y])
+    outputs = tf.keras.layers.Conv2D(2 * params.iflo_Nz, 1)(x)
+    return tf.keras.models.Model(inputs=inputs, outputs=outputs)
+
+
+def test_active_crop():
+    params_full, state_full = setup(False)
+    params, state = setup(True)
+
+    # the window is the bounding box of the ice extended by the halo
+    rows, cols = np.where(state.thk.numpy() > 0)
+    h = params.iflo_crop_halo
+    assert state.active_window == (
+        rows.min() - h, rows.max() + 1 + h, cols.min() - h, cols.max() + 1 + h
+    )
+    y0, y1, x0, x1 = state.active_window
+
+    ice = state.thk.numpy() > 0
+    scale = np.max(np.abs(state_full.ubar.numpy()[ice]))
+    for f in ["ubar", "vbar", "uvelsurf", "vvelsurf"]:
+        assert vars(state)[f].shape == vars(state_full)[f].shape
+        diff = np.abs(vars(state)[f].numpy() - vars(state_full)[f].numpy())
+        assert np.max(diff[ice]) < 0.05 * scale
+
+    # no velocity outside the window
+    U = state.U.numpy()
+    assert np.all(U[..., :y0, :] == 0) and np.all(U[..., y1:, :] == 0)
+    assert np.all(U[..., :x0] == 0) and np.all(U[..., x1:] == 0)
+
+
+def test_active_crop_unet():
+    params_full, state_full = setup(False, 8, unet=True)
+    params, state = setup(True, 8, unet=True)
+
+    # the window is padded from its own size, not from the one of the domain
+    y0, y1, x0, x1 = state.active_window
+    assert not ((y1 - y0) % 8 == 0 and (x1 - x0) % 8 == 0)
+
+    for f in ["ubar", "vbar", "uvelsurf", "vvelsurf"]:
+        assert vars(state)[f].shape == vars(state_full)[f].shape
+        assert np.all(np.isfinite(vars(state)[f].numpy()))
@@ -0,0 +1,16 @@
+import igm
+from synthetic_setup import run_synthetic
+import numpy as np
+import pytest
+
+
+def test_adaptive_retraining():
+    params, state = run_synthetic(iflo_retrain_emulator_adaptive=False)
+    params, state_adaptive = run_synthetic(iflo_retrain_emulator_adaptive=True)
+
+    # the emulator is retrained on some of the time steps only
+    assert 0 < state_adaptive.emulator_nb_retraining < state_adaptive.it
+
+    volume = np.sum(state.thk.numpy())
+    volume_adaptive = np.sum(state_adaptive.thk.numpy())
+    assert abs(volume_adaptive - volume) < 0.02 * volume
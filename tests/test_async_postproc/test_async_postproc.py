@@ -0,0 +1,39 @@
+import igm
+import os
+from synthetic_setup import run_synthetic
+import numpy as np
+import pytest
+from netCDF4 import Dataset
+
+
+def run_async_postproc(async_postproc, folder, monkeypatch):
+    os.makedirs(folder)
+    monkeypatch.chdir(folder)
+
+    params, state = run_synthetic(
+        modules_postproc=["write_ncdf", "write_ts", "print_info"],
+        time_end=2010.0,
+        time_save=2.0,
+        async_postproc=async_postproc,
+        async_postproc_queue=1,
+        iflo_retrain_emulator_freq=0,
+    )
+    return state
+
+
+def test_async_postproc(tmp_path, monkeypatch):
+    state_sync = run_async_postproc(False, tmp_path / "sync", monkeypatch)
+    state_async = run_async_postproc(True, tmp_path / "async", monkeypatch)
+
+    # the attributes added by the modules are copied back to the state
+    assert state_async.already_called_update_write_ncdf
+    assert len(state_async.async_postproc.modules) == 3
+
+    for file in ["output.nc", "output_ts.nc"]:
+        with Dataset(tmp_path / "sync" / file) as nc_sync:
+            with Dataset(tmp_path / "async" / file) as nc_async:
+                assert nc_async.variables["time"].shape[0] == 6
+                for var in nc_sync.variables:
+                    assert np.allclose(
+                        nc_sync.variables[var][:], nc_async.variables[var][:]
+                    )
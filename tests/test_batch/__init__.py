@@ -0,0 +1,2 @@
+import sys
+sys.path.append('./test_batch/')
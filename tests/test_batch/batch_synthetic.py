@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+
+# Copyright (C) 2021-2023 Guillaume Jouvet <guillaume.jouvet@unil.ch>
+# Published under the GNU GPL (Version 3), check at the LICENSE file
+
+import os
+import make_synthetic
+
+
+def params(parser):
+    pass
+
+
+def initialize(params, state):
+    # mimic a glacier for which no data can be found
+    if params.oggm_RGI_ID == "RGI60-00.00000":
+        raise ValueError("No data for glacier " + params.oggm_RGI_ID)
+
+    # mimic a glacier killing its worker process (e.g. out of memory)
+    if params.oggm_RGI_ID == "RGI60-99.99999":
+        os._exit(1)
+
+    make_synthetic.initialize(params, state)
+
+
+def update(params, state):
+    pass
+
+
+def finalize(params, state):
+    pass
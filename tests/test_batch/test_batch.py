@@ -0,0 +1,46 @@
+import igm
+import os
+import pytest
+
+from igm.igm_run_batch import params_batch, run_batch
+
+
+def test_batch(tmp_path):
+    param_file = "./test_batch/params.json"
+
+    parser = igm.params_core()
+    params_batch(parser)
+
+    modules_dict = igm.get_modules_list(param_file)
+
+    modules = igm.load_modules(modules_dict)
+
+    for module in modules:
+        module.params(parser)
+    params, _ = parser.parse_known_args()
+    params = igm.load_user_defined_params(param_file=param_file, params_dict=vars(params))
+    parser.set_defaults(**params)
+
+    params, __ = parser.parse_known_args()
+
+    params.batch_RGI_IDs = [
+        "RGI60-11.00001",
+        "RGI60-00.00000",
+        "RGI60-99.99999",
+        "RGI60-11.00002",
+    ]
+    params.batch_workers = 2
+    params.batch_threads = 1
+    params.batch_folder = str(tmp_path)
+
+    environment = dict(os.environ)
+    results = run_batch(params)
+
+    # the environment of the workers is not kept in this process
+    assert dict(os.environ) == environment
+
+    # the failing glaciers are skipped, the others are run in their own folder
+    assert [result["done"] for result in results] == [True, False, False, True]
+    assert "died" in results[2]["error"]
+    assert os.path.exists(os.path.join(tmp_path, "RGI60-00.00000", "error.txt"))
+    assert os.path.exists(os.path.join(tmp_path, "batch_summary.txt"))
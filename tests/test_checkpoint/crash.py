@@ -0,0 +1,28 @@
+#!/usr/bin/env python3
+
+# Copyright (C) 2021-2023 Guillaume Jouvet <guillaume.jouvet@unil.ch>
+# Published under the GNU GPL (Version 3), check at the LICENSE file
+
+# this module mimics a run killed at a given time (e.g. by a walltime limit)
+
+
+def params(parser):
+    parser.add_argument(
+        "--crash_time",
+        type=float,
+        default=10.0**10,
+        help="Time at which the run crashes",
+    )
+
+
+def initialize(params, state):
+    pass
+
+
+def update(params, state):
+    if state.t >= params.crash_time:
+        raise RuntimeError("Simulation killed at time " + str(float(state.t)))
+
+
+def finalize(params, state):
+    pass
@@ -0,0 +1,90 @@
+import igm
+import synthetic_setup
+import tensorflow as tf
+import numpy as np
+import pytest
+
+
+def run_synthetic(**overrides):
+    # the crash module kills the run at crash_time
+    params, state = synthetic_setup.run_synthetic(
+        modules_process=["smb_simple", "iceflow", "time", "thk", "crash"], **overrides
+    )
+    return state
+
+
+def test_checkpoint(tmp_path):
+    state_ref = run_synthetic()
+
+    # the run is killed after 20 years, having written checkpoints every 7 years
+    with pytest.raises(RuntimeError):
+        run_synthetic(checkpoint_freq=7.0, checkpoint_dir=str(tmp_path), crash_time=2020.0)
+
+    state = run_synthetic(restart_from=str(tmp_path))
+
+    assert state.it == state_ref.it
+    assert state.itsave == state_ref.itsave
+    assert np.array_equal(state.thk.numpy(), state_ref.thk.numpy())
+    assert np.array_equal(state.U.numpy(), state_ref.U.numpy())
+    for w, w_ref in zip(state.iceflow_model.weights, state_ref.iceflow_model.weights):
+        assert np.array_equal(w.numpy(), w_ref.numpy())
+
+
+def test_checkpoint_error(tmp_path):
+    from igm.checkpoint import CheckpointWriter
+
+    def fail(*args):
+        raise OSError("disk full")
+
+    writer = CheckpointWriter(str(tmp_path))
+    writer._write_data = fail
+    trackables = {"thk": tf.Variable(tf.zeros((2, 2)))}
+
+    # the error of the thread is raised by wait, or by the next write
+    writer.write(0, trackables, {})
+    with pytest.raises(OSError):
+        writer.wait()
+
+    writer.write(1, trackables, {})
+    with pytest.raises(OSError):
+        writer.write(2, trackables, {})
+
+
+def test_snapshot_state():
+    from igm.checkpoint import snapshot_state
+
+    state = igm.State()
+    state.thk = tf.Variable(tf.ones((2, 2)))
+    state.tcomp_iceflow = [0.1, 0.2]
+    state.saved = {"it": [1, 2], "arrays": (np.zeros(2), None)}
+    model = tf.keras.Sequential([tf.keras.layers.Dense(1)])
+    state.retraining_step_of = (model, tf.keras.optimizers.Adam())
+    state.emulator_fieldin_ref = [tf.zeros((2, 2))]
+
+    trackables, data = snapshot_state(state)
+
+    # the containers of tensors are kept, those of models are left out
+    assert list(trackables) == ["thk"]
+    assert sorted(data) == ["emulator_fieldin_ref", "saved", "tcomp_iceflow"]
+    assert data["tcomp_iceflow"][1][0] is not state.tcomp_iceflow
+    assert data["emulator_fieldin_ref"][1][1] == [True]
+
+
+def test_checkpoint_skip_inference(tmp_path):
+    # the reference of the skipped inference is restored, small time steps
+    # such that evaluations of the emulator are skipped
+    options = dict(time_end=2010.0, time_step_max=0.1, iflo_emulator_skip_tol=0.02)
+    state_ref = run_synthetic(**options)
+
+    with pytest.raises(RuntimeError):
+        run_synthetic(
+            checkpoint_freq=3.0, checkpoint_dir=str(tmp_path), crash_time=2007.0, **options
+        )
+
+    state = run_synthetic(restart_from=str(tmp_path), **options)
+
+    assert state_ref.emulator_nb_skipped > 0
+    assert state.emulator_nb_skipped == state_ref.emulator_nb_skipped
+    assert state.emulator_nb_evaluated == state_ref.emulator_nb_evaluated
+    assert np.array_equal(state.thk.numpy(), state_ref.thk.numpy())
+    assert np.array_equal(state.U.numpy(), state_ref.U.numpy())
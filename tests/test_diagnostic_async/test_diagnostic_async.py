@@ -0,0 +1,34 @@
+import igm
+import os
+from synthetic_setup import run_synthetic
+import numpy as np
+import pytest
+
+
+def run_diagnostic(diagnostic_async):
+    params, state = run_synthetic(
+        iflo_type="diagnostic",
+        iflo_retrain_emulator_freq=0,
+        iflo_solve_nbitmax=50,
+        iflo_diagnostic_async=diagnostic_async,
+    )
+
+    errors = np.loadtxt("errors.txt", delimiter=",", ndmin=2)
+    os.remove("errors.txt")
+
+    return state, errors
+
+
+def test_diagnostic_async(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    state, errors = run_diagnostic(False)
+    state_async, errors_async = run_diagnostic(True)
+
+    # the solves are done on the same states, unless skipped
+    assert len(errors) > 1
+    assert len(errors_async) + state_async.diagnostic_nb_skipped == len(errors)
+    assert np.all(np.diff(errors_async[:, 0]) > 0)
+    assert np.allclose(errors_async[:2], errors[:2], rtol=1e-3, equal_nan=True)
+
+    assert np.sum(state_async.UT.numpy() ** 2) > 0
@@ -0,0 +1,65 @@
+import igm
+from synthetic_setup import iceflow_setup
+import tensorflow as tf
+import numpy as np
+import os
+
+from igm.modules.process.iceflow.emulate import (
+    load_emulator,
+    read_fieldin,
+    emulator_registry,
+    emulator_config,
+)
+from igm.modules.process.iceflow.emulate import emulate_UV
+from igm.modules.process.iceflow.distill import distillation, teacher_outputs
+
+
+def setup():
+    return iceflow_setup(iflo_retrain_emulator_freq=0)
+
+
+def test_distillation(tmp_path):
+    params, state = setup()
+
+    params.iflo_distill_architectures = ["2_8", "4_8"]
+    params.iflo_distill_nb_samples = 4
+    params.iflo_distill_nbit = 100
+    params.iflo_distill_directory = str(tmp_path)
+
+    # no student reproduces the emulator exactly
+    params.iflo_distill_budget = 0.0
+    distillation(params, state)
+    assert state.distill_selected is None
+    assert len(os.listdir(tmp_path)) == 0
+
+    # the fastest student is saved as a pretrained emulator
+    params.iflo_distill_budget = 10.0
+    distillation(params, state)
+    times = [result["time"] for result in state.distill_results]
+    assert state.distill_selected["time"] == min(times)
+
+    path = state.distill_selected["path"]
+    assert os.path.basename(path) == "pinnbp_10_4_cnn_%s_2_1" % state.distill_selected["architecture"]
+    assert read_fieldin(path) == params.iflo_fieldin
+    assert os.path.exists(os.path.join(path, "cost.dat"))
+
+    model = load_emulator(path)
+    X = tf.random.uniform((1, 16, 16, len(params.iflo_fieldin)))
+    assert np.allclose(model(X).numpy(), state.distill_selected["model"](X).numpy(), atol=1e-5)
+
+    # the student is found as a pretrained emulator, with those of the package
+    registry = emulator_registry(params.iflo_distill_directory)
+    assert str(registry[emulator_config(state.distill_selected["params"])]) == path
+    assert emulator_config(params) in registry
+
+
+def test_teacher_outputs():
+    # the fields are padded for the emulator as in the run
+    params, state = iceflow_setup(iflo_retrain_emulator_freq=0, iflo_exclude_borders=3)
+    fieldin = [vars(state)[f] for f in params.iflo_fieldin]
+
+    Y = teacher_outputs(params, state, fieldin)
+    U, V = emulate_UV(params, state, fieldin)
+
+    assert Y.shape == (1,) + tuple(state.thk.shape) + (2 * params.iflo_Nz,)
+    assert np.allclose(Y[0, :, :, : params.iflo_Nz].numpy(), np.moveaxis(U.numpy(), 0, -1))
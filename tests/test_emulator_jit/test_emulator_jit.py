@@ -0,0 +1,42 @@
+import igm
+from synthetic_setup import iceflow_setup
+import tensorflow as tf
+import numpy as np
+import pytest
+
+from igm.modules.process.iceflow.emulate import (
+    update_iceflow_emulated,
+    emulate_iceflow_compiled,
+    compiled_inference,
+)
+
+
+def setup(jit):
+    params, state = iceflow_setup(iflo_emulator_jit=jit, iflo_retrain_emulator_freq=0)
+    with tf.device(f"/GPU:{params.gpu_id}"):
+        update_iceflow_emulated(params, state)
+
+    return params, state
+
+
+def test_emulator_jit():
+    params_eager, state_eager = setup(False)
+    params, state = setup(True)
+
+    ice = state.thk.numpy() > 0
+    scale = np.max(np.abs(state_eager.ubar.numpy()[ice]))
+    for f in ["ubar", "vbar", "uvelsurf", "vvelsurf"]:
+        assert vars(state)[f].shape == vars(state_eager)[f].shape
+        diff = np.abs(vars(state)[f].numpy() - vars(state_eager)[f].numpy())
+        assert np.max(diff[ice]) < 0.05 * scale
+
+    # domains of close sizes are padded to the same bucket and not retraced
+    fieldin = [vars(state)[f] for f in params.iflo_fieldin]
+    function = compiled_inference(params, state.iceflow_model)
+    tracing_count = function.experimental_get_tracing_count()
+    for Ny, Nx in [(199, 99), (193, 97)]:
+        U, V, fields = emulate_iceflow_compiled(
+            params, state, [f[..., :Ny, :Nx] for f in fieldin]
+        )
+        assert fields["ubar"].shape == (Ny, Nx)
+    assert function.experimental_get_tracing_count() == tracing_count
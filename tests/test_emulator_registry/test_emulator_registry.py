@@ -0,0 +1,43 @@
+import igm
+import make_synthetic
+import tensorflow as tf
+import numpy as np
+import pytest
+
+from igm.modules.process.iceflow.emulate import emulator_registry, emulator_config
+
+
+def initialize(retrain_emulator_freq):
+    parser = igm.params_core()
+    modules = [make_synthetic] + igm.load_modules(
+        {"modules_preproc": [], "modules_process": ["iceflow"], "modules_postproc": []}
+    )
+    for module in modules:
+        module.params(parser)
+    params, __ = parser.parse_known_args(args=[])
+    params.iflo_retrain_emulator_freq = retrain_emulator_freq
+
+    state = igm.State()
+    with tf.device(f"/GPU:{params.gpu_id}"):
+        igm.run_intializers(modules, params, state)
+    return params, state
+
+
+def test_emulator_registry():
+    params, state = initialize(0)
+
+    registry = emulator_registry()
+    assert registry[emulator_config(params)].name == "pinnbp_10_4_cnn_16_32_2_1"
+    # the emulators without model.h5 are not indexed
+    assert all([config[2] == "cnn" for config in registry])
+
+    # the emulator is built once per process if it is not modified
+    params_shared, state_shared = initialize(0)
+    assert state_shared.iceflow_model is state.iceflow_model
+
+    params_retrained, state_retrained = initialize(1)
+    assert state_retrained.iceflow_model is not state.iceflow_model
+    for w, w_retrained in zip(
+        state.iceflow_model.get_weights(), state_retrained.iceflow_model.get_weights()
+    ):
+        assert np.array_equal(w, w_retrained)
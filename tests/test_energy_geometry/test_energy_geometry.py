@@ -0,0 +1,42 @@
+import igm
+from synthetic_setup import iceflow_setup
+import tensorflow as tf
+import numpy as np
+import pytest
+
+from igm.modules.process.iceflow.energy_iceflow import (
+    fieldin_to_X,
+    iceflow_energy_XY,
+    iceflow_geometry_X,
+    iceflow_energy_geometry_Y,
+)
+
+
+def setup():
+    return iceflow_setup(iflo_type="solved", iflo_solve_stop_if_no_decrease=False)
+
+
+@pytest.mark.parametrize("Nz", [10, 1])
+def test_energy_geometry(Nz):
+    params, state = setup()
+    params.iflo_Nz = Nz
+    params.iflo_cf_cond = True
+    state.usurf = 0.1 * state.thk  # floating ice, with a calving front
+
+    fieldin = [vars(state)[f] for f in params.iflo_fieldin]
+    X = fieldin_to_X(params, fieldin)
+    X = tf.concat([X[:, :, :50], X[:, :, 50:]], axis=0)  # two patches
+
+    rng = np.random.default_rng(0)
+    Y = tf.constant(10 * rng.normal(size=X.shape[:3] + (2 * params.iflo_Nz,)), tf.float32)
+
+    # the geometry prepared for all the patches, sliced as for micro-batches
+    geometry = iceflow_geometry_X(params, X)
+    for i in range(2):
+        G = {k: g[i : i + 1] for k, g in geometry.items()}
+        C = iceflow_energy_XY(params, X[i : i + 1], Y[i : i + 1])
+        C_geometry = iceflow_energy_geometry_Y(params, G, Y[i : i + 1])
+        for c, c_geometry in zip(C, C_geometry):
+            assert c.shape == c_geometry.shape
+            assert np.allclose(c.numpy(), c_geometry.numpy())
+        assert np.max(np.abs(C[3].numpy())) > 0
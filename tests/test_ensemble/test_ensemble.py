@@ -0,0 +1,30 @@
+import igm
+from synthetic_setup import run_synthetic
+import numpy as np
+import pytest
+
+
+def run_ensemble(ensemble_size, ensemble_params):
+    params, state = run_synthetic(
+        ensemble_size=ensemble_size,
+        ensemble_params=ensemble_params,
+        iflo_retrain_emulator_freq=0,
+    )
+    return state
+
+
+def test_ensemble():
+    state_single = run_ensemble(1, {})
+    state_ensemble = run_ensemble(
+        2, {"iflo_init_slidingco": [0.0464, 0.1], "smb_simple_ela_shift": [0.0, 200.0]}
+    )
+
+    assert state_ensemble.thk.shape == (2,) + tuple(state_single.thk.shape)
+    assert state_ensemble.U.shape == (2,) + tuple(state_single.U.shape)
+
+    vol_single = np.sum(state_single.thk) * (state_single.dx**2) / 10**9
+    vol_members = np.sum(state_ensemble.thk, axis=(1, 2)) * (state_ensemble.dx**2) / 10**9
+
+    # the first member has the default parameters, the second a higher ELA
+    assert np.isclose(vol_members[0], vol_single, rtol=2e-2)
+    assert vol_members[1] < vol_members[0]
@@ -0,0 +1,44 @@
+import argparse
+import igm
+from synthetic_setup import run_synthetic
+import numpy as np
+import pytest
+
+
+def test_fused_step():
+    params, state_eager = run_synthetic(fused_step=False, iflo_retrain_emulator_freq=0)
+    params, state_fused = run_synthetic(fused_step=True, iflo_retrain_emulator_freq=0)
+
+    assert hasattr(state_fused, "tcomp_fused_smb_simple_iceflow_time_thk")
+
+    assert state_fused.it == state_eager.it
+    assert state_fused.itsave == state_eager.itsave
+
+    # the python scalars are written back with their types
+    assert type(state_fused.it) is int
+    assert type(state_fused.saveresult) is bool
+    assert np.isclose(state_fused.t.numpy(), state_eager.t.numpy())
+
+    vol_eager = np.sum(state_eager.thk) * (state_eager.dx**2) / 10**9
+    vol_fused = np.sum(state_fused.thk) * (state_fused.dx**2) / 10**9
+
+    assert np.isclose(vol_fused, vol_eager, rtol=1e-3)
+
+
+def test_fused_fields():
+    from igm.modules.process.iceflow.iceflow import fused_fields
+
+    parser = igm.params_core()
+    for module in igm.load_modules(
+        {"modules_preproc": [], "modules_process": ["iceflow"], "modules_postproc": []}
+    ):
+        module.params(parser)
+    params, __ = parser.parse_known_args(args=[])
+
+    assert fused_fields(params, None) is not None
+
+    # the ice flow is updated out of the fused step
+    for key, value in [("iflo_emulator_skip_tol", 0.01), ("iflo_crop_active", True)]:
+        params_off = argparse.Namespace(**vars(params))
+        setattr(params_off, key, value)
+        assert fused_fields(params_off, None) is None
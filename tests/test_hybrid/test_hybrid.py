@@ -0,0 +1,50 @@
+import igm
+from synthetic_setup import run_synthetic, iceflow_setup
+import logging
+import numpy as np
+import pytest
+
+
+def run_hybrid(iflo_type):
+    return run_synthetic(time_end=2010.0, time_save=5.0, iflo_type=iflo_type)
+
+
+def test_hybrid():
+    params, state = run_hybrid("hybrid")
+
+    # the solver runs on each time step, within its budget of iterations
+    assert len(state.nbit_solver) == state.it + 1
+    assert 0 < np.max(state.nbit_solver) <= params.iflo_hybrid_nbitmax
+
+    # the solver polishes the velocities of the emulator
+    from igm.modules.process.iceflow.emulate import update_iceflow_emulated
+    from igm.modules.process.iceflow.solve import solve_iceflow
+
+    update_iceflow_emulated(params, state)
+    U, V, Cost_Glen = solve_iceflow(
+        params, state, state.U, state.V, params.iflo_hybrid_nbitmax, params.iflo_hybrid_tol
+    )
+    assert Cost_Glen[-1] <= Cost_Glen[0]
+
+    params, state_emulated = run_hybrid("emulated")
+    volume = np.sum(state.thk.numpy())
+    volume_emulated = np.sum(state_emulated.thk.numpy())
+    assert abs(volume - volume_emulated) < 0.02 * volume
+
+
+def test_hybrid_log(caplog):
+    from igm.modules.process.iceflow.hybrid import update_iceflow_hybrid
+
+    params, state = iceflow_setup(iflo_type="hybrid", iflo_retrain_emulator_freq=0)
+    state.t = 2000.0
+    state.logger = logging.getLogger("igm_logger")
+
+    # the number of iterations of the solver is logged at each time step
+    with caplog.at_level(logging.INFO, logger="igm_logger"):
+        for i in range(2):
+            update_iceflow_hybrid(params, state)
+
+    records = [r.getMessage() for r in caplog.records if "Iceflow solver" in r.getMessage()]
+    assert records[-2:] == [
+        "Iceflow solver : %d iterations at time : 2000.0" % n for n in state.nbit_solver[-2:]
+    ]
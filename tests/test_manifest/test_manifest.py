@@ -0,0 +1,90 @@
+import igm
+import os
+import sys
+import json
+import importlib
+import subprocess
+import pytest
+
+import igm.manifest
+from igm.manifest import (
+    RecordingParser,
+    encode_arguments,
+    get_manifest_arguments,
+    module_hash,
+    write_manifest,
+)
+
+
+@pytest.fixture
+def manifest_file(tmp_path, monkeypatch):
+    # the manifest is written when the package is built, not in the source tree
+    path = os.path.join(tmp_path, "manifest.json")
+    write_manifest(path)
+    monkeypatch.setattr(igm.manifest, "MANIFEST_FILE", path)
+    monkeypatch.setattr(igm.manifest, "_manifest", None)
+    return path
+
+
+def test_manifest_matches_modules(manifest_file):
+    with open(manifest_file, "r") as f:
+        manifest = json.load(f)
+
+    assert "process/iceflow" in manifest
+
+    # the params functions read from the sources record the same arguments
+    # as the params functions of the imported modules
+    for key, entry in manifest.items():
+        module_folder, module_name = key.split("/")
+
+        module = importlib.import_module(f"igm.modules.{module_folder}.{module_name}")
+        parser = RecordingParser()
+        module.params(parser)
+        assert entry["arguments"] == encode_arguments(parser.arguments), key
+
+
+def test_manifest_out_of_date(manifest_file, monkeypatch):
+    assert get_manifest_arguments("process", "thk") is not None
+
+    with open(manifest_file, "r") as f:
+        manifest = json.load(f)
+    manifest["process/thk"]["hash"] = "0" * 40
+    with open(manifest_file, "w") as f:
+        json.dump(manifest, f)
+    monkeypatch.setattr(igm.manifest, "_manifest", None)
+
+    # the sources of thk changed since the manifest was written
+    assert get_manifest_arguments("process", "thk") is None
+    assert get_manifest_arguments("process", "time") is not None
+
+
+def test_parse_without_tensorflow(manifest_file, tmp_path):
+    with open(os.path.join(tmp_path, "params.json"), "w") as f:
+        json.dump(
+            {
+                "modules_preproc": ["load_ncdf"],
+                "modules_process": ["smb_simple", "iceflow", "time", "thk"],
+                "modules_postproc": ["write_ncdf", "print_info"],
+                "iflo_type": "solved",
+            },
+            f,
+        )
+
+    code = "\n".join(
+        [
+            "import sys",
+            "import igm",
+            "import igm.manifest",
+            "igm.manifest.MANIFEST_FILE = %r" % manifest_file,
+            "parser = igm.params_core()",
+            "params, _ = parser.parse_known_args()",
+            "imported_modules = igm.setup_igm_modules(params)",
+            "params = igm.setup_igm_params(parser, imported_modules)",
+            "assert params.iflo_type == 'solved'",
+            "assert params.time_save == 10.0",
+            "assert 'tensorflow' not in sys.modules",
+        ]
+    )
+    package = os.path.dirname(os.path.dirname(igm.__file__))
+    subprocess.run([sys.executable, "-c", code], cwd=tmp_path, check=True,
+                   env=dict(os.environ, PYTHONPATH=package))
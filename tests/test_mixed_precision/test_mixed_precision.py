@@ -0,0 +1,43 @@
+import igm
+from synthetic_setup import iceflow_setup
+import tensorflow as tf
+import numpy as np
+import pytest
+
+from igm.modules.process.iceflow.emulate import update_iceflow_emulator
+
+
+def setup(precision):
+    return iceflow_setup(None, precision=precision, iflo_retrain_emulator_nbit=1)
+
+
+@pytest.mark.parametrize("precision", ["mixed_bfloat16", "mixed_float16"])
+def test_mixed_precision(precision):
+    params32, state32 = setup("float32")
+    params, state = setup(precision)
+
+    assert state.iceflow_model.layers[-1].compute_dtype == precision.split("_")[1]
+    assert state.U.dtype == tf.float32
+
+    scale = np.max(np.abs(state32.ubar))
+    assert np.max(np.abs(state.ubar - state32.ubar)) < 0.1 * scale
+
+    # the retraining keeps float32 weights (with loss scaling in float16)
+    update_iceflow_emulator(params, state)
+    for variable in state.iceflow_model.trainable_variables:
+        assert variable.dtype == tf.float32
+        assert np.all(np.isfinite(variable.numpy()))
+    assert np.isfinite(state.COST_EMULATOR[-1].numpy())
+
+
+def test_write_ts_float64(tmp_path, monkeypatch):
+    from netCDF4 import Dataset
+    from synthetic_setup import run_synthetic
+
+    monkeypatch.chdir(tmp_path)
+    run_synthetic(time_end=2010.0, modules_postproc=["write_ts"], precision_float64=True)
+
+    # the volume summed in float64 is written in float64
+    with Dataset("output_ts.nc") as nc:
+        assert nc.variables["vol"].dtype == np.float64
+        assert nc.variables["area"].dtype == np.float64
@@ -0,0 +1,85 @@
+import igm
+from synthetic_setup import iceflow_setup
+import tensorflow as tf
+import numpy as np
+import pytest
+
+from igm.modules.process.iceflow.solve import (
+    _restrict,
+    _prolong,
+    _solver_optimizer,
+    solve_iceflow,
+    solve_iceflow_multigrid,
+)
+
+
+def setup():
+    return iceflow_setup(iflo_type="solved", iflo_solve_stop_if_no_decrease=False)
+
+
+def test_restrict_prolong():
+    f = tf.ones((3, 25, 51))
+    assert _restrict(f).shape == (3, 13, 26)
+    assert _prolong(_restrict(f), (25, 51)).shape == (3, 25, 51)
+    assert np.allclose(_prolong(_restrict(f), (25, 51)).numpy(), 1)
+
+
+def test_multigrid():
+    params, state = setup()
+    params.iflo_multigrid_levels = 2
+    params.iflo_multigrid_nbit = 100
+
+    U, V = tf.Variable(tf.zeros_like(state.U)), tf.Variable(tf.zeros_like(state.V))
+    U, V, Cost_Glen = solve_iceflow(params, state, U, V, nbitmax=10)
+
+    state.optimizer = _solver_optimizer(params)
+    U, V = tf.Variable(tf.zeros_like(state.U)), tf.Variable(tf.zeros_like(state.V))
+    U, V, Cost_Glen_multigrid = solve_iceflow_multigrid(params, state, U, V, nbitmax=10)
+
+    # with the same number of iterations on the fine grid, the coarser grids
+    # give a lower energy
+    assert Cost_Glen_multigrid[-1] < Cost_Glen[-1]
+    assert np.all(U.numpy()[:, state.thk.numpy() == 0] == 0)
+
+
+def test_multigrid_warm_start():
+    params, state = setup()
+    params.iflo_multigrid_levels = 2
+    params.iflo_multigrid_nbit = 100
+
+    U, V = tf.Variable(tf.zeros_like(state.U)), tf.Variable(tf.zeros_like(state.V))
+    U, V, Cost_Glen = solve_iceflow(params, state, U, V, nbitmax=50)
+    U_warm, V_warm = U.numpy(), V.numpy()
+
+    state.optimizer = _solver_optimizer(params)
+    U, V = tf.Variable(U_warm), tf.Variable(V_warm)
+    U, V, Cost_Glen = solve_iceflow(params, state, U, V, nbitmax=10)
+
+    state.optimizer = _solver_optimizer(params)
+    U, V = tf.Variable(U_warm), tf.Variable(V_warm)
+    U, V, Cost_Glen_multigrid = solve_iceflow_multigrid(params, state, U, V, nbitmax=10)
+
+    # from a warm start, the coarse-grid correction still lowers the energy
+    assert len(Cost_Glen_multigrid) == len(Cost_Glen) == 10
+    assert Cost_Glen_multigrid[0] <= Cost_Glen[0]
+    assert Cost_Glen_multigrid[-1] < Cost_Glen[-1]
+
+
+def test_multigrid_every_solve(monkeypatch):
+    import igm.modules.process.iceflow.solve as solve
+
+    params, state = setup()
+    params.iflo_multigrid_levels = 2
+
+    calls = []
+
+    def solve_iceflow_multigrid(*args):
+        calls.append(args)
+        return solve.solve_iceflow(*args)
+
+    monkeypatch.setattr(solve, "solve_iceflow_multigrid", solve_iceflow_multigrid)
+
+    # the cycle corrects the velocity at each time step
+    for i in range(3):
+        solve.update_iceflow_solved(params, state, nbitmax=5)
+    assert len(calls) == 3
@@ -0,0 +1,38 @@
+import igm
+from synthetic_setup import iceflow_setup
+import tensorflow as tf
+import numpy as np
+import pytest
+
+from igm.modules.process.iceflow.solve import solve_iceflow, solve_iceflow_newton
+
+
+def setup():
+    return iceflow_setup(iflo_type="solved", iflo_solve_stop_if_no_decrease=False)
+
+
+def test_newton():
+    params, state = setup()
+
+    U, V = tf.Variable(tf.zeros_like(state.U)), tf.Variable(tf.zeros_like(state.V))
+    U, V, Cost_Glen = solve_iceflow(params, state, U, V, nbitmax=5)
+
+    U, V = tf.zeros_like(state.U), tf.zeros_like(state.V)
+    U, V, Cost_Glen_newton = solve_iceflow_newton(params, state, U, V, nbitmax=5)
+
+    # the line search ensures the energy decreases at each iteration, and
+    # faster per iteration than with Adam
+    assert np.all(np.diff(np.array(Cost_Glen_newton)) < 0)
+    # one energy per iteration, as for Adam
+    assert len(Cost_Glen_newton) == len(Cost_Glen) == 5
+    assert Cost_Glen_newton[-1] < Cost_Glen[-1]
+    assert np.all(U.numpy()[:, state.thk.numpy() == 0] == 0)
+
+
+def test_newton_tol():
+    params, state = setup()
+
+    # the stopping criterion, evaluated on the device, ends the iterations
+    U, V = tf.zeros_like(state.U), tf.zeros_like(state.V)
+    U, V, Cost_Glen = solve_iceflow_newton(params, state, U, V, nbitmax=5, tol=10.0)
+    assert len(Cost_Glen) == 1
@@ -101,8 +101,36 @@ def test_params_core():
         "saved_params_filename": "params_saved",
         "url_data": "",
         "folder_data": "data",
+        "fused_step": False,
+        "fused_step_jit": False,
+        "ensemble_size": 1,
+        "ensemble_params": {},
+        "sync_free": False,
+        "precision": "float32",
+        "precision_float64": False,
+        "profile": False,
+        "profile_file": "profile.json",
+        "profile_tf_trace": [],
+        "profile_tf_logdir": "profile_tf",
+        "profile_transfers": False,
+        "async_postproc": False,
+        "async_postproc_queue": 2,
+        "async_postproc_workers": 1,
+        "checkpoint_freq": 0,
+        "checkpoint_dir": "checkpoint",
+        "restart_from": "",
     }
 
+
+def test_params_ensemble_cli():
+    """Tests that the parameters varied within the ensemble are parsed from JSON."""
+    parser = igm.params_core()
+    params, __ = parser.parse_known_args(
+        args=["--ensemble_params", '{"iflo_init_slidingco": [0.03, 0.06]}']
+    )
+
+    assert params.ensemble_params == {"iflo_init_slidingco": [0.03, 0.06]}
+
 # def test_params_core_overwrite():
 #     state = igm.State()  # class acting as a dictionary
 #     parser = igm.params_core()
@@ -0,0 +1,34 @@
+import igm
+import os
+import json
+from synthetic_setup import run_synthetic
+import pytest
+
+
+def test_profiling(tmp_path, monkeypatch):
+    # print_comp writes its reports in the working directory
+    monkeypatch.chdir(tmp_path)
+
+    params, state = run_synthetic(
+        modules_postproc=["print_comp"],
+        time_end=2010.0,
+        profile=True,
+        profile_tf_trace=[2, 3],
+        iflo_retrain_emulator_freq=0,
+    )
+
+    with open(params.profile_file, "r") as f:
+        profile = json.load(f)
+
+    names = ["smb_simple", "iceflow", "time", "thk"]
+    for name in names:
+        calls = [e for e in profile["traceEvents"] if e["name"] == name]
+        assert [e["cat"] for e in calls].count("initialize") == 1
+        assert [e["cat"] for e in calls].count("update") == state.it + 1
+        assert [e["cat"] for e in calls].count("finalize") == 1
+        assert profile["otherData"][name]["number_it"] == state.it + 1
+
+    # print_comp reports the timings of the profiler
+    assert set(names).issubset(state.profiler.durations)
+    assert os.path.exists("computational-statistics.txt")
+    assert os.path.exists(params.profile_tf_logdir)
@@ -0,0 +1,44 @@
+import igm
+from synthetic_setup import iceflow_setup
+import tensorflow as tf
+import numpy as np
+import os
+import json
+
+from igm.modules.process.iceflow.emulate import update_iceflow_emulated
+
+
+def setup(backend, tflite="", quantization="float16"):
+    params, state = iceflow_setup(
+        iflo_retrain_emulator_freq=0,
+        iflo_inference_backend=backend,
+        iflo_inference_quantization=quantization,
+        iflo_inference_tflite=tflite,
+    )
+    update_iceflow_emulated(params, state)
+
+    return params, state
+
+
+def test_quantized_inference(tmp_path):
+    params_keras, state_keras = setup("keras")
+    tflite = os.path.join(tmp_path, "emulator.tflite")
+    params, state = setup("tflite", tflite)
+
+    assert os.path.exists(tflite) and os.path.exists(tflite + ".json")
+
+    ice = state.thk.numpy() > 0
+    scale = np.max(np.abs(state_keras.ubar.numpy()[ice]))
+    for f in ["ubar", "vbar", "uvelsurf", "vvelsurf"]:
+        diff = np.abs(vars(state)[f].numpy() - vars(state_keras)[f].numpy())
+        assert np.max(diff[ice]) < 0.05 * scale
+
+    # the next run reads the quantized emulator
+    params, state_read = setup("tflite", tflite)
+    assert np.array_equal(state_read.ubar.numpy(), state.ubar.numpy())
+
+    # the file is converted again for another quantization
+    content = open(tflite, "rb").read()
+    params, state_float32 = setup("tflite", tflite, "float32")
+    assert not open(tflite, "rb").read() == content
+    assert json.load(open(tflite + ".json"))["quantization"] == "float32"
@@ -0,0 +1,38 @@
+import igm
+from synthetic_setup import iceflow_setup
+import tensorflow as tf
+import numpy as np
+import pytest
+
+from igm.modules.process.iceflow.emulate import update_iceflow_emulator
+
+
+def retrain(microbatch, nbit=3):
+    params, state = iceflow_setup(
+        iflo_retrain_emulator_freq=1,
+        iflo_retrain_emulator_nbit_init=0,
+        iflo_retrain_emulator_nbit=nbit,
+        # the domain is cut into 6 patches
+        iflo_retrain_emulator_framesizemax=50,
+        iflo_retrain_emulator_microbatch=microbatch,
+    )
+    with tf.device(f"/GPU:{params.gpu_id}"):
+        update_iceflow_emulator(params, state)
+        update_iceflow_emulator(params, state)
+
+    return state
+
+
+def test_retraining_step():
+    state = retrain(0)
+    state_microbatch = retrain(4)
+
+    # one optimizer step per iteration, whatever the micro-batches
+    assert state.opti_retrain.iterations.numpy() == 6
+    cost = np.array(state.COST_EMULATOR)
+    assert np.allclose(np.array(state_microbatch.COST_EMULATOR), cost, rtol=10**-4)
+    assert cost[-1] < cost[0]
+
+    # the learning rate decays from the start of each retraining
+    schedule = state.opti_retrain_schedule
+    assert np.isclose(schedule(state.opti_retrain.iterations).numpy(), 0.95**(3 / 1000) * schedule.learning_rate)
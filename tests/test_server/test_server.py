@@ -0,0 +1,57 @@
+import os
+import shutil
+import socket
+import threading
+import pytest
+from netCDF4 import Dataset
+
+from igm.igm_server import serve, submit_job, receive
+
+
+def test_server(tmp_path):
+    socket_path = str(tmp_path / "igm.sock")
+
+    server = threading.Thread(target=serve, args=(socket_path,))
+    server.start()
+
+    try:
+        folders = []
+        for i in range(2):
+            folder = tmp_path / ("run-" + str(i))
+            os.makedirs(folder)
+            shutil.copy("./test_server/params.json", folder)
+            # custom modules are found in the folder of the job
+            shutil.copy("./test_full_glacier_evolution_synthetic/make_synthetic.py", folder)
+            folders.append(str(folder))
+
+        # the server is ready once it has imported tensorflow
+        while not os.path.exists(socket_path):
+            server.join(0.1)
+
+        first = submit_job({"folder": folders[0]}, socket_path)
+        second = submit_job(
+            {"folder": folders[1], "params": {"time_end": 2020.0}}, socket_path
+        )
+        failed = submit_job(
+            {"folder": folders[0], "params": {"not_a_param": 0}}, socket_path
+        )
+        missing = submit_job({"folder": str(tmp_path / "missing")}, socket_path)
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+            connection.connect(socket_path)
+            connection.sendall(b"{not json\n")
+            malformed = receive(connection)
+    finally:
+        submit_job({"command": "shutdown"}, socket_path)
+        server.join()
+
+    assert first["done"] & second["done"]
+    assert os.path.join(folders[0], "output_ts.nc") in first["outputs"]
+    with Dataset(os.path.join(folders[1], "output_ts.nc")) as nc:
+        assert nc.variables["time"][-1] == 2020.0
+
+    assert not failed["done"]
+    assert "not_a_param" in failed["error"]
+
+    # the server keeps listening after a job in a missing folder or a malformed message
+    assert not missing["done"]
+    assert not malformed["done"]
@@ -0,0 +1,26 @@
+import igm
+from synthetic_setup import run_synthetic
+import numpy as np
+import pytest
+
+
+def run_skip_inference(skip_tol):
+    # small time steps, such that the fields change little between two of them
+    params, state = run_synthetic(
+        time_end=2010.0, time_step_max=0.1, iflo_emulator_skip_tol=skip_tol
+    )
+    return state
+
+
+def test_skip_inference():
+    state = run_skip_inference(0.0)
+    state_skip = run_skip_inference(0.02)
+
+    # with small time steps, some evaluations of the emulator are skipped
+    assert state.emulator_nb_skipped == 0
+    assert 0 < state_skip.emulator_nb_skipped < state_skip.emulator_nb_evaluated
+    assert 0 < max(state_skip.emulator_skip_error) < 0.1
+
+    volume = np.sum(state.thk.numpy())
+    volume_skip = np.sum(state_skip.thk.numpy())
+    assert abs(volume_skip - volume) < 0.01 * volume
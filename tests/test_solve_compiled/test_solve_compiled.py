@@ -0,0 +1,32 @@
+import igm
+from synthetic_setup import iceflow_setup
+import tensorflow as tf
+import numpy as np
+import pytest
+
+from igm.modules.process.iceflow.solve import solve_iceflow, _solver_optimizer
+
+
+def setup():
+    return iceflow_setup(iflo_type="solved", iflo_solve_stop_if_no_decrease=False)
+
+
+@pytest.mark.parametrize("tol", [0.0, 0.1])
+def test_solve_compiled(tol):
+    results = []
+    for compiled in [False, True]:
+        params, state = setup()
+        params.iflo_solve_compiled = compiled
+        state.optimizer = _solver_optimizer(params)
+
+        U, V = tf.Variable(tf.zeros_like(state.U)), tf.Variable(tf.zeros_like(state.V))
+        results.append(solve_iceflow(params, state, U, V, nbitmax=20, tol=tol))
+
+    (U, V, Cost_Glen), (U_compiled, V_compiled, Cost_Glen_compiled) = results
+
+    # the compiled loop stops on the same iteration, with the same costs
+    assert len(Cost_Glen_compiled) == len(Cost_Glen)
+    assert (tol == 0) == (len(Cost_Glen) == 20)
+    assert np.allclose(np.array(Cost_Glen_compiled), np.array(Cost_Glen), rtol=1e-4)
+    # the rounding differs in the compiled loop, the velocities are compared in norm
+    assert np.linalg.norm(U_compiled.numpy() - U.numpy()) < 1e-3 * np.linalg.norm(U.numpy())
@@ -0,0 +1,38 @@
+import igm
+from synthetic_setup import run_synthetic
+import numpy as np
+import pytest
+
+
+def run_sync_free(sync_free, tmp_path):
+    params, state = run_synthetic(
+        modules_postproc=["print_comp"],
+        time_end=2010.0,
+        sync_free=sync_free,
+        profile_transfers=True,
+        profile_file=str(tmp_path / ("profile-" + str(sync_free) + ".json")),
+        iflo_retrain_emulator_freq=0,
+    )
+    return state
+
+
+def test_sync_free(tmp_path):
+    state_sync = run_sync_free(False, tmp_path)
+    state_free = run_sync_free(True, tmp_path)
+
+    assert isinstance(state_free.t, float)
+    assert state_free.it == state_sync.it
+    assert np.isclose(state_free.t, state_sync.t.numpy())
+
+    vol_sync = np.sum(state_sync.thk) * (state_sync.dx**2) / 10**9
+    vol_free = np.sum(state_free.thk) * (state_free.dx**2) / 10**9
+
+    assert np.isclose(vol_free, vol_sync, rtol=1e-3)
+
+    # only the time step is copied to the host in each iteration
+    transfers_sync = state_sync.profiler.summary()
+    transfers_free = state_free.profiler.summary()
+    assert transfers_free["time"]["transfers_per_it"] == 1
+    assert sum([s["transfers_per_it"] for s in transfers_free.values()]) < sum(
+        [s["transfers_per_it"] for s in transfers_sync.values()]
+    )
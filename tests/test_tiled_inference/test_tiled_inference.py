@@ -0,0 +1,30 @@
+import igm
+from synthetic_setup import iceflow_setup
+import tensorflow as tf
+import numpy as np
+import pytest
+
+from igm.modules.process.iceflow.emulate import update_iceflow_emulated
+
+
+def setup(tile_size, tile_blend="cosine"):
+    params, state = iceflow_setup(
+        iflo_tile_size=tile_size, iflo_tile_blend=tile_blend, iflo_retrain_emulator_freq=0
+    )
+    with tf.device(f"/GPU:{params.gpu_id}"):
+        update_iceflow_emulated(params, state)
+
+    return params, state
+
+
+@pytest.mark.parametrize("tile_blend", ["linear", "cosine"])
+def test_tiled_inference(tile_blend):
+    params_full, state_full = setup(0)
+    params, state = setup(64, tile_blend)
+
+    scale = np.max(np.abs(state_full.ubar.numpy()))
+    for f in ["ubar", "vbar", "uvelsurf", "vvelsurf"]:
+        assert vars(state)[f].shape == vars(state_full)[f].shape
+        diff = np.abs(vars(state)[f].numpy() - vars(state_full)[f].numpy())
+        # the halo covers the receptive field, the tiles give the same velocities
+        assert np.max(diff) < 10**-4 * scale